@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import array
 import dataclasses
 import enum
+import hashlib
+import math
 import pathlib
 import random
 import sys
 import typing
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 DEFAULT_WORDLISTS = list(
     filter(
         pathlib.Path.exists,
@@ -20,9 +28,21 @@ DEFAULT_WORDLISTS = list(
 )
 DEFAULT_WORD_LENGTH = 5
 
-# TODO maybe include one of the English Wikipedia frequency lists at
-#      https://github.com/IlyaSemenov/wikipedia-word-frequency/tree/master/results
-#      for future ranking of guesses
+# One of the English Wikipedia frequency lists ("word count" per line) at
+# https://github.com/IlyaSemenov/wikipedia-word-frequency/tree/master/results
+# weights the answers when ranking guesses
+DEFAULT_FREQUENCY_LISTS = list(
+    filter(
+        pathlib.Path.exists,
+        map(
+            pathlib.Path,
+            [
+                pathlib.Path(__file__).with_name("enwiki-word-frequency.txt"),
+            ],
+        ),
+    )
+)
+DEFAULT_PATTERN_CACHE_DIR = pathlib.Path.home() / ".cache" / "ordle_hints"
 
 
 def load_words(
@@ -112,6 +132,78 @@ class WordSet(set[str]):
         self.discard_words_unless(lambda w: character in w)
 
 
+class WordIndex:
+    """Words as per-position letter codes, with bitset columns for filtering
+
+    Bit j of every mask stands for words[j]. Each constraint on a board is
+    then a single AND against a precomputed column instead of a Python call
+    per word, and boards can share one index while keeping their own mask.
+
+    >>> wi = WordIndex(["abc", "bcd", "cde", "def"])
+    >>> wi.alphabet
+    'abcdef'
+    >>> wi.codes.tolist()
+    [0, 1, 2, 1, 2, 3, 2, 3, 4, 3, 4, 5]
+    >>> bin(wi.containing("c"))
+    '0b111'
+    >>> bin(wi.with_character_at_index("c", 1))
+    '0b10'
+    >>> sorted(wi.word_set(wi.all & ~wi.containing("a")))
+    ['bcd', 'cde', 'def']
+    >>> wi.containing("z")
+    0
+
+    """
+
+    def __init__(self, words: typing.Iterable[str]) -> None:
+        self.words = list(words)
+        self.word_length = len(self.words[0]) if self.words else 0
+        self.alphabet = "".join(sorted(set().union(*map(set, self.words))))
+        self.code_for = {ch: code for code, ch in enumerate(self.alphabet)}
+        self.all = (1 << len(self.words)) - 1
+        self.codes = array.array(
+            "B", (self.code_for[ch] for word in self.words for ch in word)
+        )
+        positions: list[dict[int, list[int]]] = [
+            {} for _ in range(self.word_length)
+        ]
+        presence: dict[int, list[int]] = {}
+        for j, word in enumerate(self.words):
+            for i, ch in enumerate(word):
+                code = self.code_for[ch]
+                positions[i].setdefault(code, []).append(j)
+            for ch in set(word):
+                presence.setdefault(self.code_for[ch], []).append(j)
+        self._at = [
+            {code: self._bitset(js) for code, js in column.items()}
+            for column in positions
+        ]
+        self._has = {code: self._bitset(js) for code, js in presence.items()}
+
+    def _bitset(self, indexes: list[int]) -> int:
+        bits = bytearray((len(self.words) + 7) // 8)
+        for j in indexes:
+            bits[j >> 3] |= 1 << (j & 7)
+        return int.from_bytes(bits, "little")
+
+    def containing(self, character: str) -> int:
+        code = self.code_for.get(character)
+        return 0 if code is None else self._has.get(code, 0)
+
+    def with_character_at_index(self, character: str, index: int) -> int:
+        code = self.code_for.get(character)
+        if code is None or index >= self.word_length:
+            return 0
+        return self._at[index].get(code, 0)
+
+    def indexes(self, mask: int) -> list[int]:
+        bits = bin(mask)[:1:-1]
+        return [j for j, bit in enumerate(bits) if bit == "1"]
+
+    def word_set(self, mask: int) -> WordSet:
+        return WordSet(self.words[j] for j in self.indexes(mask))
+
+
 class LetterScore(enum.Enum):
     CORRECT = enum.auto()
     WRONG_SPOT = enum.auto()
@@ -152,14 +244,13 @@ class Game:
     words: WordSet = dataclasses.field(default_factory=WordSet)
     alphabet: str = dataclasses.field(init=False)
     boards: list[Board] = dataclasses.field(init=False, default_factory=list)
+    index: WordIndex = dataclasses.field(init=False, repr=False)
 
     def __post_init__(self) -> None:
         # ensure ownership of word set
         self.words = WordSet(self.words)
-        alphaset = set()
-        for word in self.words:
-            alphaset.update(set(word))
-        self.alphabet = "".join(sorted(alphaset))
+        self.index = WordIndex(sorted(self.words))
+        self.alphabet = self.index.alphabet
 
     def play(self, scored_word: ScoredWord) -> WordSet:
         """
@@ -192,33 +283,37 @@ class Game:
         """
 
         if not self.boards:
-            self.boards = [Board(words=self.words) for _ in scored_word.scores]
+            self.boards = [Board(index=self.index) for _ in scored_word.scores]
 
         for si, score in enumerate(scored_word.scores):
             self.boards[si].play(scored_word.word, score)
 
-        new_words = WordSet()
+        mask = 0
         for bd in self.boards:
-            new_words.update(bd.words)
-        self.words = new_words
+            mask |= bd.mask
+        self.words = self.index.word_set(mask)
 
         return self.words
 
 
 @dataclasses.dataclass(kw_only=True)
 class Board:
-    words: WordSet = dataclasses.field(default_factory=WordSet)
+    words: dataclasses.InitVar[WordSet | None] = None
+    index: WordIndex | None = dataclasses.field(default=None, repr=False)
+    mask: int | None = None
     needed_characters: set[str] = dataclasses.field(default_factory=set)
     solved: bool = False
     solution: str | None = None
 
-    def __post_init__(self) -> None:
-        # ensure ownership of word set
-        self.words = WordSet(self.words)
+    def __post_init__(self, words: WordSet | None) -> None:
+        if self.index is None:
+            self.index = WordIndex(sorted(words or ()))
+        if self.mask is None:
+            self.mask = self.index.all
 
     def need(self, character: str) -> None:
         self.needed_characters.add(character)
-        self.words.discard_words_that_do_not_contain_character(character)
+        self.mask &= self.index.containing(character)
 
     def needs(self, character: str) -> bool:
         return character in self.needed_characters
@@ -239,7 +334,7 @@ class Board:
             if score == [LetterScore.CORRECT] * len(word):
                 self.solution = word
                 self.solved = True
-                self.words = WordSet()
+                self.mask = 0
             else:
                 for i, ls in enumerate(score):
                     if ls == LetterScore.CORRECT or ls == LetterScore.WRONG_SPOT:
@@ -247,18 +342,16 @@ class Board:
                 for i, ls in enumerate(score):
                     ch = word[i]
                     if ls == LetterScore.CORRECT:
-                        self.words.discard_words_without_character_at_index(ch, i)
+                        self.mask &= self.index.with_character_at_index(ch, i)
                     else:
                         if (
                             ls == LetterScore.NOT_IN_WORD
                             or ls == LetterScore.WRONG_SPOT
                         ):
-                            self.words.discard_words_with_character_at_index(ch, i)
+                            self.mask &= ~self.index.with_character_at_index(ch, i)
                         if ls == LetterScore.NOT_IN_WORD and not self.needs(ch):
-                            self.words.discard_words_that_contain_any_of_these_characters(
-                                set(ch)
-                            )
-        return self.words
+                            self.mask &= ~self.index.containing(ch)
+        return self.index.word_set(self.mask)
 
 
 @dataclasses.dataclass(kw_only=True)
@@ -290,6 +383,213 @@ class ScoredWord:
         return set.intersection(*unloved)
 
 
+def load_frequencies(paths: list[pathlib.Path]) -> dict[str, float]:
+    frequencies: dict[str, float] = {}
+    for path in paths:
+        with path.open() as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[1].isdigit():
+                    word = parts[0].lower()
+                    frequencies[word] = frequencies.get(word, 0) + int(parts[1])
+    return frequencies
+
+
+def feedback_pattern(guess: str, answer: str) -> int:
+    """Score a guess against an answer as base 3 digits, one per position
+
+    0 is not in word, 1 is wrong spot, and 2 is correct, with the digit for
+    position i worth 3**i. Repeated letters are only marked as in the word as
+    many times as the answer has them to spare.
+
+    >>> feedback_pattern("abc", "abc")
+    26
+    >>> feedback_pattern("abc", "xyz")
+    0
+    >>> feedback_pattern("aab", "bxa")  # 1*1 + 0*3 + 1*9
+    10
+    >>> feedback_pattern("aab", "axx")  # 2*1 + 0*3 + 0*9
+    2
+
+    """
+    pattern = 0
+    spare: dict[str, int] = {}
+    for g, a in zip(guess, answer):
+        if g != a:
+            spare[a] = spare.get(a, 0) + 1
+    for i, (g, a) in enumerate(zip(guess, answer)):
+        if g == a:
+            pattern += 2 * 3**i
+        elif spare.get(g, 0) > 0:
+            spare[g] -= 1
+            pattern += 3**i
+    return pattern
+
+
+class GuessRecommender:
+    """Rank every allowed guess by expected information across active boards
+
+    The guess x answer feedback pattern matrix is computed once per word list
+    and cached on disk as a compact .npy array, so a ranking is a histogram
+    per guess over each board's remaining answers. Needs numpy.
+    """
+
+    def __init__(
+        self,
+        index: WordIndex,
+        *,
+        frequencies: dict[str, float] | None = None,
+        cache_dir: pathlib.Path | None = DEFAULT_PATTERN_CACHE_DIR,
+        chunk_size: int = 1024,
+    ) -> None:
+        if numpy is None:
+            raise RuntimeError("GuessRecommender needs numpy")
+        self.index = index
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        self.weights = (
+            numpy.array([frequencies.get(w, 0) + 1 for w in index.words], float)
+            if frequencies
+            else None
+        )
+        self.pattern_count = 3**index.word_length
+        self._patterns = None
+
+    def _cache_path(self, kind: str, *extra: bytes) -> pathlib.Path:
+        h = hashlib.sha1("\n".join(self.index.words).encode())
+        for _ in extra:
+            h.update(_)
+        return self.cache_dir / f"{kind}-{self.index.word_length}-{h.hexdigest()}.npy"
+
+    def _cached(self, kind: str, compute: typing.Callable, *extra: bytes):
+        path = self._cache_path(kind, *extra) if self.cache_dir else None
+        if path and path.exists():
+            return numpy.load(path, mmap_mode="r")
+        value = compute()
+        if path:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            numpy.save(path, value)
+        return value
+
+    @property
+    def patterns(self):
+        if self._patterns is None:
+            self._patterns = self._cached("patterns", self.compute_patterns)
+        return self._patterns
+
+    def compute_patterns(self):
+        """The same scoring as feedback_pattern, for every guess and answer
+
+        A yellow at position i needs the answer to have more unmatched copies
+        of the letter than the guess has unmatched copies before position i.
+        """
+        n = len(self.index.words)
+        length = self.index.word_length
+        codes = numpy.frombuffer(self.index.codes, dtype=numpy.uint8).reshape(n, length)
+        dtype = numpy.min_scalar_type(self.pattern_count - 1)
+        powers = (3 ** numpy.arange(length)).astype(dtype)
+        patterns = numpy.empty((n, n), dtype=dtype)
+        step = max(1, self.chunk_size // 8)
+        for start in range(0, n, step):
+            guesses = codes[start : start + step]
+            # green[i][g, a]: guess g and answer a share letter i
+            green = [guesses[:, i, None] == codes[None, :, i] for i in range(length)]
+            rows = numpy.zeros((len(guesses), n), dtype=dtype)
+            for i in range(length):
+                letter = guesses[:, i, None]
+                spare = numpy.zeros(rows.shape, dtype=numpy.int8)
+                for j in range(length):
+                    spare += (letter == codes[None, :, j]) & ~green[j]
+                for m in range(i):
+                    spare -= (letter == guesses[:, m, None]) & ~green[m]
+                yellow = ~green[i] & (spare > 0)
+                rows += (2 * green[i] + yellow).astype(dtype) * powers[i]
+            patterns[start : start + len(guesses)] = rows
+        return patterns
+
+    def expected_information(self, answers: list[int]):
+        """Entropy in bits of each guess's feedback over the given answers"""
+        return self.expected_information_many([answers])[0]
+
+    def expected_information_many(self, answer_sets: list[list[int]]):
+        """expected_information for several answer sets in one pass
+
+        Each block of guess rows is turned into keys once, transposed so that
+        an answer's keys are contiguous, and every answer set then counts its
+        own rows of it. Keys stay within uint16 for 5 letter words.
+        """
+        n = len(self.index.words)
+        rows = max(1, min(self.chunk_size // 8, 2**16 // self.pattern_count))
+        dtype = numpy.min_scalar_type(rows * self.pattern_count - 1)
+        offsets = numpy.arange(rows, dtype=dtype) * dtype.type(self.pattern_count)
+        answer_sets = [numpy.asarray(_, dtype=numpy.intp) for _ in answer_sets]
+        if self.weights is None:
+            largest = max(map(len, answer_sets), default=0)
+            counts = numpy.arange(largest + 1, dtype=float)
+            # x log x of every possible count, with 0 log 0 taken as 0
+            xlogx = counts * numpy.log2(counts, where=counts > 0, out=counts.copy())
+        entropies = [numpy.empty(n) for _ in answer_sets]
+        for start in range(0, n, rows):
+            block = numpy.asarray(self.patterns[start : start + rows]).T
+            width = block.shape[1]
+            keys = numpy.add(block, offsets[:width], dtype=dtype, order="C")
+            for entropy, answers in zip(entropies, answer_sets):
+                weights = None if self.weights is None else self.weights[answers]
+                counts = numpy.bincount(
+                    keys.take(answers, axis=0).ravel(),
+                    weights=None if weights is None else numpy.repeat(weights, width),
+                    minlength=width * self.pattern_count,
+                ).reshape(width, self.pattern_count)
+                if weights is None:
+                    total = len(answers)
+                    entropy[start : start + width] = (
+                        numpy.log2(total) - xlogx[counts].sum(axis=1) / total
+                    )
+                else:
+                    p = counts / weights.sum()
+                    logs = numpy.log2(p, where=p > 0, out=numpy.zeros_like(p))
+                    entropy[start : start + width] = -(p * logs).sum(axis=1)
+        return entropies
+
+    def opening_information(self):
+        """expected_information over the whole word list, cached with the patterns"""
+        answers = list(range(len(self.index.words)))
+        extra = () if self.weights is None else (self.weights.tobytes(),)
+        return self._cached(
+            "opening", lambda: self.expected_information(answers), *extra
+        )
+
+    def rank(self, masks: list[int], n: int = 10) -> list[tuple[str, float]]:
+        """Top n guesses by expected bits summed over boards with answers left
+
+        Ties go to guesses that could themselves be an answer.
+        """
+        score = numpy.zeros(len(self.index.words))
+        possible = numpy.zeros(len(self.index.words), dtype=bool)
+        boards_by_mask: dict[int, int] = {}
+        for mask in masks:
+            boards_by_mask[mask] = boards_by_mask.get(mask, 0) + 1
+        answer_sets, weights = [], []
+        for mask, boards in boards_by_mask.items():
+            answers = self.index.indexes(mask)
+            if not answers:
+                continue
+            possible[answers] = True
+            if len(answers) == 1:
+                continue
+            if mask == self.index.all:
+                score += boards * self.opening_information()
+            else:
+                answer_sets.append(answers)
+                weights.append(boards)
+        for boards, entropy in zip(
+            weights, self.expected_information_many(answer_sets)
+        ):
+            score += boards * entropy
+        order = numpy.lexsort((~possible, -score))[:n]
+        return [(self.index.words[j], float(score[j])) for j in order]
+
+
 def decode_shorthand(shorthand: str) -> ScoredWord:
     """
 
@@ -351,6 +651,13 @@ def main() -> None:
         if rwn > n:
             remaining_words = random.sample(sorted(remaining_words), n)
         print(" ".join([str(rwn)] + sorted(remaining_words)))
+    if numpy is not None and len(g.words) > 1:
+        recommender = GuessRecommender(
+            g.index,
+            frequencies=load_frequencies(DEFAULT_FREQUENCY_LISTS),
+        )
+        masks = [bd.mask for bd in g.boards if not bd.solved] or [g.index.all]
+        print(" ".join(["try"] + [w for w, _ in recommender.rank(masks, n)]))
 
 
 if __name__ == "__main__":
@@ -1,95 +1,160 @@
 from __future__ import annotations
 
 from abc import ABCMeta, abstractmethod
-from codecs import getwriter
 from dataclasses import dataclass, field
 from enum import IntFlag
+from functools import lru_cache
+from hashlib import sha1
 from html import escape
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import chain
 from random import randint
 from sys import argv
+from threading import Thread
+from time import perf_counter
 from typing import Generator
+from urllib.request import Request, urlopen
 from webbrowser import open as wbopen
 
 from icecream import ic
 
 
-class SlipUpsRequestHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        if self.path == "/favicon.ico":
-            self.send_error(HTTPStatus.NOT_FOUND)
-            return
-        print(self.path)
+RENDER_CACHE_SIZE = 4096
 
-        shorthand = self.path.removeprefix("/")
-        state = state_from_shorthand(shorthand)
-        game = Game(state=state)
-        adjacents = list(game.adjacent_states())
-
-        encoding = "utf-8"
-        outlines = [
-            "HTTP/1.1 200 OK",
-            f"content-type: text/html; charset={encoding}",
-            "",
-            "<!doctype html>",
-            "<html><body>",
-        ]
-        try:
-            if state.columns:
-                max_column_height = max(map(len, state.columns))
-                if max_column_height:
-                    outlines += [
-                        "<table>",
-                    ]
-                    try:
-                        row_lines = []
-                        for row_index in range(max_column_height):
-                            row_parts = [
-                                escape(repr(column[row_index]))
-                                if len(column) > row_index
-                                else "&nbsp;"
-                                for column in state.columns
-                            ]
-                            row_lines.append(
-                                "<tr>"
-                                + "".join(
-                                    ["<td>" + part + "</td>" for part in row_parts]
-                                )
-                                + "</tr>"
-                            )
-                    finally:
-                        outlines += [
-                            "</table>",
-                        ]
-            else:
-                outlines += [
-                    "<table><tr><td>&nbsp;</td></tr></table>",
-                ]
-            if adjacents:
+
+@dataclass(frozen=True)
+class RenderedPage:
+    body: bytes
+    etag: str
+    content_type: str = "text/html; charset=utf-8"
+
+
+def render_state_page(shorthand: str) -> RenderedPage:
+    """Render the HTML page for a shorthand state.
+
+    >>> page = render_state_page("1-2")
+    >>> page.etag == render_state_page("1-2").etag
+    True
+    >>> print(page.body.decode())
+    <!doctype html>
+    <html><body>
+    <table>
+    <tr><td>&lt;Tile:--B-&gt;</td></tr>
+    </table>
+    <p>Best next move: <a href='-12'>-12</a></p>
+    <ul>
+    <li><a href='-12'>-12</a></li>
+    <li><a href='-2-1'>-2-1</a></li>
+    </ul>
+    </body></html>
+    <BLANKLINE>
+    """
+
+    state = state_from_shorthand(shorthand)
+    game = Game(state=state)
+    adjacents = game.adjacent_states()
+    first_adjacent = next(adjacents, None)
+    best = game.best_next_state()
+
+    outlines = [
+        "<!doctype html>",
+        "<html><body>",
+    ]
+    try:
+        if state.columns:
+            max_column_height = max(map(len, state.columns))
+            if max_column_height:
                 outlines += [
-                    "<ul>",
+                    "<table>",
                 ]
                 try:
-                    outlines += [
-                        f"<li><a href='{state_as_shorthand(adj)}'>{escape(state_as_shorthand(adj))}</a></li>"
-                        for adj in adjacents
-                    ]
+                    for row_index in range(max_column_height):
+                        row_parts = [
+                            escape(repr(column[row_index]))
+                            if len(column) > row_index
+                            else "&nbsp;"
+                            for column in state.columns
+                        ]
+                        outlines.append(
+                            "<tr>"
+                            + "".join(["<td>" + part + "</td>" for part in row_parts])
+                            + "</tr>"
+                        )
                 finally:
                     outlines += [
-                        "</ul>",
+                        "</table>",
                     ]
-            else:
+        else:
+            outlines += [
+                "<table><tr><td>&nbsp;</td></tr></table>",
+            ]
+        if best is not None:
+            best_shorthand = escape(state_as_shorthand(best))
+            outlines += [
+                f"<p>Best next move: <a href='{best_shorthand}'>{best_shorthand}</a></p>",
+            ]
+        if first_adjacent is not None:
+            outlines += [
+                "<ul>",
+            ]
+            try:
+                for adj in chain([first_adjacent], adjacents):
+                    adj_shorthand = escape(state_as_shorthand(adj))
+                    outlines.append(
+                        f"<li><a href='{adj_shorthand}'>{adj_shorthand}</a></li>"
+                    )
+            finally:
                 outlines += [
-                    "<p>No adjacent states</p>",
+                    "</ul>",
                 ]
-        finally:
+        else:
             outlines += [
-                "</body></html>",
+                "<p>No adjacent states</p>",
             ]
+    finally:
+        outlines += [
+            "</body></html>",
+        ]
+
+    body = "".join([_ + "\n" for _ in outlines]).encode("utf-8")
+    return RenderedPage(body=body, etag='"' + sha1(body).hexdigest() + '"')
+
+
+cached_render_state_page = lru_cache(maxsize=RENDER_CACHE_SIZE)(render_state_page)
+
+
+class SlipUpsRequestHandler(BaseHTTPRequestHandler):
+    render = staticmethod(cached_render_state_page)
+    quiet = False
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if self.path == "/favicon.ico":
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        shorthand = self.path.removeprefix("/")
+        try:
+            page = self.render(shorthand)
+        except (KeyError, ValueError):
+            self.send_error(HTTPStatus.BAD_REQUEST, "unrecognized shorthand")
+            return
 
-        out = getwriter(encoding)(self.wfile)
-        out.writelines([_ + "\n" for _ in outlines])
+        if page.etag in self.headers.get("If-None-Match", "").split(", "):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", page.etag)
+            self.end_headers()
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", page.content_type)
+        self.send_header("Content-Length", str(len(page.body)))
+        self.send_header("ETag", page.etag)
+        self.end_headers()
+        self.wfile.write(page.body)
 
 
 class Connection(IntFlag):
@@ -185,15 +250,242 @@ class DefaultStateChanger(StateChanger):
             )
 
 
+PackedState = tuple[int, ...]
+"""A State as (queue, column, column, ...) tile sequences packed into ints.
+
+Each sequence keeps its tiles as 4-bit nibbles, first tile in the lowest
+nibble, under a sentinel 1 bit that marks the length. An empty sequence is
+1. Putting a tile in front is ``(seq << 4) | tile`` and taking the first one
+off is ``seq & 0xF`` and ``seq >> 4``, so no lists are copied while searching.
+"""
+
+_EMPTY_SEQUENCE = 1
+
+
+def pack_sequence(tiles: list[Tile]) -> int:
+    """
+    >>> hex(pack_sequence(state_from_shorthand("17").queue))
+    '0x171'
+    >>> pack_sequence([])
+    1
+    >>> pack_sequence(state_from_shorthand("1x").queue)
+    Traceback (most recent call last):
+    ...
+    ValueError: unknown tiles cannot be packed
+    """
+
+    packed = _EMPTY_SEQUENCE
+    for tile in reversed(tiles):
+        if tile is None:
+            raise ValueError("unknown tiles cannot be packed")
+        packed = (packed << 4) | tile.connections
+    return packed
+
+
+def unpack_sequence(packed: int) -> list[Tile]:
+    tiles = []
+    while packed > _EMPTY_SEQUENCE:
+        tiles.append(_PACKED_TILES[packed & 0xF])
+        packed >>= 4
+    return tiles
+
+
+def pack_state(state: State) -> PackedState:
+    """
+    >>> [hex(_) for _ in pack_state(state_from_shorthand("17-f3-a"))]
+    ['0x171', '0x13f', '0x1a']
+    >>> state_as_shorthand(unpack_state(pack_state(state_from_shorthand("17-f3-a"))))
+    '17-f3-a'
+    """
+
+    return tuple(pack_sequence(_) for _ in [state.queue, *state.columns])
+
+
+def unpack_state(packed: PackedState) -> State:
+    queue, *columns = [unpack_sequence(_) for _ in packed]
+    return State(columns=columns, queue=queue)
+
+
+def packed_adjacent_states(packed: PackedState) -> list[PackedState]:
+    """The same moves as DefaultStateChanger, on packed states.
+
+    >>> [state_as_shorthand(unpack_state(_))
+    ...  for _ in packed_adjacent_states(pack_state(state_from_shorthand("12-3")))]
+    ['2-13', '2-3-1']
+    """
+
+    queue, *columns = packed
+    if queue == _EMPTY_SEQUENCE:
+        return []
+    tile, remainder = queue & 0xF, queue >> 4
+    adjacents = []
+    for i, column in enumerate(columns):
+        new_columns = list(columns)
+        new_columns[i] = (column << 4) | tile
+        adjacents.append((remainder, *new_columns))
+    adjacents.append((remainder, *columns, (_EMPTY_SEQUENCE << 4) | tile))
+    return adjacents
+
+
+Score = tuple[int, int]
+
+
+def connection_score(packed: PackedState) -> Score:
+    """Score a state by how many tile connections meet, then by fewest columns.
+
+    Within a column, a tile's AFTER meets the BEFORE of the tile below it.
+    Across columns, a tile's EXPAND meets the CONTRACT of the tile in the
+    same row of the next column.
+
+    >>> connection_score(pack_state(state_from_shorthand("-12")))
+    (1, -1)
+    >>> connection_score(pack_state(state_from_shorthand("-8-4")))
+    (1, -2)
+    """
+
+    # Plain ints, since IntFlag arithmetic dominates the search otherwise.
+    columns = [_sequence_nibbles(_) for _ in packed[1:]]
+    matches = 0
+    for ci, column in enumerate(columns):
+        for row, connections in enumerate(column):
+            if (
+                connections & _AFTER
+                and row + 1 < len(column)
+                and column[row + 1] & _BEFORE
+            ):
+                matches += 1
+            if (
+                connections & _EXPAND
+                and ci + 1 < len(columns)
+                and row < len(columns[ci + 1])
+                and columns[ci + 1][row] & _CONTRACT
+            ):
+                matches += 1
+    return matches, -len(columns)
+
+
+def _sequence_nibbles(packed: int) -> list[int]:
+    nibbles = []
+    while packed > _EMPTY_SEQUENCE:
+        nibbles.append(packed & 0xF)
+        packed >>= 4
+    return nibbles
+
+
+class SearchBudgetExhausted(Exception):
+    pass
+
+
+class Search:
+    """One search's transposition table and node count.
+
+    The table maps (packed state, depth) to the best score reachable. Every
+    state scored or expanded, rather than looked up, counts against the
+    budget, so the table never holds more than node_budget entries.
+
+    >>> search = Search(node_budget=100)
+    >>> try:
+    ...     search.value(pack_state(state_from_shorthand("fedcba98-12-34")), 4)
+    ... except SearchBudgetExhausted as e:
+    ...     print("exhausted after", e.args[0], "nodes")
+    exhausted after 100 nodes
+    >>> len(search.table) <= search.node_budget
+    True
+    """
+
+    def __init__(self, node_budget: int) -> None:
+        self.node_budget = node_budget
+        self.nodes = 0
+        self.table: dict[tuple[PackedState, int], Score] = {}
+
+    def value(self, packed: PackedState, depth: int) -> Score:
+        key = (packed, depth)
+        score = self.table.get(key)
+        if score is None:
+            if self.nodes >= self.node_budget:
+                raise SearchBudgetExhausted(self.nodes)
+            self.nodes += 1
+            adjacents = packed_adjacent_states(packed) if depth else []
+            if adjacents:
+                score = max(self.value(_, depth - 1) for _ in adjacents)
+            else:
+                score = connection_score(packed)
+            self.table[key] = score
+        return score
+
+
+class Solver:
+    """Iterative deepening search over packed states with a node budget.
+
+    Each call searches one move deeper at a time, up to max_depth, and keeps
+    the best move of the deepest depth it finished within node_budget. The
+    table of each call is dropped when it returns, so a long-running server
+    does not accumulate one.
+    """
+
+    def __init__(self, max_depth: int = 6, node_budget: int = 4_000) -> None:
+        self.max_depth = max_depth
+        self.node_budget = node_budget
+
+    def best_next_state(self, packed: PackedState) -> PackedState | None:
+        """
+        >>> solver = Solver()
+        >>> best = solver.best_next_state(pack_state(state_from_shorthand("2-1")))
+        >>> state_as_shorthand(unpack_state(best))
+        '-21'
+
+        Running out of budget keeps the best move of the last depth finished.
+
+        >>> packed = pack_state(state_from_shorthand("fedcba98-12-34-56-78-9a"))
+        >>> best = Solver(node_budget=100).best_next_state(packed)
+        >>> state_as_shorthand(unpack_state(best))
+        'edcba98-12-f34-56-78-9a'
+        """
+
+        adjacents = packed_adjacent_states(packed)
+        if not adjacents:
+            return None
+        search = Search(self.node_budget)
+        best = adjacents[0]
+        for depth in range(self.max_depth):
+            try:
+                best = max(adjacents, key=lambda _: search.value(_, depth))
+            except SearchBudgetExhausted:
+                break
+        return best
+
+
+_PACKED_TILES = [Tile(connections=Connection(i)) for i in range(16)]
+_AFTER, _BEFORE, _CONTRACT, _EXPAND = (_.value for _ in Connection)
+_SOLVER = Solver()
+
+
 @dataclass(kw_only=True, frozen=False)
 class Game:
     state: State = field(default_factory=State)
     state_changer: StateChanger = field(default_factory=DefaultStateChanger)
+    solver: Solver = field(default_factory=lambda: _SOLVER)
 
     def adjacent_states(self) -> Generator[State, None, None]:
         for adj in self.state_changer.adjacent_states(self.state):
             yield adj
 
+    def best_next_state(self) -> State | None:
+        """
+        Unknown ('x') tiles have no connections to score, so there is no
+        best move for a state that has any.
+
+        >>> print(Game(state=state_from_shorthand("1x2-3")).best_next_state())
+        None
+        """
+
+        try:
+            packed = pack_state(self.state)
+        except ValueError:
+            return None
+        best = self.solver.best_next_state(packed)
+        return None if best is None else unpack_state(best)
+
 
 _SHORTHAND_HEX_TO_TILE = dict(
     x=None,
@@ -317,11 +609,78 @@ def state_as_shorthand(state: State) -> str:
     return "-".join(shorthand_parts)
 
 
+def benchmark(
+    *,
+    requests: int = 2000,
+    concurrency: int = 8,
+    distinct_states: int = 50,
+) -> dict[str, float]:
+    """Measure requests/sec against a local server, uncached and cached.
+
+    Simulates a group of players revisiting a handful of states, half of
+    them sending back the ETag they were given.
+    """
+
+    shorthands = []
+    for _ in range(distinct_states):
+        shorthands.append(
+            state_as_shorthand(
+                State(
+                    columns=[[Tile.random()] for _ in range(3)],
+                    queue=[Tile.random() for _ in range(4)],
+                )
+            )
+        )
+    results = {}
+    for label, render in [
+        ("uncached", render_state_page),
+        ("cached", cached_render_state_page),
+    ]:
+        cached_render_state_page.cache_clear()
+        handler = type(
+            "BenchmarkHandler",
+            (SlipUpsRequestHandler,),
+            dict(render=staticmethod(render), quiet=True),
+        )
+        server = ThreadingHTTPServer(("localhost", 0), handler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://localhost:{server.server_port}/"
+        etags: dict[str, str] = {}
+
+        def player(offset: int) -> None:
+            for i in range(offset, requests, concurrency):
+                shorthand = shorthands[i % len(shorthands)]
+                headers = {}
+                if i % 2 and shorthand in etags:
+                    headers["If-None-Match"] = etags[shorthand]
+                try:
+                    with urlopen(Request(base_url + shorthand, headers=headers)) as r:
+                        r.read()
+                        etags[shorthand] = r.headers["ETag"]
+                except OSError as e:
+                    if getattr(e, "code", None) != HTTPStatus.NOT_MODIFIED:
+                        raise
+
+        started = perf_counter()
+        players = [Thread(target=player, args=(_,)) for _ in range(concurrency)]
+        for _ in players:
+            _.start()
+        for _ in players:
+            _.join()
+        results[label] = requests / (perf_counter() - started)
+        server.shutdown()
+        server.server_close()
+    return results
+
+
 if __name__ == "__main__":
     if argv[1:] == ["--doctest"]:
         import doctest
 
         doctest.testmod(optionflags=doctest.FAIL_FAST)
+    elif argv[1:] == ["--benchmark"]:
+        for label, rate in benchmark().items():
+            print(f"{label:>10} {rate:10.1f} requests/sec")
     else:
         site = "localhost"
         s = ThreadingHTTPServer(
@@ -1,26 +1,141 @@
 from __future__ import annotations
 
+import argparse
+import array
+import concurrent.futures
+import csv
 import dataclasses
+import datetime
+import functools
 import json
-import math
 import pathlib
 import re
 import shlex
 import sqlite3
 import sys
+import time
 import typing
+import urllib.parse
 
-# Bad attempt to clean up duplicates in the "worse" bucket,
-# if there are objects with the same keys and sizes in a "better" bucket.
-#
-# TODO: Look at using S3 Batch instead? Generate manifest.json?
+# Clean up duplicates in the "worse" bucket,
+# if there are objects with the same keys and sizes in a "better" bucket,
+# and optionally the same ETags too, when listed with s3api list-objects-v2.
+
+DELETE_OBJECTS_MAX_KEYS = 1000
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_RETRIES = 5
+RETRY_BASE_DELAY = 0.5
+READ_CHUNK_SIZE = 1 << 20
+
+S3_LS_PATTERN = re.compile(
+    r"^(?P<mtime>\d+-\d+-\d+\s+\d+:\d+:\d+)\s+(?P<sizebytes>\d+)\s+(?P<key>.+)"
+)
+# Where an array of objects starts in list-objects-v2 --output json. A key
+# cannot match, since quotes inside JSON strings are escaped.
+CONTENTS_START = re.compile(r'(?<!\\)"Contents"\s*:\s*\[')
+ARRAY_SEPARATOR = re.compile(r"[\s,]*")
+ELEMENT_TOKENS = re.compile(r'[][{}",\\]')
+# Past this, an object that does not decode is not kept, only skipped.
+MAX_OBJECT_CHARS = 1 << 20
 
 
 @dataclasses.dataclass(frozen=True)
 class S3ListingEntry:
-    mtime: str
+    mtime: int
     sizebytes: int
     key: str
+    etag: str | None = None
+
+
+@dataclasses.dataclass
+class ListingStats:
+    entries: int = 0
+    malformed: int = 0
+
+
+@functools.lru_cache(maxsize=4096)
+def _local_hour_epoch(hour: str) -> int:
+    return int(datetime.datetime.fromisoformat(hour + ":00:00").timestamp())
+
+
+def epoch_from_s3_ls(mtime: str) -> int:
+    """Epoch seconds of an aws s3 ls time, which is in local time"""
+    date, clock = mtime.split()
+    hh, mm, ss = clock.split(":")
+    return _local_hour_epoch(f"{date} {int(hh):02}") + int(mm) * 60 + int(ss)
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def epoch_from_iso8601(mtime: str) -> int:
+    return int(datetime.datetime.fromisoformat(mtime).timestamp())
+
+
+class S3ListingColumns:
+    """A listing kept as parallel typed arrays instead of an object per key
+
+    Keys are split at their last slash, and the prefixes interned, so the
+    many keys of one directory share a single prefix string.
+    """
+
+    def __init__(self):
+        self.mtimes = array.array("q")
+        self.sizes = array.array("q")
+        self.prefix_ids = array.array("L")
+        self.names: list[str] = []
+        self.etags: list[str | None] = []
+        self.storage_class_ids = array.array("B")
+        self.prefixes: list[str] = []
+        self.storage_classes: list[str | None] = []
+        self._prefix_ids: dict[str, int] = {}
+        self._storage_class_ids: dict[str | None, int] = {}
+        self.stats = ListingStats()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def append(
+        self,
+        mtime: int,
+        sizebytes: int,
+        key: str,
+        etag: str | None = None,
+        storage_class: str | None = None,
+    ) -> None:
+        prefix, slash, name = key.rpartition("/")
+        prefix += slash
+        prefix_id = self._prefix_ids.get(prefix)
+        if prefix_id is None:
+            prefix_id = self._prefix_ids[prefix] = len(self.prefixes)
+            self.prefixes.append(prefix)
+        storage_class_id = self._storage_class_ids.get(storage_class)
+        if storage_class_id is None:
+            storage_class_id = len(self.storage_classes)
+            self._storage_class_ids[storage_class] = storage_class_id
+            self.storage_classes.append(storage_class)
+        self.mtimes.append(mtime)
+        self.sizes.append(sizebytes)
+        self.prefix_ids.append(prefix_id)
+        self.names.append(name)
+        self.etags.append(etag)
+        self.storage_class_ids.append(storage_class_id)
+
+    def key(self, i: int) -> str:
+        return self.prefixes[self.prefix_ids[i]] + self.names[i]
+
+    def storage_class(self, i: int) -> str | None:
+        return self.storage_classes[self.storage_class_ids[i]]
+
+    def rows(self) -> typing.Generator[tuple[str, int, int, str | None], None, None]:
+        """(key, sizebytes, mtime, etag) of every entry"""
+        prefixes = self.prefixes
+        for prefix_id, name, size, mtime, etag in zip(
+            self.prefix_ids, self.names, self.sizes, self.mtimes, self.etags
+        ):
+            yield prefixes[prefix_id] + name, size, mtime, etag
+
+    def entries(self) -> typing.Generator[S3ListingEntry, None, None]:
+        for key, size, mtime, etag in self.rows():
+            yield S3ListingEntry(mtime=mtime, sizebytes=size, key=key, etag=etag)
 
 
 class S3CompareListings:
@@ -32,21 +147,28 @@ class S3CompareListings:
         self.ignore_directories = ignore_directories
         self.db = sqlite3.connect(":memory:")
         self.db.execute(
-            "create table compare(key text unique, bettersize integer, worsesize integer, bettermtime text, worsemtime text)"
+            "create table compare(key text unique, bettersize integer, worsesize integer, bettermtime integer, worsemtime integer, betteretag text, worseetag text)"
         )
 
     def update_entries(
-        self, better_or_worse: str, entries: typing.Iterable[S3ListingEntry]
+        self,
+        better_or_worse: str,
+        entries: S3ListingColumns | typing.Iterable[S3ListingEntry],
     ):
         size = f"{better_or_worse}size"
         mtime = f"{better_or_worse}mtime"
-        sql = f"insert into compare(key, {size}, {mtime}) values (?,?,?) on conflict(key) do update set {size}=excluded.{size}, {mtime}=excluded.{mtime}"
+        etag = f"{better_or_worse}etag"
+        sql = f"insert into compare(key, {size}, {mtime}, {etag}) values (?,?,?,?) on conflict(key) do update set {size}=excluded.{size}, {mtime}=excluded.{mtime}, {etag}=excluded.{etag}"
+        if isinstance(entries, S3ListingColumns):
+            rows = entries.rows()
+        else:
+            rows = ((e.key, e.sizebytes, e.mtime, e.etag) for e in entries)
         self.db.cursor().executemany(
             sql,
             (
-                (e.key, e.sizebytes, e.mtime)
-                for e in entries
-                if not (self.ignore_directories and e.key.endswith("/"))
+                row
+                for row in rows
+                if not (self.ignore_directories and row[0].endswith("/"))
             ),
         ).close()
 
@@ -97,12 +219,41 @@ class S3CompareListings:
     def not_same_size_entries(self) -> list[tuple[S3ListingEntry, S3ListingEntry]]:
         return self._size_entries(same=False)
 
+    def iter_duplicate_entries(
+        self, confirm_etag: bool = False
+    ) -> typing.Generator[tuple[S3ListingEntry, S3ListingEntry], None, None]:
+        """Stream same-size pairs in key order, straight off the key index
+
+        With confirm_etag, both sides also need the same known ETag.
+        """
+        sql = "select key, bettersize, bettermtime, betteretag, worsesize, worsemtime, worseetag from compare where bettersize is not null and bettersize = worsesize"
+        if confirm_etag:
+            sql += " and betteretag is not null and betteretag = worseetag"
+        sql += " order by key"
+        cur = self.db.cursor()
+        try:
+            for row in cur.execute(sql):
+                yield (
+                    S3ListingEntry(
+                        key=row[0], sizebytes=int(row[1]), mtime=row[2], etag=row[3]
+                    ),
+                    S3ListingEntry(
+                        key=row[0], sizebytes=int(row[4]), mtime=row[5], etag=row[6]
+                    ),
+                )
+        finally:
+            cur.close()
+
 
 class S3SimpleListing:
     def __init__(self, s3uri: str):
         self.s3uri = str(s3uri)
         self.db = sqlite3.connect(":memory:")
-        self.db.execute("create table listing(mtime text, sizebytes integer, key text)")
+        self.db.execute(
+            "create table listing(mtime integer, sizebytes integer, key text)"
+        )
+
+        self.stats = ListingStats()
 
     def load(self, path: pathlib.Path):
         f = pathlib.Path(path).open("rt", encoding="UTF-8")
@@ -111,7 +262,7 @@ class S3SimpleListing:
             with f:
                 cur.executemany(
                     "insert into listing(mtime, sizebytes, key) values (?,?,?)",
-                    listing_lines(f),
+                    listing_lines(f, self.stats),
                 )
         finally:
             cur.close()
@@ -127,33 +278,353 @@ class S3SimpleListing:
 
 def listing_lines(
     f: typing.TextIO,
-) -> typing.Generator[tuple[str, int, str], None, None]:
-    pattern = re.compile(
-        r"^(?P<mtime>\d+-\d+-\d+\s+\d+:\d+:\d+)\s+(?P<sizebytes>\d+)\s+(?P<key>.+)"
-    )
-    for line in f:
-        matched = pattern.match(line)
+    stats: ListingStats | None = None,
+) -> typing.Generator[tuple[int, int, str], None, None]:
+    """(mtime, sizebytes, key) of an aws s3 ls --recursive listing
+
+    Lines that do not parse are reported and counted in stats, then skipped.
+    """
+    if stats is None:
+        stats = ListingStats()
+    match = S3_LS_PATTERN.match
+    for lineno, line in enumerate(f, 1):
+        matched = match(line)
         if matched:
-            groups = matched.groups()
-            yield (str(groups[0]), int(groups[1]), str(groups[2]))
+            mtime, sizebytes, key = matched.groups()
+            stats.entries += 1
+            yield (epoch_from_s3_ls(mtime), int(sizebytes), key)
         else:
-            print("!!", line, file=sys.stderr)
-            sys.exit(1)
+            stats.malformed += 1
+            print("!!", lineno, line, end="", file=sys.stderr)
 
 
 def read_entries(
     f: typing.TextIO,
+    stats: ListingStats | None = None,
 ) -> typing.Generator[S3ListingEntry, None, None]:
-    pattern = re.compile(
-        r"^(?P<mtime>\d+-\d+-\d+\s+\d+:\d+:\d+)\s+(?P<sizebytes>\d+)\s+(?P<key>.+)"
-    )
-    for lineno, line in enumerate(f, 1):
-        matched = pattern.match(line)
-        if matched:
-            yield S3ListingEntry(**(matched.groupdict()))
+    for mtime, sizebytes, key in listing_lines(f, stats):
+        yield S3ListingEntry(mtime=mtime, sizebytes=sizebytes, key=key)
+
+
+class ElementEnd:
+    """Finds the end of a JSON array element, a chunk at a time
+
+    Only brackets, quotes and escapes are followed, not the JSON grammar, so
+    the end of an element that does not decode is still found, and a scan
+    can resume where the previous chunk ran out.
+    """
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def find(self, buf: str, pos: int) -> int:
+        """Index in buf of the , or ] ending the element, or -1 if not there"""
+        if self.escaped:
+            self.escaped = False
+            pos += 1
+        while matched := ELEMENT_TOKENS.search(buf, pos):
+            i = matched.start()
+            c = buf[i]
+            pos = i + 1
+            if self.in_string:
+                if c == '"':
+                    self.in_string = False
+                elif c == "\\":
+                    if pos == len(buf):
+                        self.escaped = True
+                    pos += 1
+            elif c == '"':
+                self.in_string = True
+            elif c in "{[":
+                self.depth += 1
+            elif self.depth:
+                if c in "}]":
+                    self.depth -= 1
+            elif c in ",]":
+                return i
+        return -1
+
+
+def iter_list_objects_v2(
+    f: typing.TextIO,
+    stats: ListingStats | None = None,
+    chunk_size: int = READ_CHUNK_SIZE,
+) -> typing.Generator[dict, None, None]:
+    """Objects of s3api list-objects-v2 --output json, read a chunk at a time
+
+    Only one object is decoded at a time, so the whole document, which the
+    CLI writes as one array for every page, is never held in memory. Pages
+    saved back to back are read too. An object that does not decode is
+    counted in stats as malformed and skipped up to the next one, as is
+    trailing data that does not decode.
+    """
+    if stats is None:
+        stats = ListingStats()
+    scan_once = json.JSONDecoder().scan_once
+    skip_separators = ARRAY_SEPARATOR.match
+    buf = ""
+    at = 0
+    in_contents = False
+    eof = False
+    # Set while the object at `at` does not decode: how far its end has been
+    # looked for, and whether it was too long to keep.
+    element_end: ElementEnd | None = None
+    scanned = 0
+    discarded = False
+    while True:
+        if element_end is not None:
+            boundary = element_end.find(buf, scanned)
+            if boundary < 0:
+                scanned = len(buf)
+                if not discarded and scanned - at > MAX_OBJECT_CHARS:
+                    discarded = True
+                if discarded:
+                    at = scanned
+            else:
+                element_end = None
+                if not discarded:
+                    # It may only have been cut short by the chunk boundary.
+                    try:
+                        item, end = scan_once(buf, at)
+                    except (json.JSONDecodeError, StopIteration):
+                        pass
+                    else:
+                        at = end
+                        yield item
+                        continue
+                stats.malformed += 1
+                at = boundary
+                continue
+        elif in_contents:
+            at = skip_separators(buf, at).end()
+            if at < len(buf) and buf[at] == "]":
+                in_contents = False
+                at += 1
+                continue
+            if at < len(buf):
+                try:
+                    item, end = scan_once(buf, at)
+                except (json.JSONDecodeError, StopIteration):
+                    element_end = ElementEnd()
+                    scanned = at
+                    discarded = False
+                else:
+                    at = end
+                    yield item
+                continue
+        else:
+            matched = CONTENTS_START.search(buf, at)
+            if matched:
+                in_contents = True
+                at = matched.end()
+                continue
+            # Keep enough of the tail for a start split across chunks.
+            at = max(at, len(buf) - 32)
+        if eof:
+            if in_contents:
+                stats.malformed += 1
+            return
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf = buf[at:] + chunk
+        scanned -= at
+        at = 0
+
+
+def load_list_objects_v2(f: typing.TextIO, columns: S3ListingColumns) -> None:
+    stats = columns.stats
+    for item in iter_list_objects_v2(f, stats):
+        try:
+            columns.append(
+                epoch_from_iso8601(item["LastModified"]),
+                int(item["Size"]),
+                item["Key"],
+                item.get("ETag", "").strip('"') or None,
+                item.get("StorageClass"),
+            )
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            stats.malformed += 1
+            print("!!", repr(e), json.dumps(item), file=sys.stderr)
         else:
-            print("!!", lineno, line, file=sys.stderr)
-            sys.exit(1)
+            stats.entries += 1
+
+
+def load_s3_ls(f: typing.TextIO, columns: S3ListingColumns) -> None:
+    for mtime, sizebytes, key in listing_lines(f, columns.stats):
+        columns.append(mtime, sizebytes, key)
+
+
+def load_listing(path: pathlib.Path) -> S3ListingColumns:
+    """An aws s3 ls --recursive listing, or list-objects-v2 JSON (*.json)"""
+    columns = S3ListingColumns()
+    with pathlib.Path(path).open("rt", encoding="UTF-8") as f:
+        if pathlib.Path(path).suffix == ".json":
+            load_list_objects_v2(f, columns)
+        else:
+            load_s3_ls(f, columns)
+    return columns
+
+
+class DeleteObjectsChunkWriter:
+    """Write delete-objects request files as keys arrive, 1000 keys each
+
+    A shell script with one aws s3api delete-objects line per chunk is
+    written alongside.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        name_prefix: str,
+        chunksize: int = DELETE_OBJECTS_MAX_KEYS,
+    ):
+        self.bucket = bucket
+        self.name_prefix = name_prefix
+        self.chunksize = chunksize
+        self.keys: list[str] = []
+        self.chunk_paths: list[pathlib.Path] = []
+        self.count = 0
+        self.shout = open(f"{name_prefix}.sh.txt", "wt")
+
+    def __enter__(self) -> DeleteObjectsChunkWriter:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def add(self, key: str) -> None:
+        self.keys.append(key)
+        self.count += 1
+        if len(self.keys) >= self.chunksize:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.keys:
+            return
+        chunkoutname = f"{self.name_prefix}.{len(self.chunk_paths) + 1:05}.json"
+        with open(chunkoutname, "wt") as chunkout:
+            json.dump(
+                dict(Objects=[dict(Key=k) for k in self.keys], Quiet=True),
+                chunkout,
+                indent=" ",
+            )
+        print(
+            f"aws s3api delete-objects --bucket {shlex.quote(self.bucket)} --delete file://{shlex.quote(chunkoutname)}",
+            file=self.shout,
+        )
+        self.shout.flush()
+        self.chunk_paths.append(pathlib.Path(chunkoutname))
+        self.keys = []
+
+    def close(self) -> None:
+        self.flush()
+        self.shout.close()
+
+
+class BatchManifestWriter:
+    """Write an S3 Batch Operations CSV manifest as keys arrive"""
+
+    def __init__(self, bucket: str, name_prefix: str):
+        self.bucket = bucket
+        self.path = pathlib.Path(f"{name_prefix}.manifest.csv")
+        self.count = 0
+        self.out = self.path.open("wt", newline="")
+        self.writer = csv.writer(self.out)
+
+    def __enter__(self) -> BatchManifestWriter:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def add(self, key: str) -> None:
+        # Batch Operations wants the keys URL-encoded.
+        self.writer.writerow([self.bucket, urllib.parse.quote(key)])
+        self.count += 1
+
+    def close(self) -> None:
+        self.out.close()
+
+
+def plan_deletes(
+    compare: S3CompareListings,
+    writer: DeleteObjectsChunkWriter | BatchManifestWriter,
+    confirm_etag: bool = False,
+) -> int:
+    """Hand every duplicate worse key to writer, returning how many"""
+    with writer:
+        for better, worse in compare.iter_duplicate_entries(confirm_etag):
+            writer.add(worse.key)
+    return writer.count
+
+
+def _delete_chunk(
+    s3, bucket: str, chunk_path: pathlib.Path, retries: int, base_delay: float
+) -> tuple[int, list[dict]]:
+    with open(chunk_path) as f:
+        objects = json.load(f)["Objects"]
+    deleted = 0
+    errors: list[dict] = []
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(base_delay * 2 ** (attempt - 1))
+        try:
+            response = s3.delete_objects(
+                Bucket=bucket, Delete=dict(Objects=objects, Quiet=True)
+            )
+        except Exception as e:
+            # Throttling and 5xx answers are raised rather than listed.
+            if attempt == retries:
+                raise
+            print(f"!!  {chunk_path}  {e}", file=sys.stderr)
+            continue
+        errors = response.get("Errors", [])
+        failed = {e["Key"] for e in errors}
+        deleted += len(objects) - len(failed)
+        objects = [o for o in objects if o["Key"] in failed]
+        if not objects:
+            break
+    return deleted, errors
+
+
+def run_delete_chunks(
+    s3,
+    bucket: str,
+    chunk_paths: typing.Iterable[pathlib.Path],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    retries: int = DEFAULT_RETRIES,
+    base_delay: float = RETRY_BASE_DELAY,
+) -> tuple[int, list[dict]]:
+    """Run delete-objects chunk files concurrently, retrying failed keys
+
+    Returns how many keys were deleted, and the errors of the keys that were
+    still failing after the last retry.
+    """
+    deleted = 0
+    errors: list[dict] = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_delete_chunk, s3, bucket, p, retries, base_delay): p
+            for p in chunk_paths
+        }
+        for future in concurrent.futures.as_completed(futures):
+            chunk_deleted, chunk_errors = future.result()
+            print(
+                f"##  {futures[future]}  {chunk_deleted:>5}  {len(chunk_errors):>5}",
+                file=sys.stderr,
+            )
+            deleted += chunk_deleted
+            errors.extend(chunk_errors)
+    return deleted, errors
+
+
+def make_s3_client(profile_name: str | None = None, endpoint_url: str | None = None):
+    import boto3
+
+    session = boto3.session.Session(profile_name=profile_name)
+    return session.client("s3", endpoint_url=endpoint_url)
 
 
 def main1():
@@ -168,10 +639,24 @@ def main1():
         print(f"++  {len(l):>7}  {l.s3uri}")
 
 
-def main2():
-    betterpath, worsepath = [pathlib.Path(a) for a in sys.argv[1:3]]
+def main2(argv: list[str] = sys.argv):
+    parser = argparse.ArgumentParser(prog=argv[0])
+    parser.add_argument("better", type=pathlib.Path)
+    parser.add_argument("worse", type=pathlib.Path)
+    parser.add_argument(
+        "--confirm-etag",
+        action="store_true",
+        help="only plan keys whose ETags match too (list-objects-v2 JSON listings)",
+    )
+    parser.add_argument(
+        "--batch-manifest",
+        action="store_true",
+        help="write an S3 Batch Operations manifest instead of delete-objects chunks",
+    )
+    args = parser.parse_args(argv[1:])
+    betterpath, worsepath = args.better, args.worse
     betterbucket, worsebucket = [
-        p.name.removeprefix("example.").removesuffix(".lst")
+        p.name.removeprefix("example.").removesuffix(p.suffix)
         for p in (betterpath, worsepath)
     ]
     betters3uri, worses3uri = [f"s3://{b}/" for b in (betterbucket, worsebucket)]
@@ -180,54 +665,45 @@ def main2():
         ("better", betterpath),
         ("worse", worsepath),
     ]:
-        f = pathlib.Path(p).open("rt", encoding="UTF-8")
-        with f:
-            compare.update_entries(better_or_worse, read_entries(f))
+        columns = load_listing(p)
+        compare.update_entries(better_or_worse, columns)
         s3uri = getattr(compare, better_or_worse + "_s3uri", "")
         print(f"##  {better_or_worse:<8}  {len(compare):>7}  {s3uri}", file=sys.stderr)
+        if columns.stats.malformed:
+            print(f"!!  malformed {columns.stats.malformed:>7}  {p}", file=sys.stderr)
 
-    same_sizes = compare.same_size_entries()
-    print(f"##  samesize  {len(same_sizes):>7}", file=sys.stderr)
-    not_same_sizes = compare.not_same_size_entries()
-    print(f"##  diffsize  {len(not_same_sizes):>7}", file=sys.stderr)
-    delete_worse_keys = []
-    with open("example.remove-worse.txt", "wt") as chunkout:
-        command_prefix = "aws s3 rm " + shlex.quote(compare.worse_s3uri)
-        for better, worse in same_sizes:
-            print(command_prefix + shlex.quote(worse.key), file=chunkout)
-            delete_worse_keys.append(worse.key)
-    delete_worse_keys.sort()
-    chunksize = 1000
-    chunkcount = math.ceil(len(delete_worse_keys) / chunksize)
-    chunknumwidth = math.ceil(math.log10(chunkcount))
-    chunkoutnamefmt = f"example.delete-worse.{{chunkno:0{chunknumwidth}}}.json"
-    chunknum = 0
-    with open("example.delete-worse.sh.txt", "wt") as shout:
-        for i in range(0, len(delete_worse_keys), chunksize):
-            chunknum += 1
-            chunkoutname = chunkoutnamefmt.format(chunkno=chunknum)
-            print(
-                f"aws s3api delete-objects --bucket {shlex.quote(worsebucket)} --delete file://{shlex.quote(chunkoutname)}",
-                file=shout,
-            )
-            with open(chunkoutname, "wt") as chunkout:
-                json.dump(
-                    dict(
-                        Objects=[
-                            dict(Key=k)
-                            for k in delete_worse_keys[
-                                i : min(len(delete_worse_keys), i + chunksize)
-                            ]
-                        ],
-                        Quiet=True,
-                    ),
-                    chunkout,
-                    indent=" ",
-                )
+    if args.batch_manifest:
+        writer = BatchManifestWriter(worsebucket, "example.delete-worse")
+    else:
+        writer = DeleteObjectsChunkWriter(worsebucket, "example.delete-worse")
+    planned = plan_deletes(compare, writer, confirm_etag=args.confirm_etag)
+    print(f"##  planned   {planned:>7}", file=sys.stderr)
+
+
+def main_run(argv: list[str] = sys.argv):
+    parser = argparse.ArgumentParser(prog=argv[0])
+    parser.add_argument("bucket")
+    parser.add_argument("chunks", nargs="+", type=pathlib.Path)
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES)
+    parser.add_argument("--profile")
+    parser.add_argument("--endpoint-url")
+    args = parser.parse_args(argv[1:])
+    s3 = make_s3_client(args.profile, args.endpoint_url)
+    deleted, errors = run_delete_chunks(
+        s3, args.bucket, args.chunks, args.max_workers, args.retries
+    )
+    print(f"##  deleted   {deleted:>7}", file=sys.stderr)
+    for e in errors:
+        print("!!", json.dumps(e), file=sys.stderr)
+    sys.exit(1 if errors else 0)
 
 
 def main():
-    main2()
+    if sys.argv[1:2] == ["run-delete-chunks"]:
+        main_run([sys.argv[0]] + sys.argv[2:])
+    else:
+        main2()
 
 
 if __name__ == "__main__":
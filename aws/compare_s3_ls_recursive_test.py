@@ -0,0 +1,202 @@
+import importlib.util
+import io
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import boto3
+from moto.server import ThreadedMotoServer
+
+spec = importlib.util.spec_from_file_location(
+    "compare_s3_ls_recursive",
+    pathlib.Path(__file__).with_name("compare-s3-ls-recursive.py"),
+)
+cslr = sys.modules[spec.name] = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(cslr)
+
+
+def list_objects_v2_page(contents):
+    return {
+        "Contents": [
+            {
+                "Key": key,
+                "LastModified": "2024-01-01T00:00:00+00:00",
+                "ETag": f'"{etag}"',
+                "Size": size,
+                "StorageClass": "STANDARD",
+            }
+            for key, size, etag in contents
+        ]
+    }
+
+
+class TestDeletePlan(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def compare(self):
+        better = [("a", 1, "e1"), ("b", 2, "e2"), ("c", 3, "e3"), ("d/", 0, "e0")]
+        worse = [("a", 1, "e1"), ("b", 2, "xx"), ("c", 4, "e3"), ("d/", 0, "e0")]
+        compare = cslr.S3CompareListings("s3://better/", "s3://worse/")
+        for better_or_worse, contents in (("better", better), ("worse", worse)):
+            path = pathlib.Path(f"{better_or_worse}.json")
+            # Paginated output is several documents back to back.
+            path.write_text(
+                json.dumps(list_objects_v2_page(contents[:2]))
+                + "\n"
+                + json.dumps(list_objects_v2_page(contents[2:]))
+            )
+            compare.update_entries(better_or_worse, cslr.load_listing(path))
+        return compare
+
+    def test_chunks_are_written_as_duplicates_stream(self):
+        writer = cslr.DeleteObjectsChunkWriter("worse", "plan", chunksize=1)
+        self.assertEqual(2, cslr.plan_deletes(self.compare(), writer))
+        self.assertEqual(
+            [pathlib.Path("plan.00001.json"), pathlib.Path("plan.00002.json")],
+            writer.chunk_paths,
+        )
+        self.assertEqual(
+            [{"Key": "b"}],
+            json.loads(pathlib.Path("plan.00002.json").read_text())["Objects"],
+        )
+        self.assertEqual(2, len(pathlib.Path("plan.sh.txt").read_text().splitlines()))
+
+    def test_etag_confirmation_and_batch_manifest(self):
+        writer = cslr.BatchManifestWriter("worse", "plan")
+        self.assertEqual(
+            1, cslr.plan_deletes(self.compare(), writer, confirm_etag=True)
+        )
+        self.assertEqual("worse,a\n", writer.path.read_text())
+
+
+class TestIngestion(unittest.TestCase):
+    def test_list_objects_v2_is_streamed_into_columns(self):
+        contents = [(f"dir{i % 2}/k{i}", i, f"e{i}") for i in range(7)]
+        pages = json.dumps(list_objects_v2_page(contents[:4]), indent=2) + json.dumps(
+            list_objects_v2_page(contents[4:])
+        )
+        for chunk_size in (1, 7, 1 << 20):
+            items = cslr.iter_list_objects_v2(io.StringIO(pages), chunk_size=chunk_size)
+            self.assertEqual([_[0] for _ in contents], [_["Key"] for _ in items])
+        columns = cslr.S3ListingColumns()
+        cslr.load_list_objects_v2(io.StringIO(pages), columns)
+        self.assertEqual([_[0] for _ in contents], [_[0] for _ in columns.rows()])
+        self.assertEqual(["dir0/", "dir1/"], columns.prefixes)
+        self.assertEqual(1704067200, columns.mtimes[0])
+        self.assertEqual("e6", columns.etags[6])
+        self.assertEqual("STANDARD", columns.storage_class(6))
+        self.assertEqual(cslr.ListingStats(entries=7, malformed=0), columns.stats)
+
+    def test_malformed_input_is_counted(self):
+        page = list_objects_v2_page([("a", 1, "e1"), ("b", 2, "e2")])
+        del page["Contents"][0]["Size"]
+        truncated = json.dumps(page) + '{"Contents": [{"Key": "c"'
+        columns = cslr.S3ListingColumns()
+        cslr.load_list_objects_v2(io.StringIO(truncated), columns)
+        self.assertEqual(["b"], list(columns.names))
+        self.assertEqual(cslr.ListingStats(entries=1, malformed=2), columns.stats)
+
+        listing = "2024-01-01 00:00:00          5 a/b\nnot a listing line\n"
+        columns = cslr.S3ListingColumns()
+        cslr.load_s3_ls(io.StringIO(listing), columns)
+        self.assertEqual(["a/b"], [columns.key(0)])
+        self.assertEqual(cslr.ListingStats(entries=1, malformed=1), columns.stats)
+
+    def test_malformed_object_mid_file_is_skipped(self):
+        contents = [(f"k{i}", i, f"e{i}") for i in range(2000)]
+        page = json.dumps(list_objects_v2_page(contents), indent=2)
+        for bad in ('"Size": 5,', '"Key": "k5",'):
+            corrupt = page.replace(bad, bad[:-1] + 'x, "a\\"]},",', 1)
+            expected = [_[0] for _ in contents if _[0] != "k5"]
+            for chunk_size in (1, 7, 1 << 20):
+                stats = cslr.ListingStats()
+                items = cslr.iter_list_objects_v2(
+                    io.StringIO(corrupt), stats, chunk_size=chunk_size
+                )
+                self.assertEqual(expected, [_["Key"] for _ in items])
+                self.assertEqual(1, stats.malformed)
+
+    def test_overlong_malformed_object_is_not_kept(self):
+        page = json.dumps(list_objects_v2_page([("a", 1, "e1"), ("b", 2, "e2")]))
+        junk = "[" * 200 + "]" * 200 + " x"
+        corrupt = page.replace('"Size": 1', '"Size": ' + junk)
+        for chunk_size in (1, 16):
+            stats = cslr.ListingStats()
+            with mock.patch.object(cslr, "MAX_OBJECT_CHARS", 200):
+                items = cslr.iter_list_objects_v2(
+                    io.StringIO(corrupt), stats, chunk_size
+                )
+                self.assertEqual(["b"], [_["Key"] for _ in items])
+            self.assertEqual(1, stats.malformed)
+
+
+class TestRunDeleteChunks(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+        cls.server.start()
+        host, port = cls.server.get_host_and_port()
+        cls.endpoint_url = f"http://{host}:{port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.s3 = boto3.client(
+            "s3",
+            endpoint_url=self.endpoint_url,
+            region_name="us-east-1",
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+        )
+        self.s3.create_bucket(Bucket="worse")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_chunks_run_concurrently_and_failures_are_retried(self):
+        keys = [f"k{i:03}" for i in range(25)]
+        for key in keys:
+            self.s3.put_object(Bucket="worse", Key=key, Body=b"x")
+        with cslr.DeleteObjectsChunkWriter("worse", "plan", chunksize=10) as writer:
+            for key in keys[:20]:
+                writer.add(key)
+
+        failures = {"plan.00002.json": 1}
+        delete_objects = self.s3.delete_objects
+
+        def flaky_delete_objects(**kwargs):
+            first = kwargs["Delete"]["Objects"][0]["Key"]
+            chunk = f"plan.{int(first[1:]) // 10 + 1:05}.json"
+            if failures.get(chunk):
+                failures[chunk] -= 1
+                raise ConnectionError("stand-in throttling")
+            return delete_objects(**kwargs)
+
+        self.s3.delete_objects = flaky_delete_objects
+        deleted, errors = cslr.run_delete_chunks(
+            self.s3, "worse", writer.chunk_paths, max_workers=2, base_delay=0
+        )
+        self.assertEqual((20, []), (deleted, errors))
+        left = self.s3.list_objects_v2(Bucket="worse")["Contents"]
+        self.assertEqual(keys[20:], [_["Key"] for _ in left])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,11 @@
+import argparse
 import datetime
 import json
 import os
 import subprocess
+import sys
 from abc import abstractclassmethod, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from icecream import ic
@@ -17,11 +20,14 @@ EXT_JSON = ".json"
 NAME_IAM_LIST_POLICIES = "iam-list-policies"
 
 JSON_ARN = "Arn"
+JSON_DEFAULT_VERSION_ID = "DefaultVersionId"
+JSON_FETCHED_AT = "FetchedAt"
 JSON_POLICIES = "Policies"
 JSON_UPDATE_DATE = "UpdateDate"
 
-NOW = datetime.datetime.utcnow()
+NOW = datetime.datetime.now(datetime.timezone.utc)
 EXPIRY = datetime.timedelta(days=1)
+DEFAULT_MAX_WORKERS = 8
 
 
 class CachedJSON:
@@ -32,11 +38,10 @@ class CachedJSON:
         self.args = None
         self.data = None
         self.out = None
-        self._expiration = NOW + EXPIRY
+        self._expiration = None
 
         if self.path.exists():
             self.load()
-        self._refresh()
 
     def load(self):
         with open(self.path) as f:
@@ -52,17 +57,31 @@ class CachedJSON:
         pass
 
     def refresh(self, force=False):
-        if force or self.expired:
-            self._refresh()
-            self._on_load()
-            with open(self.path, "w") as f:
-                ic(self.path)
-                json.dump(self.data, f, indent=2, sort_keys=True)
+        """Fetch and save again if expired, returning whether it did"""
+        if not (force or self.expired):
+            return False
+        self._refresh()
+        self.data[JSON_FETCHED_AT] = NOW.isoformat()
+        self._on_load()
+        with open(self.path, "w") as f:
+            ic(self.path)
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        return True
+
+    @property
+    def fetched_at(self):
+        if self.data and self.data.get(JSON_FETCHED_AT):
+            return datetime.datetime.fromisoformat(self.data[JSON_FETCHED_AT])
+        return None
 
     @property
     def expired(self):
+        if self.data is None:
+            return True
+        if self._expiration is None and self.fetched_at:
+            self._expiration = self.fetched_at + EXPIRY
         ic(NOW, self._expiration)
-        return NOW > self._expiration
+        return self._expiration is None or NOW > self._expiration
 
 
 class IAMListPoliciesJSON(CachedJSON):
@@ -87,7 +106,6 @@ class IAMListPoliciesJSON(CachedJSON):
             self._max_update_date_as_datetime = datetime.datetime.fromisoformat(
                 self.max_update_date
             )
-            self._expiration = self._max_update_date_as_datetime + EXPIRY
         return self._max_update_date_as_datetime
 
     def _on_load(self):
@@ -95,6 +113,11 @@ class IAMListPoliciesJSON(CachedJSON):
         self._max_update_date_as_datetime = None
         if self.policies:
             self.policies.sort(key=arn_for_object)
+        # Good for a day after the later of the fetch and the newest update.
+        self._expiration = None
+        known = [_ for _ in (self.fetched_at, self.max_update_date_as_datetime) if _]
+        if known:
+            self._expiration = max(known) + EXPIRY
         ic(self.max_update_date_as_datetime)
 
     def _refresh(self):
@@ -103,13 +126,15 @@ class IAMListPoliciesJSON(CachedJSON):
 
 
 class AWSCLICommand:
+    executable = ID_AWS
+
     def __init__(self, *args, **kwargs):
         self.args = args
         self.kwargs = kwargs
-        cmd = ["aws", "--output", "json"]
+        cmd = [self.executable, "--output", "json"]
         cmd.extend(args)
         for k, v in kwargs.items():
-            cmd.append("--" + k.replace("-", "_"))
+            cmd.append("--" + k.replace("_", "-"))
             cmd.append(v)
         self.cmd = cmd
         ic(self.cmd)
@@ -136,37 +161,109 @@ def service_for_arn(arn):
     return None
 
 
-def path_for_out(o):
+def path_for_out(o, out=None):
     name = str(o)
     # arn = arn_for_object(o)
     # if arn:
     #     service = service_for_arn(arn)
-    return PATH_OUT / (name + EXT_JSON)
+    return (PATH_OUT if out is None else Path(out)) / (name + EXT_JSON)
+
+
+def mtime_ns_fromisoformat(date_string):
+    as_datetime = datetime.datetime.fromisoformat(date_string)
+    as_timestamp = as_datetime.timestamp()
+    return int(as_timestamp * 1e9)
 
 
 def set_mtime_fromisoformat(path, date_string):
     path = Path(path)
     same_atime_ns = path.stat().st_atime_ns
-    as_datetime = datetime.datetime.fromisoformat(date_string)
-    as_timestamp = as_datetime.timestamp()
-    new_mtime_ns = int(as_timestamp * 1e9)
+    new_mtime_ns = mtime_ns_fromisoformat(date_string)
     ns = (same_atime_ns, new_mtime_ns)
     os.utime(path, ns=ns)
 
 
-# whoami = AWSCall("sts", "get-caller-identity")
-# ic(whoami.data)
-
-saved_iam_list_policies_path = path_for_out(NAME_IAM_LIST_POLICIES)
-saved_iam_list_policies = IAMListPoliciesJSON(saved_iam_list_policies_path, scope="AWS")
-saved_iam_list_policies.refresh()
-set_mtime_fromisoformat(
-    saved_iam_list_policies_path,
-    saved_iam_list_policies.max_update_date,
-)
-
-
-# new_policies = policies.data[JSON_POLICIES]
-# ic(new_policies[0][JSON_ARN])
-# new_policies.sort(key=arn_for_object)
-# ic(new_policies[0][JSON_ARN])
+def has_mtime_fromisoformat(path, date_string):
+    try:
+        mtime_ns = Path(path).stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+    return mtime_ns == mtime_ns_fromisoformat(date_string)
+
+
+def fetch_policy_document(policy, out=None):
+    """Save the default version of policy under out, dated by its UpdateDate"""
+    arn = arn_for_object(policy)
+    command = AWSCLICommand(
+        "iam",
+        "get-policy-version",
+        policy_arn=arn,
+        version_id=policy[JSON_DEFAULT_VERSION_ID],
+    )
+    path = path_for_out(arn, out)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(command.data, f, indent=2, sort_keys=True)
+    set_mtime_fromisoformat(path, policy[JSON_UPDATE_DATE])
+    return path
+
+
+def mirror_policy_documents(list_policies, out=None, max_workers=DEFAULT_MAX_WORKERS):
+    """Fetch the documents of policies updated since they were last saved
+
+    A saved document has its policy's UpdateDate as mtime, so only policies
+    whose UpdateDate changed, or that were never saved, are fetched again.
+    """
+    wanted = [
+        _
+        for _ in list_policies.policies
+        if not has_mtime_fromisoformat(
+            path_for_out(arn_for_object(_), out), _[JSON_UPDATE_DATE]
+        )
+    ]
+    ic(len(wanted))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda _: fetch_policy_document(_, out), wanted))
+
+
+def init_parser(prog=None):
+    parser = argparse.ArgumentParser(prog=prog)
+    parser.add_argument(
+        "--force", action="store_true", help="refresh even if not expired"
+    )
+    parser.add_argument(
+        "--mirror",
+        action="store_true",
+        help="also save the document of every changed policy",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+        help="concurrent get-policy-version calls (%(default)s)",
+    )
+    return parser
+
+
+def main(argv=sys.argv):
+    args = init_parser(prog=argv[0]).parse_args(argv[1:])
+    PATH_OUT.mkdir(exist_ok=True)
+
+    # whoami = AWSCall("sts", "get-caller-identity")
+    # ic(whoami.data)
+
+    saved_iam_list_policies_path = path_for_out(NAME_IAM_LIST_POLICIES)
+    saved_iam_list_policies = IAMListPoliciesJSON(
+        saved_iam_list_policies_path, scope="AWS"
+    )
+    if saved_iam_list_policies.refresh(force=args.force):
+        set_mtime_fromisoformat(
+            saved_iam_list_policies_path,
+            saved_iam_list_policies.max_update_date,
+        )
+    if args.mirror:
+        mirror_policy_documents(saved_iam_list_policies, max_workers=args.max_workers)
+
+
+if __name__ == "__main__":
+    main()
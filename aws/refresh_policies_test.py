@@ -0,0 +1,103 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import refresh_policies as rp
+
+POLICIES = [
+    {
+        "Arn": "arn:aws:iam::aws:policy/service-role/B",
+        "DefaultVersionId": "v2",
+        "UpdateDate": "2024-01-02T00:00:00+00:00",
+    },
+    {
+        "Arn": "arn:aws:iam::aws:policy/A",
+        "DefaultVersionId": "v1",
+        "UpdateDate": "2024-01-01T00:00:00+00:00",
+    },
+]
+
+STUB_AWS = """#!{python}
+import json, os, sys
+with open(os.environ["STUB_AWS_LOG"], "a") as f:
+    f.write(json.dumps(sys.argv[1:]) + "\\n")
+args = sys.argv[1:]
+if "list-policies" in args:
+    with open(os.environ["STUB_AWS_POLICIES"]) as f:
+        print(f.read())
+else:
+    arn = args[args.index("--policy-arn") + 1]
+    version = args[args.index("--version-id") + 1]
+    print(json.dumps({{"PolicyVersion": {{"Arn": arn, "VersionId": version}}}}))
+"""
+
+
+class TestRefreshPolicies(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        stub = self.dir / "aws"
+        stub.write_text(STUB_AWS.format(python=sys.executable))
+        stub.chmod(0o755)
+        self.log = self.dir / "aws.log"
+        self.log.touch()
+        self.policies = self.dir / "policies.json"
+        self.write_policies(POLICIES)
+        os.environ["STUB_AWS_LOG"] = str(self.log)
+        os.environ["STUB_AWS_POLICIES"] = str(self.policies)
+        self.saved_executable = rp.AWSCLICommand.executable
+        rp.AWSCLICommand.executable = str(stub)
+        self.out = self.dir / "out"
+        self.out.mkdir()
+        self.list_path = rp.path_for_out(rp.NAME_IAM_LIST_POLICIES, self.out)
+
+    def tearDown(self):
+        rp.AWSCLICommand.executable = self.saved_executable
+        self.tmp.cleanup()
+
+    def write_policies(self, policies):
+        self.policies.write_text(json.dumps({"Policies": policies}))
+
+    def calls(self):
+        return [json.loads(_)[3] for _ in self.log.read_text().splitlines()]
+
+    def test_fresh_cache_is_not_fetched_again(self):
+        self.assertTrue(rp.IAMListPoliciesJSON(self.list_path).refresh())
+        cached = rp.IAMListPoliciesJSON(self.list_path)
+        self.assertFalse(cached.expired)
+        self.assertFalse(cached.refresh())
+        self.assertTrue(cached.refresh(force=True))
+        self.assertEqual(["list-policies", "list-policies"], self.calls())
+        self.assertEqual("arn:aws:iam::aws:policy/A", cached.policies[0]["Arn"])
+
+    def test_mirror_fetches_only_changed_documents(self):
+        listed = rp.IAMListPoliciesJSON(self.list_path)
+        listed.refresh()
+        paths = rp.mirror_policy_documents(listed, self.out, max_workers=2)
+        self.assertEqual(2, len(paths))
+        b = rp.path_for_out(POLICIES[0]["Arn"], self.out)
+        self.assertEqual(
+            {"PolicyVersion": {"Arn": POLICIES[0]["Arn"], "VersionId": "v2"}},
+            json.loads(b.read_text()),
+        )
+        self.assertEqual(
+            rp.mtime_ns_fromisoformat(POLICIES[0]["UpdateDate"]), b.stat().st_mtime_ns
+        )
+
+        changed = dict(POLICIES[0], UpdateDate="2024-02-01T00:00:00+00:00")
+        self.write_policies([changed, POLICIES[1]])
+        listed.refresh(force=True)
+        self.assertEqual([b], rp.mirror_policy_documents(listed, self.out))
+        self.assertEqual(
+            ["list-policies"]
+            + ["get-policy-version"] * 2
+            + ["list-policies", "get-policy-version"],
+            self.calls(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,75 +1,220 @@
+"""
+Compare Cumulus collection configs from the API with the ones in the repo
+
+usage: compare_collections_json.py 'API_PAGE_GLOB' REPO_COLLECTIONS_DIR
+
+Pages and files are read and parsed in parallel. Every collection gets a
+structural hash of each of its subtrees, so identical collections, and
+identical parts of the ones that differ, are skipped without walking them.
+Every difference of every collection is reported, apart from the ones
+matched by IGNORE.
+"""
+
+import re
+from collections import ChainMap, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from glob import iglob
-from json import loads
+from hashlib import blake2b
+from json import dumps, loads
 from pathlib import Path
 from sys import argv
 
-from dictdiffer import diff
 from icecream import ic
 
-glob_json_from_api = argv[1]
-ic(glob_json_from_api)
+DEFAULT_MAX_WORKERS = 16
+API_TIMESTAMP_KEYS = ("createdAt", "updatedAt", "timestamp")
 
-collections_from_api = {}
-for json_from_api in iglob(glob_json_from_api):
-    ic(json_from_api)
-    f = open(json_from_api)
-    with f:
-        j = loads(f.read())
-        r = j["results"]
-        if r:
-            for c in r:
-                for tskey in ("createdAt", "updatedAt", "timestamp"):
-                    del c[tskey]
-                collections_from_api[c["name"]] = c
+ADD = "add"
+REMOVE = "remove"
+CHANGE = "change"
+ANY = object()
 
-ic(collections_from_api.keys())
 
+Difference = namedtuple("Difference", ("kind", "path", "old", "new"))
 
-path_collections_from_repo = Path(argv[2])
-ic(path_collections_from_repo)
 
-collections_from_repo = {}
-for json_from_repo in path_collections_from_repo.glob("*.json"):
-    name = Path(json_from_repo).stem
-    ic(json_from_repo)
-    f = open(json_from_repo)
-    with f:
+def compile_path_pattern(pattern):
+    """Compile a dotted path pattern, where * matches any one key or index"""
+    parts = ["[^.]+" if part == "*" else re.escape(part) for part in pattern.split(".")]
+    return re.compile(r"\.".join(parts) + r"\Z")
+
+
+class Ignore(namedtuple("Ignore", ("kind", "path", "old", "new"))):
+    """A difference that is expected, old and new default to any value"""
+
+    def __new__(cls, kind, path, old=ANY, new=ANY):
+        return super().__new__(cls, kind, compile_path_pattern(path), old, new)
+
+    def matches(self, difference, dotted_path):
+        return (
+            self.kind == difference.kind
+            and self.path.match(dotted_path) is not None
+            and (self.old is ANY or self.old == difference.old)
+            and (self.new is ANY or self.new == difference.new)
+        )
+
+
+IGNORE = [
+    Ignore(CHANGE, "meta.hyrax_processing"),
+    Ignore(CHANGE, "files.1.regex"),
+    Ignore(CHANGE, "duplicateHandling", "skip", "replace"),
+    Ignore(REMOVE, "reportToEms", True),
+    Ignore(ADD, "dataType"),
+]
+
+
+def dotted(path):
+    return ".".join(str(_) for _ in path)
+
+
+def structural_hashes(value, hashes=None):
+    """Digest of every dict and list in value, keyed by id()
+
+    Equal subtrees get equal digests whatever their dict key order.
+    """
+    if hashes is None:
+        hashes = {}
+    _structural_hash(value, hashes)
+    return hashes
+
+
+def _structural_hash(value, hashes):
+    h = blake2b(digest_size=16)
+    if isinstance(value, dict):
+        h.update(b"{")
+        for key in sorted(value):
+            h.update(dumps(key).encode())
+            h.update(_structural_hash(value[key], hashes))
+    elif isinstance(value, list):
+        h.update(b"[")
+        for item in value:
+            h.update(_structural_hash(item, hashes))
+    else:
+        # Scalars get a fixed-size digest of their own, so the items folded
+        # into a list digest cannot run together.
+        h.update(dumps(value).encode())
+        return h.digest()
+    digest = hashes[id(value)] = h.digest()
+    return digest
+
+
+def is_same(a, b, hashes):
+    if isinstance(a, (dict, list)) and type(a) is type(b):
+        return hashes[id(a)] == hashes[id(b)]
+    return a == b and type(a) is type(b)
+
+
+def diff(a, b, hashes, path=()):
+    """Yield every Difference between a and b, depth first"""
+    if is_same(a, b, hashes):
+        return
+    if isinstance(a, dict) and isinstance(b, dict):
+        for key in a:
+            if key not in b:
+                yield Difference(REMOVE, path + (key,), a[key], None)
+        for key in b:
+            if key not in a:
+                yield Difference(ADD, path + (key,), None, b[key])
+        for key in a:
+            if key in b:
+                yield from diff(a[key], b[key], hashes, path + (key,))
+    elif isinstance(a, list) and isinstance(b, list):
+        for i, (x, y) in enumerate(zip(a, b)):
+            yield from diff(x, y, hashes, path + (i,))
+        for i in range(len(b), len(a)):
+            yield Difference(REMOVE, path + (i,), a[i], None)
+        for i in range(len(a), len(b)):
+            yield Difference(ADD, path + (i,), None, b[i])
+    else:
+        yield Difference(CHANGE, path, a, b)
+
+
+def unexpected_differences(a, b, hashes, ignore=IGNORE):
+    for difference in diff(a, b, hashes):
+        dotted_path = dotted(difference.path)
+        if not any(_.matches(difference, dotted_path) for _ in ignore):
+            yield difference
+
+
+def read_api_page(json_from_api):
+    with open(json_from_api) as f:
+        j = loads(f.read())
+    found = []
+    for c in j["results"] or []:
+        for tskey in API_TIMESTAMP_KEYS:
+            del c[tskey]
+        found.append((c, structural_hashes(c)))
+    return found
+
+
+def read_repo_file(json_from_repo):
+    with open(json_from_repo) as f:
         c = loads(f.read())
-        n = c["name"]
-        if name != n:
-            ic(name, n)
-        collections_from_repo[n] = c
-
-ic(collections_from_repo.keys())
-
-
-keys_from_api = set(collections_from_api)
-keys_from_repo = set(collections_from_repo)
-ic(keys_from_api - keys_from_repo)
-ic(keys_from_repo - keys_from_api)
-badcollections = set()
-for name in keys_from_api & keys_from_repo:
-    a = collections_from_api[name]
-    r = collections_from_repo[name]
-    d = diff(a, r)
-    for i in d:
-        if i[0] == "change":
-            if i[1] in ["meta.hyrax_processing", ["files", 1, "regex"]]:
-                continue
-        if i == ("change", "duplicateHandling", ("skip", "replace")):
-            continue
-        if i == ("remove", "", [("reportToEms", True)]):
+    name = Path(json_from_repo).stem
+    if name != c["name"]:
+        ic(name, c["name"])
+    return [(c, structural_hashes(c))]
+
+
+def load_collections(reader, paths, max_workers=DEFAULT_MAX_WORKERS):
+    """Read paths in parallel, returning a (collection, hashes) pair by name
+
+    The hashes stay with their collection, since they are keyed by id() and
+    a collection replaced by a later one of the same name is freed.
+    """
+    collections = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for found in executor.map(reader, paths):
+            for c, hashes in found:
+                collections[c["name"]] = c, hashes
+    return collections
+
+
+def compare_collections(collections_from_api, collections_from_repo, ignore=IGNORE):
+    """Unexpected differences of every collection found on both sides, by name"""
+    differences = {}
+    for name in sorted(collections_from_api.keys() & collections_from_repo.keys()):
+        a, a_hashes = collections_from_api[name]
+        r, r_hashes = collections_from_repo[name]
+        if a_hashes[id(a)] == r_hashes[id(r)]:
             continue
-        if i[0] == "add":
-            if i[1] == "":
-                if isinstance(i[2], list):
-                    if isinstance(i[2][0], tuple):
-                        if i[2][0][0] == "dataType":
-                            continue
-        ic(name, i)
-        badcollections.add(name)
-        break
-
-ic(badcollections)
-ic(keys_from_api - badcollections)
-ic(len(badcollections), len(keys_from_api - badcollections))
+        hashes = ChainMap(a_hashes, r_hashes)
+        found = list(unexpected_differences(a, r, hashes, ignore))
+        if found:
+            differences[name] = found
+    return differences
+
+
+def main(args=argv):
+    glob_json_from_api = args[1]
+    ic(glob_json_from_api)
+    path_collections_from_repo = Path(args[2])
+    ic(path_collections_from_repo)
+
+    collections_from_api = load_collections(
+        read_api_page, sorted(iglob(glob_json_from_api))
+    )
+    ic(collections_from_api.keys())
+    collections_from_repo = load_collections(
+        read_repo_file, sorted(path_collections_from_repo.glob("*.json"))
+    )
+    ic(collections_from_repo.keys())
+
+    keys_from_api = set(collections_from_api)
+    keys_from_repo = set(collections_from_repo)
+    ic(keys_from_api - keys_from_repo)
+    ic(keys_from_repo - keys_from_api)
+    differences = compare_collections(collections_from_api, collections_from_repo)
+    for name, found in differences.items():
+        for difference in found:
+            ic(name, difference.kind, dotted(difference.path))
+            ic(difference.old, difference.new)
+
+    badcollections = set(differences)
+    ic(badcollections)
+    ic(keys_from_api - badcollections)
+    ic(len(badcollections), len(keys_from_api - badcollections))
+
+
+if __name__ == "__main__":
+    main()
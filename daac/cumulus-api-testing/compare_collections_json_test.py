@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+import unittest
+
+import compare_collections_json as ccj
+
+COLLECTION = {
+    "name": "A",
+    "version": "1",
+    "duplicateHandling": "skip",
+    "reportToEms": True,
+    "meta": {"hyrax_processing": "false", "granuleMetadataFileExtension": ".xml"},
+    "files": [{"regex": "^a$", "bucket": "public"}, {"regex": "^b$"}],
+}
+
+
+class TestCompareCollections(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = os.path.join(self.tmp.name, "repo")
+        os.mkdir(self.repo)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, value):
+        with open(os.path.join(self.tmp.name, path), "w") as f:
+            json.dump(value, f)
+
+    def test_every_unexpected_difference_is_reported(self):
+        from_api = [
+            dict(COLLECTION, name=name, createdAt=1, updatedAt=2, timestamp=3)
+            for name in ("A", "B", "C")
+        ]
+        self.write("page1.json", {"results": from_api[:2]})
+        self.write("page2.json", {"results": from_api[2:]})
+        self.write("page3.json", {"results": []})
+        for name in ("A", "B", "C"):
+            c = json.loads(json.dumps(dict(COLLECTION, name=name)))
+            # Expected differences only.
+            c.update(duplicateHandling="replace", dataType="x")
+            del c["reportToEms"]
+            c["meta"]["hyrax_processing"] = "true"
+            c["files"][1]["regex"] = "^c$"
+            if name == "B":
+                c["version"] = "2"
+                c["files"][0]["bucket"] = "protected"
+                c["files"].append({"regex": "^d$"})
+            self.write(os.path.join("repo", name + ".json"), c)
+
+        from_api = ccj.load_collections(
+            ccj.read_api_page,
+            [os.path.join(self.tmp.name, "page%d.json" % i) for i in (1, 2, 3)],
+        )
+        from_repo = ccj.load_collections(
+            ccj.read_repo_file,
+            [os.path.join(self.repo, name + ".json") for name in ("A", "B", "C")],
+        )
+        self.assertEqual({"A", "B", "C"}, set(from_api))
+        differences = ccj.compare_collections(from_api, from_repo)
+        self.assertEqual(["B"], list(differences))
+        self.assertEqual(
+            [
+                ("add", "files.2"),
+                ("change", "version"),
+                ("change", "files.0.bucket"),
+            ],
+            sorted(
+                ((_.kind, ccj.dotted(_.path)) for _ in differences["B"]),
+                key=lambda _: _[0] == "change",
+            ),
+        )
+
+    def test_identical_subtrees_hash_alike(self):
+        a = {"x": [1, {"y": 2, "z": 3}]}
+        b = {"x": [1, {"z": 3, "y": 2}]}
+        c = {"x": [1, {"z": 3, "y": 2.0}]}
+        hashes = {}
+        for value in (a, b, c):
+            ccj.structural_hashes(value, hashes)
+        self.assertEqual(hashes[id(a)], hashes[id(b)])
+        self.assertNotEqual(hashes[id(a)], hashes[id(c)])
+        self.assertEqual([], list(ccj.diff(a, b, hashes)))
+        self.assertEqual(
+            [ccj.Difference("change", ("x", 1, "y"), 2, 2.0)],
+            list(ccj.diff(a, c, hashes)),
+        )
+
+    def test_number_lists_do_not_run_together(self):
+        from_api = {"A": ({"v": [1, 2]},), "B": ({"v": ["1", "2"]},)}
+        from_repo = {"A": ({"v": [12]},), "B": ({"v": ["12"]},)}
+        for side in (from_api, from_repo):
+            for name, (c,) in side.items():
+                side[name] = c, ccj.structural_hashes(c)
+        differences = ccj.compare_collections(from_api, from_repo)
+        self.assertEqual(
+            [("change", ("v", 0), 1, 12), ("remove", ("v", 1), 2, None)],
+            [tuple(_) for _ in differences["A"]],
+        )
+        self.assertEqual(["A", "B"], list(differences))
+
+
+if __name__ == "__main__":
+    unittest.main()
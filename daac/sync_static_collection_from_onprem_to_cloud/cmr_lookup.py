@@ -0,0 +1,131 @@
+"""
+Resolve collection concept ids in CMR, many at a time
+
+Each (short_name, version, provider) search is kept in a sqlite cache. Hits
+are kept for good, since a concept id does not change, while misses are
+asked again once they are older than a day, in case the collection has been
+ingested since. Collections are resolved concurrently, each trying the
+preferred providers in order and then any provider.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MISS_MAX_AGE = 60 * 60 * 24
+ANY_PROVIDER = ""
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS searches (
+    cmr TEXT,
+    short_name TEXT,
+    version TEXT,
+    provider TEXT,
+    hits INTEGER,
+    cmr_id TEXT,
+    url TEXT,
+    fetched_at REAL,
+    PRIMARY KEY (cmr, short_name, version, provider)
+)
+"""
+
+
+CmrSearch = namedtuple("CmrSearch", ("hits", "cmr_id", "url"))
+
+
+class CmrLookupCache:
+    def __init__(self, path, miss_max_age=DEFAULT_MISS_MAX_AGE):
+        self.path = path
+        self.miss_max_age = miss_max_age
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(CACHE_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, cmr, short_name, version, provider):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT hits, cmr_id, url, fetched_at FROM searches"
+                " WHERE cmr = ? AND short_name = ? AND version = ? AND provider = ?",
+                (cmr, short_name, version, provider or ANY_PROVIDER),
+            ).fetchone()
+        if row is None:
+            return None
+        hits, cmr_id, url, fetched_at = row
+        if not hits and time.time() - fetched_at > self.miss_max_age:
+            return None
+        return CmrSearch(hits, cmr_id, url)
+
+    def put(self, cmr, short_name, version, provider, search):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    cmr,
+                    short_name,
+                    version,
+                    provider or ANY_PROVIDER,
+                    search.hits,
+                    search.cmr_id,
+                    search.url,
+                    time.time(),
+                ),
+            )
+
+
+def search_collection(session, cmr, short_name, version, provider=None):
+    params = {"short_name": short_name, "version": version}
+    if provider:
+        params["provider"] = provider
+    headers = {"accept": "application/json"}
+    r = session.get(cmr + "/search/collections", params=params, headers=headers)
+    r.raise_for_status()
+    hits = int(r.headers["cmr-hits"])
+    cmr_id = None
+    if hits == 1:
+        cmr_id = r.json()["feed"]["entry"][0]["id"]
+    return CmrSearch(hits, cmr_id, r.url)
+
+
+class CmrResolver:
+    def __init__(self, target, cache=None, session=None):
+        self.target = target
+        self.cache = cache
+        self.session = session or requests.Session()
+
+    def search(self, short_name, version, provider=None):
+        cmr = self.target.cmr
+        if self.cache:
+            cached = self.cache.get(cmr, short_name, version, provider)
+            if cached is not None:
+                return cached
+        found = search_collection(self.session, cmr, short_name, version, provider)
+        logging.info("%d hits from %s", found.hits, found.url)
+        if self.cache:
+            self.cache.put(cmr, short_name, version, provider, found)
+        return found
+
+    def resolve(self, short_name, version):
+        """The first search with hits, trying the preferred providers first"""
+        found = None
+        for provider in self.target.cmr_preferred_providers + [None]:
+            found = self.search(short_name, version, provider)
+            if found.hits:
+                break
+        return found
+
+    def resolve_many(self, names_and_versions, max_workers=DEFAULT_MAX_WORKERS):
+        """Resolve (short_name, version) pairs concurrently, returning a dict"""
+        names_and_versions = list(dict.fromkeys(names_and_versions))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(lambda _: self.resolve(*_), names_and_versions)
+            return dict(zip(names_and_versions, results))
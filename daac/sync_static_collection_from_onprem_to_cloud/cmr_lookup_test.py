@@ -0,0 +1,98 @@
+import http.server
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from collections import namedtuple
+from urllib.parse import parse_qs, urlparse
+
+import cmr_lookup
+
+Target = namedtuple("Target", ("cmr", "cmr_preferred_providers"))
+
+# (short_name, version, provider) -> concept id
+COLLECTIONS = {
+    ("A", "1", "POCLOUD"): "C1-POCLOUD",
+    ("B", "1", "OTHER"): "C2-OTHER",
+}
+
+
+class FakeCmrHandler(http.server.BaseHTTPRequestHandler):
+    """Just enough of the CMR collection search for concept id lookups"""
+
+    requests_seen = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        self.requests_seen.append(query)
+        entries = [
+            {"id": concept_id}
+            for (name, version, provider), concept_id in COLLECTIONS.items()
+            if (name, version) == (query["short_name"], query["version"])
+            and query.get("provider", provider) == provider
+        ]
+        body = json.dumps({"feed": {"entry": entries}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("CMR-Hits", str(len(entries)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestCmrResolver(unittest.TestCase):
+    def setUp(self):
+        FakeCmrHandler.requests_seen = []
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakeCmrHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        cmr = "http://127.0.0.1:{0}".format(self.server.server_port)
+        self.target = Target(cmr, ["POCLOUD"])
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp.name, "cmr.sqlite")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def resolve_many(self, pairs, **kwargs):
+        cache = cmr_lookup.CmrLookupCache(self.cache_path, **kwargs)
+        try:
+            resolver = cmr_lookup.CmrResolver(self.target, cache)
+            return resolver.resolve_many(pairs, max_workers=4)
+        finally:
+            cache.close()
+
+    def test_resolve_many_falls_back_to_any_provider(self):
+        found = self.resolve_many([("A", "1"), ("B", "1"), ("C", "1")])
+        self.assertEqual("C1-POCLOUD", found[("A", "1")].cmr_id)
+        self.assertEqual("C2-OTHER", found[("B", "1")].cmr_id)
+        self.assertEqual(0, found[("C", "1")].hits)
+        # A is found with the preferred provider, B and C are asked twice.
+        self.assertEqual(5, len(FakeCmrHandler.requests_seen))
+
+    def test_cache_is_used_and_misses_expire(self):
+        pairs = [("A", "1"), ("C", "1")]
+        self.resolve_many(pairs)
+        FakeCmrHandler.requests_seen = []
+        found = self.resolve_many(pairs)
+        self.assertEqual([], FakeCmrHandler.requests_seen)
+        self.assertEqual("C1-POCLOUD", found[("A", "1")].cmr_id)
+        time.sleep(0.01)
+        self.resolve_many(pairs, miss_max_age=0)
+        self.assertEqual(
+            [("C", "POCLOUD"), ("C", None)],
+            [
+                (_["short_name"], _.get("provider"))
+                for _ in FakeCmrHandler.requests_seen
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
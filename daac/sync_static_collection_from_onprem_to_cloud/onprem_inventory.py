@@ -0,0 +1,103 @@
+"""
+Inventory an onprem collection tree into a manifest file
+
+Each directory is listed with os.scandir by a bounded pool of threads, and
+every file found is streamed to a JSON lines manifest with its path relative
+to the root, size, mtime and (optionally) a checksum. Counts and totals are
+then read back from the manifest instead of being kept in memory.
+"""
+
+import hashlib
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_MAX_WORKERS = 16
+CHECKSUM_CHUNK_SIZE = 1 << 20
+# The shake_* algorithms need a digest length, so they are left out.
+CHECKSUM_ALGORITHMS = sorted(
+    _ for _ in hashlib.algorithms_guaranteed if not _.startswith("shake_")
+)
+
+
+ManifestEntry = namedtuple("ManifestEntry", ("path", "size", "mtime", "checksum"))
+
+ManifestSummary = namedtuple(
+    "ManifestSummary", ("file_count", "total_bytes", "empty_files")
+)
+
+
+def file_checksum(path, algorithm):
+    h = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def scan_directory(root, relpath, checksum=None):
+    """List one directory, returning its files as entries and its subdirectories
+
+    Stat results come from the DirEntry, so files are not stat'ed a second
+    time. As with os.walk, symlinks to directories are not followed, while
+    symlinks to files are reported with their target's size and mtime.
+    """
+    entries = []
+    subdirs = []
+    with os.scandir(os.path.join(root, relpath)) as it:
+        for entry in it:
+            child = os.path.join(relpath, entry.name) if relpath else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(child)
+            elif entry.is_file():
+                stats = entry.stat()
+                digest = file_checksum(entry.path, checksum) if checksum else None
+                entries.append(
+                    ManifestEntry(child, stats.st_size, stats.st_mtime, digest)
+                )
+    return entries, subdirs
+
+
+def walk_tree(root, max_workers=DEFAULT_MAX_WORKERS, checksum=None):
+    """Yield a ManifestEntry for every file under root, in no particular order"""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(scan_directory, root, "", checksum)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                entries, subdirs = future.result()
+                for subdir in subdirs:
+                    pending.add(executor.submit(scan_directory, root, subdir, checksum))
+                for entry in entries:
+                    yield entry
+
+
+def write_manifest(root, manifest_path, max_workers=DEFAULT_MAX_WORKERS, checksum=None):
+    """Inventory root into manifest_path, replacing it only once the walk is done"""
+    partial_path = manifest_path + ".part"
+    with open(partial_path, "w") as out:
+        for entry in walk_tree(root, max_workers=max_workers, checksum=checksum):
+            out.write(json.dumps(entry._asdict()))
+            out.write("\n")
+    os.replace(partial_path, manifest_path)
+    return manifest_path
+
+
+def read_manifest(manifest_path):
+    with open(manifest_path) as f:
+        for line in f:
+            yield ManifestEntry(**json.loads(line))
+
+
+def summarize_manifest(manifest_path):
+    file_count = 0
+    total_bytes = 0
+    empty_files = []
+    for entry in read_manifest(manifest_path):
+        file_count += 1
+        if entry.size:
+            total_bytes += entry.size
+        else:
+            empty_files.append(entry.path)
+    return ManifestSummary(file_count, total_bytes, empty_files)
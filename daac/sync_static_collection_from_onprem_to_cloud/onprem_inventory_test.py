@@ -0,0 +1,72 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+import onprem_inventory
+
+
+class TestInventory(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmpdir.name, "collection")
+        self.files = {
+            "a.nc": b"aaaa",
+            os.path.join("2020", "0101", "b.nc"): b"bb",
+            os.path.join("2020", "0102", "c.nc"): b"",
+            os.path.join("2021", "d.nc"): b"d" * 1000,
+        }
+        for relpath, data in self.files.items():
+            path = os.path.join(self.root, relpath)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+        os.symlink(os.path.join(self.root, "2020"), os.path.join(self.root, "loop"))
+        self.manifest = os.path.join(self.tmpdir.name, "manifest.jsonl")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_manifest_matches_os_walk(self):
+        onprem_inventory.write_manifest(self.root, self.manifest, max_workers=3)
+        expected = {}
+        for root, _, files in os.walk(self.root):
+            for f in files:
+                path = os.path.join(root, f)
+                expected[os.path.relpath(path, self.root)] = os.stat(path).st_size
+        entries = list(onprem_inventory.read_manifest(self.manifest))
+        self.assertEqual(expected, {_.path: _.size for _ in entries})
+        self.assertFalse(os.path.exists(self.manifest + ".part"))
+
+    def test_summary(self):
+        onprem_inventory.write_manifest(self.root, self.manifest)
+        summary = onprem_inventory.summarize_manifest(self.manifest)
+        self.assertEqual(4, summary.file_count)
+        self.assertEqual(1006, summary.total_bytes)
+        self.assertEqual([os.path.join("2020", "0102", "c.nc")], summary.empty_files)
+
+    def test_checksums(self):
+        onprem_inventory.write_manifest(self.root, self.manifest, checksum="md5")
+        checksums = {
+            _.path: _.checksum for _ in onprem_inventory.read_manifest(self.manifest)
+        }
+        self.assertEqual(
+            {k: hashlib.md5(v).hexdigest() for k, v in self.files.items()}, checksums
+        )
+
+    def test_every_offered_algorithm_checksums(self):
+        for algorithm in onprem_inventory.CHECKSUM_ALGORITHMS:
+            with self.subTest(algorithm=algorithm):
+                onprem_inventory.write_manifest(
+                    self.root, self.manifest, checksum=algorithm
+                )
+                self.assertTrue(
+                    all(
+                        _.checksum
+                        for _ in onprem_inventory.read_manifest(self.manifest)
+                    )
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,379 @@
+"""
+Upload an onprem collection manifest to S3
+
+Works from the manifest written by onprem_inventory. Objects that already
+exist with the same size and ETag are skipped. Large files go up as
+multipart uploads whose parts are sent concurrently, and progress (finished
+files, and each finished part of a multipart upload) is kept in a sqlite
+checkpoint, so an interrupted sync picks up where it stopped.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import onprem_inventory
+
+DEFAULT_MAX_FILES = 4
+DEFAULT_MAX_PARTS = 16
+# Same defaults as the AWS CLI, so objects it uploaded compare equal.
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MAX_PARTS = 10000
+DEFAULT_REPORT_INTERVAL = 30.0
+
+CHECKPOINT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS done (
+    path TEXT PRIMARY KEY, size INTEGER, mtime REAL, etag TEXT
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    path TEXT PRIMARY KEY, size INTEGER, mtime REAL, upload_id TEXT, part_size INTEGER
+);
+CREATE TABLE IF NOT EXISTS parts (
+    path TEXT, part_number INTEGER, etag TEXT, PRIMARY KEY (path, part_number)
+);
+"""
+
+
+RemoteObject = namedtuple("RemoteObject", ("size", "etag"))
+
+SyncResult = namedtuple(
+    "SyncResult", ("uploaded", "skipped", "uploaded_bytes", "seconds")
+)
+
+
+def format_rate(nbytes, seconds):
+    rate = nbytes / seconds if seconds > 0 else 0.0
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if rate < 1024 or unit == "GiB":
+            break
+        rate /= 1024
+    return "{0:.1f} {1}/s".format(rate, unit)
+
+
+def adjusted_part_size(size, part_size=DEFAULT_PART_SIZE):
+    """The part size to upload a file of this size with
+
+    Like the AWS CLI, part_size is doubled until the file fits in the
+    MAX_PARTS parts S3 allows.
+    """
+    while -(-size // part_size) > MAX_PARTS:
+        part_size *= 2
+    return part_size
+
+
+def local_etag(path, size, part_size=DEFAULT_PART_SIZE, threshold=None):
+    """The ETag S3 gives a file uploaded with this part size
+
+    That is the MD5 of the file for a single PUT, and the MD5 of the part
+    MD5s followed by the part count for a multipart upload.
+    """
+    if threshold is None:
+        threshold = part_size
+    part_size = adjusted_part_size(size, part_size)
+    with open(path, "rb") as f:
+        if size < threshold:
+            return hashlib.md5(f.read()).hexdigest()
+        digests = [
+            hashlib.md5(chunk).digest()
+            for chunk in iter(lambda: f.read(part_size), b"")
+        ]
+    combined = hashlib.md5(b"".join(digests)).hexdigest()
+    return "{0}-{1}".format(combined, len(digests))
+
+
+def error_code(exception):
+    """The S3 error code of a botocore ClientError, or None"""
+    return getattr(exception, "response", {}).get("Error", {}).get("Code")
+
+
+def list_remote_objects(s3, bucket, prefix):
+    objects = {}
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get("Contents", []):
+            objects[item["Key"]] = RemoteObject(item["Size"], item["ETag"].strip('"'))
+    return objects
+
+
+class SyncCheckpoint:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.executescript(CHECKPOINT_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def _execute(self, sql, params=()):
+        with self.lock, self.connection:
+            return self.connection.execute(sql, params).fetchall()
+
+    def is_done(self, entry):
+        rows = self._execute(
+            "SELECT size, mtime FROM done WHERE path = ?", (entry.path,)
+        )
+        return bool(rows) and tuple(rows[0]) == (entry.size, entry.mtime)
+
+    def mark_done(self, entry, etag):
+        self._execute(
+            "INSERT OR REPLACE INTO done VALUES (?, ?, ?, ?)",
+            (entry.path, entry.size, entry.mtime, etag),
+        )
+        self.forget_multipart(entry)
+
+    def multipart(self, entry, part_size):
+        """The unfinished upload id and finished part ETags for entry, if any"""
+        rows = self._execute(
+            "SELECT upload_id FROM uploads"
+            " WHERE path = ? AND size = ? AND mtime = ? AND part_size = ?",
+            (entry.path, entry.size, entry.mtime, part_size),
+        )
+        if not rows:
+            return None, {}
+        parts = self._execute(
+            "SELECT part_number, etag FROM parts WHERE path = ?", (entry.path,)
+        )
+        return rows[0][0], dict(parts)
+
+    def start_multipart(self, entry, upload_id, part_size):
+        self.forget_multipart(entry)
+        self._execute(
+            "INSERT INTO uploads VALUES (?, ?, ?, ?, ?)",
+            (entry.path, entry.size, entry.mtime, upload_id, part_size),
+        )
+
+    def mark_part(self, entry, part_number, etag):
+        self._execute(
+            "INSERT OR REPLACE INTO parts VALUES (?, ?, ?)",
+            (entry.path, part_number, etag),
+        )
+
+    def forget_multipart(self, entry):
+        self._execute("DELETE FROM uploads WHERE path = ?", (entry.path,))
+        self._execute("DELETE FROM parts WHERE path = ?", (entry.path,))
+
+
+class Throughput:
+    """Thread-safe running totals for progress reports"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.files = 0
+        self.skipped = 0
+        self.nbytes = 0
+
+    def add_bytes(self, nbytes):
+        with self.lock:
+            self.nbytes += nbytes
+
+    def add_file(self, skipped=False):
+        with self.lock:
+            if skipped:
+                self.skipped += 1
+            else:
+                self.files += 1
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def report(self):
+        with self.lock:
+            return "{0:n} uploaded, {1:n} skipped, {2:n} bytes, {3}".format(
+                self.files,
+                self.skipped,
+                self.nbytes,
+                format_rate(self.nbytes, self.elapsed()),
+            )
+
+
+class S3Sync:
+    def __init__(
+        self,
+        s3,
+        bucket,
+        prefix,
+        source,
+        checkpoint,
+        max_files=DEFAULT_MAX_FILES,
+        max_parts=DEFAULT_MAX_PARTS,
+        part_size=DEFAULT_PART_SIZE,
+        multipart_threshold=DEFAULT_MULTIPART_THRESHOLD,
+        verify_etag=True,
+        report_interval=DEFAULT_REPORT_INTERVAL,
+    ):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.source = source
+        self.checkpoint = checkpoint
+        self.max_files = max_files
+        self.max_parts = max_parts
+        self.part_size = part_size
+        self.multipart_threshold = multipart_threshold
+        self.verify_etag = verify_etag
+        self.report_interval = report_interval
+        self.throughput = Throughput()
+        self.remote = {}
+
+    def key_for(self, entry):
+        relpath = entry.path.replace(os.sep, "/")
+        return "/".join((self.prefix, relpath)) if self.prefix else relpath
+
+    def run(self, entries):
+        """Upload every entry not already in the bucket, returning a SyncResult"""
+        listing_prefix = self.prefix + "/" if self.prefix else ""
+        self.remote = list_remote_objects(self.s3, self.bucket, listing_prefix)
+        self.throughput = Throughput()
+        last_report = time.monotonic()
+        window = 4 * self.max_files
+        files = ThreadPoolExecutor(max_workers=self.max_files)
+        parts = ThreadPoolExecutor(max_workers=self.max_parts)
+        with parts, files:
+            pending = set()
+            for entry in entries:
+                pending.add(files.submit(self.sync_file, entry, parts))
+                if len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                if time.monotonic() - last_report >= self.report_interval:
+                    logging.info("sync progress: %s", self.throughput.report())
+                    last_report = time.monotonic()
+            for future in pending:
+                future.result()
+        logging.info("sync finished: %s", self.throughput.report())
+        return SyncResult(
+            self.throughput.files,
+            self.throughput.skipped,
+            self.throughput.nbytes,
+            self.throughput.elapsed(),
+        )
+
+    def is_current(self, entry, path):
+        if self.checkpoint.is_done(entry):
+            return True
+        remote = self.remote.get(self.key_for(entry))
+        if remote is None or remote.size != entry.size:
+            return False
+        if not self.verify_etag:
+            return True
+        etag = local_etag(path, entry.size, self.part_size, self.multipart_threshold)
+        return etag == remote.etag
+
+    def sync_file(self, entry, parts):
+        path = os.path.join(self.source, entry.path)
+        if self.is_current(entry, path):
+            self.throughput.add_file(skipped=True)
+            return None
+        started = time.monotonic()
+        if entry.size < self.multipart_threshold:
+            with open(path, "rb") as f:
+                response = self.s3.put_object(
+                    Bucket=self.bucket, Key=self.key_for(entry), Body=f.read()
+                )
+            self.throughput.add_bytes(entry.size)
+        else:
+            response = self._multipart_upload(entry, path, parts)
+        etag = response["ETag"].strip('"')
+        self.checkpoint.mark_done(entry, etag)
+        self.throughput.add_file()
+        seconds = time.monotonic() - started
+        logging.info(
+            "uploaded %s: %d bytes in %.1fs (%s)",
+            entry.path,
+            entry.size,
+            seconds,
+            format_rate(entry.size, seconds),
+        )
+        return etag
+
+    def part_size_for(self, entry):
+        return adjusted_part_size(entry.size, self.part_size)
+
+    def _multipart_upload(self, entry, path, parts):
+        key = self.key_for(entry)
+        part_size = self.part_size_for(entry)
+        upload_id, finished = self.checkpoint.multipart(entry, part_size)
+        resumed = upload_id is not None
+        if not resumed:
+            upload_id = self.s3.create_multipart_upload(Bucket=self.bucket, Key=key)[
+                "UploadId"
+            ]
+            self.checkpoint.start_multipart(entry, upload_id, part_size)
+        elif finished:
+            logging.info("resuming %s with %d parts done", entry.path, len(finished))
+        part_count = max(1, -(-entry.size // part_size))
+        futures = [
+            parts.submit(self._upload_part, entry, path, key, upload_id, number)
+            for number in range(1, part_count + 1)
+            if number not in finished
+        ]
+        try:
+            for future in futures:
+                number, etag = future.result()
+                finished[number] = etag
+            return self.s3.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={
+                    "Parts": [
+                        {"PartNumber": number, "ETag": finished[number]}
+                        for number in sorted(finished)
+                    ]
+                },
+            )
+        except Exception as e:
+            if error_code(e) != "NoSuchUpload" or not resumed:
+                raise
+            # The saved upload was aborted or expired, so start over.
+            logging.info("restarting %s: %s", entry.path, e)
+            self.checkpoint.forget_multipart(entry)
+            return self._multipart_upload(entry, path, parts)
+
+    def _upload_part(self, entry, path, key, upload_id, number):
+        part_size = self.part_size_for(entry)
+        with open(path, "rb") as f:
+            f.seek((number - 1) * part_size)
+            body = f.read(part_size)
+        response = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=number,
+            Body=body,
+        )
+        self.checkpoint.mark_part(entry, number, response["ETag"])
+        self.throughput.add_bytes(len(body))
+        return number, response["ETag"]
+
+
+def make_s3_client(profile_name=None, endpoint_url=None):
+    import boto3
+
+    session = boto3.session.Session(profile_name=profile_name)
+    return session.client("s3", endpoint_url=endpoint_url)
+
+
+def sync_manifest(
+    manifest_path, source, bucket, prefix, s3=None, checkpoint_path=None, **kwargs
+):
+    if s3 is None:
+        s3 = make_s3_client()
+    if checkpoint_path is None:
+        checkpoint_path = manifest_path + ".sync.sqlite"
+    checkpoint = SyncCheckpoint(checkpoint_path)
+    try:
+        engine = S3Sync(s3, bucket, prefix, source, checkpoint, **kwargs)
+        return engine.run(onprem_inventory.read_manifest(manifest_path))
+    finally:
+        checkpoint.close()
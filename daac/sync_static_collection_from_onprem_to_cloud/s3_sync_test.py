@@ -0,0 +1,209 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import boto3
+from botocore.exceptions import ClientError
+from moto.server import ThreadedMotoServer
+
+import onprem_inventory
+import s3_sync
+
+PART_SIZE = 5 * 1024 * 1024
+BUCKET = "prefix-private"
+
+
+class TestS3Sync(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+        cls.server.start()
+        host, port = cls.server.get_host_and_port()
+        cls.endpoint_url = "http://{0}:{1}".format(host, port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.s3 = boto3.client(
+            "s3",
+            endpoint_url=self.endpoint_url,
+            region_name="us-east-1",
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+        )
+        self.s3.create_bucket(Bucket=BUCKET)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmpdir.name, "source")
+        self.files = {
+            "small.txt": b"hello",
+            os.path.join("2020", "big.dat"): os.urandom(2 * PART_SIZE + 123),
+        }
+        for relpath, data in self.files.items():
+            path = os.path.join(self.source, relpath)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+        self.manifest = os.path.join(self.tmpdir.name, "manifest.jsonl")
+        onprem_inventory.write_manifest(self.source, self.manifest)
+
+    def tearDown(self):
+        for item in self.s3.list_objects_v2(Bucket=BUCKET).get("Contents", []):
+            self.s3.delete_object(Bucket=BUCKET, Key=item["Key"])
+        self.s3.delete_bucket(Bucket=BUCKET)
+        self.tmpdir.cleanup()
+
+    def sync(self, **kwargs):
+        return s3_sync.sync_manifest(
+            self.manifest,
+            self.source,
+            BUCKET,
+            "coll/data/",
+            s3=self.s3,
+            part_size=PART_SIZE,
+            multipart_threshold=PART_SIZE,
+            **kwargs
+        )
+
+    def test_upload_then_skip(self):
+        first = self.sync()
+        self.assertEqual((2, 0), (first.uploaded, first.skipped))
+        for relpath, data in self.files.items():
+            key = "coll/data/" + relpath.replace(os.sep, "/")
+            body = self.s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+            self.assertEqual(hashlib.md5(data).digest(), hashlib.md5(body).digest())
+        big = os.path.join(self.source, "2020", "big.dat")
+        remote = s3_sync.list_remote_objects(self.s3, BUCKET, "coll/data")
+        self.assertEqual(
+            s3_sync.local_etag(big, os.path.getsize(big), PART_SIZE),
+            remote["coll/data/2020/big.dat"].etag,
+        )
+        # without the checkpoint, the remote sizes and ETags are what match
+        os.remove(self.manifest + ".sync.sqlite")
+        second = self.sync()
+        self.assertEqual((0, 2), (second.uploaded, second.skipped))
+
+    def test_resume_multipart_upload(self):
+        entries = {_.path: _ for _ in onprem_inventory.read_manifest(self.manifest)}
+        entry = entries[os.path.join("2020", "big.dat")]
+        checkpoint = s3_sync.SyncCheckpoint(self.manifest + ".sync.sqlite")
+        engine = s3_sync.S3Sync(
+            self.s3, BUCKET, "coll/data", self.source, checkpoint, part_size=PART_SIZE
+        )
+        upload_id = self.s3.create_multipart_upload(
+            Bucket=BUCKET, Key=engine.key_for(entry)
+        )["UploadId"]
+        checkpoint.start_multipart(entry, upload_id, PART_SIZE)
+        number, etag = engine._upload_part(
+            entry,
+            os.path.join(self.source, entry.path),
+            engine.key_for(entry),
+            upload_id,
+            1,
+        )
+        checkpoint.mark_part(entry, number, etag)
+        checkpoint.close()
+        result = self.sync()
+        self.assertEqual(2, result.uploaded)
+        # the first part was not sent again
+        self.assertEqual(
+            len(self.files[entry.path]) - PART_SIZE + 5, result.uploaded_bytes
+        )
+
+    def test_restart_aborted_upload_with_no_parts(self):
+        entries = {_.path: _ for _ in onprem_inventory.read_manifest(self.manifest)}
+        entry = entries[os.path.join("2020", "big.dat")]
+        checkpoint = s3_sync.SyncCheckpoint(self.manifest + ".sync.sqlite")
+        engine = s3_sync.S3Sync(
+            self.s3, BUCKET, "coll/data", self.source, checkpoint, part_size=PART_SIZE
+        )
+        upload_id = self.s3.create_multipart_upload(
+            Bucket=BUCKET, Key=engine.key_for(entry)
+        )["UploadId"]
+        checkpoint.start_multipart(entry, upload_id, PART_SIZE)
+        checkpoint.close()
+        self.s3.abort_multipart_upload(
+            Bucket=BUCKET, Key=engine.key_for(entry), UploadId=upload_id
+        )
+        upload_part = self.s3.upload_part
+
+        def upload_part_as_s3_would(**kwargs):
+            # moto answers parts of an aborted upload with a 500, S3 with this
+            if kwargs["UploadId"] == upload_id:
+                error = {"Error": {"Code": "NoSuchUpload", "Message": ""}}
+                raise ClientError(error, "UploadPart")
+            return upload_part(**kwargs)
+
+        with mock.patch.object(self.s3, "upload_part", upload_part_as_s3_would):
+            result = self.sync()
+        self.assertEqual(2, result.uploaded)
+        body = self.s3.get_object(Bucket=BUCKET, Key=engine.key_for(entry))["Body"]
+        self.assertEqual(self.files[entry.path], body.read())
+
+    def test_restart_aborted_upload_with_every_part_done(self):
+        entries = {_.path: _ for _ in onprem_inventory.read_manifest(self.manifest)}
+        entry = entries[os.path.join("2020", "big.dat")]
+        checkpoint = s3_sync.SyncCheckpoint(self.manifest + ".sync.sqlite")
+        engine = s3_sync.S3Sync(
+            self.s3, BUCKET, "coll/data", self.source, checkpoint, part_size=PART_SIZE
+        )
+        key = engine.key_for(entry)
+        upload_id = self.s3.create_multipart_upload(Bucket=BUCKET, Key=key)["UploadId"]
+        checkpoint.start_multipart(entry, upload_id, PART_SIZE)
+        for number in (1, 2, 3):
+            engine._upload_part(
+                entry, os.path.join(self.source, entry.path), key, upload_id, number
+            )
+        checkpoint.close()
+        self.s3.abort_multipart_upload(Bucket=BUCKET, Key=key, UploadId=upload_id)
+        complete = self.s3.complete_multipart_upload
+
+        def complete_as_s3_would(**kwargs):
+            # moto answers completing an aborted upload with a 500, S3 with this
+            if kwargs["UploadId"] == upload_id:
+                error = {"Error": {"Code": "NoSuchUpload", "Message": ""}}
+                raise ClientError(error, "CompleteMultipartUpload")
+            return complete(**kwargs)
+
+        with mock.patch.object(
+            self.s3, "complete_multipart_upload", complete_as_s3_would
+        ):
+            result = self.sync()
+        self.assertEqual(2, result.uploaded)
+        body = self.s3.get_object(Bucket=BUCKET, Key=key)["Body"]
+        self.assertEqual(self.files[entry.path], body.read())
+
+
+class TestPartSize(unittest.TestCase):
+    def test_part_size_doubles_past_max_parts(self):
+        part_size = s3_sync.DEFAULT_PART_SIZE
+        limit = s3_sync.MAX_PARTS * part_size
+        self.assertEqual(part_size, s3_sync.adjusted_part_size(limit))
+        self.assertEqual(2 * part_size, s3_sync.adjusted_part_size(limit + 1))
+        self.assertEqual(
+            8 * part_size, s3_sync.adjusted_part_size(400 * 1024**3, part_size)
+        )
+
+    def test_local_etag_uses_adjusted_part_size(self):
+        data = os.urandom(25)
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(data)
+            f.flush()
+            # 25 bytes in at most 10,000 parts of 1 byte takes no adjustment,
+            # but with MAX_PARTS at 4 the parts grow to 8 bytes.
+            original = s3_sync.MAX_PARTS
+            s3_sync.MAX_PARTS = 4
+            try:
+                etag = s3_sync.local_etag(f.name, len(data), 1)
+            finally:
+                s3_sync.MAX_PARTS = original
+        parts = [data[i : i + 8] for i in range(0, len(data), 8)]
+        combined = hashlib.md5(b"".join(hashlib.md5(_).digest() for _ in parts))
+        self.assertEqual("{0}-4".format(combined.hexdigest()), etag)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -24,10 +24,13 @@ from collections import OrderedDict, namedtuple
 from pprint import pprint
 
 import docx
-import requests
 import requests_cache
 from docx.enum.style import WD_STYLE_TYPE
 
+import cmr_lookup
+import onprem_inventory
+import s3_sync
+
 try:
     basestring
 except NameError:
@@ -72,6 +75,7 @@ DEFAULT_CONFIG_TREE_REMOTE = (
     + ".git"
 )
 DEFAULT_TARGET_NAME = "**REPLACE(DAAC_CLOUD_LIVE_ENV_NAME)**"
+DEFAULT_CMR_CACHE = "cmr_lookup.sqlite"
 
 
 DeploymentTarget = namedtuple(
@@ -322,18 +326,83 @@ def generate_instructions(
     config_tree_path,
     config_remote_url=None,
     pull=True,
+    **kwargs
 ):
+    return generate_instructions_batch(
+        [(jira_issue_key, dsshortname)],
+        target_name,
+        config_tree_path,
+        config_remote_url,
+        pull,
+        **kwargs
+    )[0]
+
+
+def generate_instructions_batch(
+    jira_issue_keys_and_dsshortnames,
+    target_name,
+    config_tree_path,
+    config_remote_url=None,
+    pull=True,
+    manifest_dir=".",
+    inventory_workers=onprem_inventory.DEFAULT_MAX_WORKERS,
+    checksum=None,
+    cmr_cache=DEFAULT_CMR_CACHE,
+    cmr_workers=cmr_lookup.DEFAULT_MAX_WORKERS,
+    cmr_session=None,
+):
+    """Prepare instructions for many collections with one tree pull and CMR pass
+
+    Every collection is loaded and checked before anything slow happens, then
+    all of their CMR lookups run concurrently through the persistent cache.
+    """
     target = get_target_by_name(target_name)
     tree = ConfigurationTree(config_tree_path)
     tree.prepare(config_remote_url, pull)
-    collection_data = tree.load_collection_data(dsshortname)
-    collection = Collection(collection_data)
-    collection.assert_consistency()
-    collection.ask_cmr_for_details(target)
-    collection.ask_onprem_for_details(OnPremConfig(target_name))
-    instructions = Instructions(collection, jira_issue_key, target)
-    instructions.prepare()
-    return instructions
+    collections = []
+    for jira_issue_key, dsshortname in jira_issue_keys_and_dsshortnames:
+        collection_data = tree.load_collection_data(dsshortname)
+        collection = Collection(collection_data)
+        collection.assert_consistency()
+        collections.append((jira_issue_key, collection))
+    cache = cmr_lookup.CmrLookupCache(cmr_cache)
+    try:
+        resolver = cmr_lookup.CmrResolver(target, cache, cmr_session)
+        found = resolver.resolve_many(
+            [(_.name, _.version) for __, _ in collections], max_workers=cmr_workers
+        )
+    finally:
+        cache.close()
+    all_instructions = []
+    for jira_issue_key, collection in collections:
+        collection.ask_cmr_for_details(
+            target, found[(collection.name, collection.version)]
+        )
+        collection.ask_onprem_for_details(
+            OnPremConfig(target_name),
+            manifest_path=os.path.join(
+                manifest_dir, collection.name + ".onprem-manifest.jsonl"
+            ),
+            max_workers=inventory_workers,
+            checksum=checksum,
+        )
+        instructions = Instructions(collection, jira_issue_key, target)
+        instructions.prepare()
+        all_instructions.append(instructions)
+    return all_instructions
+
+
+def read_batch_file(path):
+    """(JIRA issue key, collection short name) pairs, one pair per line"""
+    pairs = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            jira_issue_key, dsshortname = line.split()
+            pairs.append((jira_issue_key, dsshortname))
+    return pairs
 
 
 DOCX_STYLE_NORMAL = "Normal"
@@ -647,67 +716,55 @@ class Collection(dict):
             + ", ".join(endings)
         )
 
-    def ask_cmr_for_details(self, target):
-        found = False
-        for cmr_preferred_provider in target.cmr_preferred_providers + [None]:
-            cmr_search_url = target.cmr + "/search/collections"
-            params = {"short_name": self.name, "version": self.version}
-            if cmr_preferred_provider:
-                params["provider"] = cmr_preferred_provider
-            headers = {"accept": "application/json"}
-            r = requests.get(cmr_search_url, params=params, headers=headers)
-            r.raise_for_status()
-            hits = r.headers["cmr-hits"]
-            print(str(hits) + " hits from " + r.url, file=sys.stderr)
-            if hits == "0":
-                continue
-            expected_hits = "1"
-            assert hits == expected_hits, (
-                "unexpected "
-                + expected_hits
-                + " CMR hit but saw "
-                + hits
-                + " ("
-                + r.url
-                + ")"
-            )
-            found = True
-            data = r.json()
-            feed = data["feed"]
-            entry = feed["entry"][0]
-            self.cmr_id = entry["id"]
-            self.cmr_concept_id, self.cmr_provider_id = self.cmr_id.split("-", 1)
-            # self.cmr_concept_id = "XXCONCEPT" + target.name.upper() + "XX"
-            # self.cmr_provider_id = "XXPROVIDER" + target.name.upper() + "XX"
-            # self.cmr_id = self.cmr_concept_id + "-" + self.cmr_provider_id
-            break
-        assert found, "no results found in CMR (" + r.url + ")"
-
-    def ask_onprem_for_details(self, onprem_config):
+    def ask_cmr_for_details(self, target, found=None):
+        """Look up the CMR concept id, unless a batch lookup already found it"""
+        if found is None:
+            found = cmr_lookup.CmrResolver(target).resolve(self.name, self.version)
+        print(str(found.hits) + " hits from " + found.url, file=sys.stderr)
+        assert found.hits, "no results found in CMR (" + found.url + ")"
+        expected_hits = 1
+        assert found.hits == expected_hits, (
+            "unexpected "
+            + str(expected_hits)
+            + " CMR hit but saw "
+            + str(found.hits)
+            + " ("
+            + found.url
+            + ")"
+        )
+        self.cmr_id = found.cmr_id
+        self.cmr_concept_id, self.cmr_provider_id = self.cmr_id.split("-", 1)
+        # self.cmr_concept_id = "XXCONCEPT" + target.name.upper() + "XX"
+        # self.cmr_provider_id = "XXPROVIDER" + target.name.upper() + "XX"
+        # self.cmr_id = self.cmr_concept_id + "-" + self.cmr_provider_id
+
+    def ask_onprem_for_details(
+        self,
+        onprem_config,
+        manifest_path=None,
+        max_workers=onprem_inventory.DEFAULT_MAX_WORKERS,
+        checksum=None,
+    ):
         self.onprem.config = onprem_config
         self.onprem.source = os.path.join(
             self.onprem.config.source, self.meta.onprem_provider_path
         )
-        file_count = 0
-        total_bytes = 0
-        empty_files = []
-        for root, _, files in os.walk(self.onprem.source):
-            for f in files:
-                file_count += 1
-                path = os.path.join(root, f)
-                stats = os.stat(path)
-                file_bytes = stats.st_size
-                if file_bytes:
-                    total_bytes += file_bytes
-                else:
-                    empty_files += path
-        self.onprem.file_count = file_count
-        self.onprem.total_bytes = total_bytes
+        if manifest_path is None:
+            manifest_path = self.name + ".onprem-manifest.jsonl"
+        self.onprem.manifest = onprem_inventory.write_manifest(
+            self.onprem.source,
+            manifest_path,
+            max_workers=max_workers,
+            checksum=checksum,
+        )
+        summary = onprem_inventory.summarize_manifest(self.onprem.manifest)
+        self.onprem.file_count = summary.file_count
+        self.onprem.total_bytes = summary.total_bytes
         # self.onprem.empty_files = empty_files
-        if empty_files:
+        if summary.empty_files:
             logging.warning("Empty files:")
-            for f in sorted(empty_files):
-                logging.warning(f)
+            for f in sorted(summary.empty_files):
+                logging.warning(os.path.join(self.onprem.source, f))
             sys.exit(99)
 
 
@@ -799,14 +856,32 @@ def init_parser(**kwargs):
     parser = argparse.ArgumentParser(**parser_options)
     parser.add_argument(
         "jira_issue_key",
+        nargs="?",
         help="the JIRA key for affected issue (eg, **REPLACE(DAAC_CLOUD_JIRA_PROJECT_KEY)**-123)",
         metavar="JIRA-ISSUE",
     )
     parser.add_argument(
         "dsshortname",
+        nargs="?",
         help="collection shortname",
         metavar="DSSHORTNAME",
     )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="file of JIRA-ISSUE DSSHORTNAME lines to prepare in one run",
+    )
+    parser.add_argument(
+        "--cmr-cache",
+        default=DEFAULT_CMR_CACHE,
+        help="persistent cache of CMR lookups (%(default)s)",
+    )
+    parser.add_argument(
+        "--cmr-workers",
+        type=int,
+        default=cmr_lookup.DEFAULT_MAX_WORKERS,
+        help="concurrent CMR lookups (%(default)s)",
+    )
     parser.add_argument(
         "--config-tree",
         default=default_configtree,
@@ -841,21 +916,89 @@ def init_parser(**kwargs):
         default=DEFAULT_TARGET_NAME,
         help="target environment in **REPLACE(DAAC_ABBREV)** Cloud (%(default)s)",
     )
+    parser.add_argument(
+        "--manifest-dir",
+        default=".",
+        help="directory for the onprem file manifest (%(default)s)",
+    )
+    parser.add_argument(
+        "--inventory-workers",
+        type=int,
+        default=onprem_inventory.DEFAULT_MAX_WORKERS,
+        help="threads listing onprem directories (%(default)s)",
+    )
+    parser.add_argument(
+        "--checksum",
+        choices=onprem_inventory.CHECKSUM_ALGORITHMS,
+        help="also record a checksum of every onprem file (slow)",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="upload the onprem files to S3 instead of only writing instructions",
+    )
+    parser.add_argument(
+        "--sync-files",
+        type=int,
+        default=s3_sync.DEFAULT_MAX_FILES,
+        help="files uploaded at once with --sync (%(default)s)",
+    )
+    parser.add_argument(
+        "--sync-parts",
+        type=int,
+        default=s3_sync.DEFAULT_MAX_PARTS,
+        help="multipart upload parts sent at once with --sync (%(default)s)",
+    )
     return parser
 
 
+def sync_collection(instructions, max_files, max_parts):
+    collection = instructions.collection
+    target = instructions.target
+    return s3_sync.sync_manifest(
+        collection.onprem.manifest,
+        collection.onprem.source,
+        bucket=target.prefix + "-private",
+        prefix=collection.meta.private_provider_path,
+        s3=s3_sync.make_s3_client(profile_name=target.prefix),
+        max_files=max_files,
+        max_parts=max_parts,
+    )
+
+
 def main():
     argv = sys.argv
     parser = init_parser(prog=argv[0])
     args = parser.parse_args(argv[1:])
-    instructions = generate_instructions(
-        args.jira_issue_key,
-        args.dsshortname,
+    pairs = []
+    if args.batch:
+        pairs.extend(read_batch_file(args.batch))
+    if args.jira_issue_key or args.dsshortname:
+        if not (args.jira_issue_key and args.dsshortname):
+            parser.error("JIRA-ISSUE and DSSHORTNAME go together")
+        pairs.append((args.jira_issue_key, args.dsshortname))
+    if not pairs:
+        parser.error("expected JIRA-ISSUE DSSHORTNAME or --batch FILE")
+    all_instructions = generate_instructions_batch(
+        pairs,
         args.target,
         args.config_tree,
         args.config_remote,
         pull=args.pull,
+        manifest_dir=args.manifest_dir,
+        inventory_workers=args.inventory_workers,
+        checksum=args.checksum,
+        cmr_cache=args.cmr_cache,
+        cmr_workers=args.cmr_workers,
     )
+    for instructions in all_instructions:
+        write_instructions(args, argv, instructions)
+    return 0
+
+
+def write_instructions(args, argv, instructions):
+    jira_issue_key = instructions.jira_issue_key
+    dsshortname = instructions.collection.name
     if args.create_bash_script:
         bash_writer = InstructionsBashWriter()
         instructions.write(bash_writer)
@@ -870,6 +1013,16 @@ def main():
             for line in bash_writer.lines:
                 print(line, file=out)
         print("Bash script saved to:", script_name)
+    if args.sync:
+        logging.basicConfig(level=logging.INFO)
+        result = sync_collection(instructions, args.sync_files, args.sync_parts)
+        print(
+            "Synced: {0:n} uploaded, {1:n} skipped, {2}".format(
+                result.uploaded,
+                result.skipped,
+                s3_sync.format_rate(result.uploaded_bytes, result.seconds),
+            )
+        )
     if args.email_docx:
         docx_writer = InstructionsDocxWriter()
         instructions.write(docx_writer)
@@ -878,14 +1031,7 @@ def main():
         msg["From"] = SENDER
         msg["To"] = RECIPIENT
         msg["Subject"] = (
-            "WIP: "
-            + args.jira_issue_key
-            + " "
-            + args.dsshortname
-            + " "
-            + args.target
-            + " "
-            + NOW
+            "WIP: " + jira_issue_key + " " + dsshortname + " " + args.target + " " + NOW
         )
         body = "\n".join((" ".join(argv), HOSTNAME_SHORT, NOW))
         msg.attach(email.mime.text.MIMEText(body))
@@ -913,8 +1059,8 @@ def main():
                                         TODAY,
                                         " ".join(
                                             (
-                                                args.jira_issue_key,
-                                                args.dsshortname,
+                                                jira_issue_key,
+                                                dsshortname,
                                             )
                                         ),
                                     )
@@ -931,7 +1077,6 @@ def main():
         smtp = smtplib.SMTP("localhost")
         smtp.sendmail(SENDER, RECIPIENT, msg.as_string())
         smtp.quit()
-    return 0
 
 
 if __name__ == "__main__":
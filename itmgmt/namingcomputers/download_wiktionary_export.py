@@ -1,16 +1,22 @@
 """Download Wiktionary dump file"""
 
+import hashlib
+import json
 import logging
 import string
 import sys
+import threading
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import AbstractContextManager
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
 from http.client import HTTPConnection
 from math import ceil
 from pathlib import Path
-from typing import Any, Callable
-from urllib.request import urlretrieve
+from typing import Any, Callable, Optional
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
 
 import bs4
 import requests
@@ -21,6 +27,11 @@ from progress.bar import FillingSquaresBar
 
 ENWIKTIONARY_DUMPS_TOP = "https://dumps.wikimedia.org/enwiktionary/"
 ENWIKTIONARY_DUMPS_OUT = Path() / "enwiktionary"
+DOWNLOAD_SEGMENTS = 4
+DOWNLOAD_BLOCK_SIZE = 1 << 20
+DOWNLOAD_RETRIES = 3
+STATE_SAVE_INTERVAL = 64 * DOWNLOAD_BLOCK_SIZE
+CHECKSUM_ALGORITHMS = ("sha1", "md5")
 
 
 @dataclass
@@ -86,7 +97,10 @@ def determine_dump_date_url(
 
 
 class ProgressReportHook(AbstractContextManager):
-    """Use progress.Progress as urlretrieve reporthook"""
+    """Use progress.Progress as urlretrieve reporthook
+
+    The message is followed by the throughput since the first report.
+    """
 
     def __init__(
         self,
@@ -96,6 +110,8 @@ class ProgressReportHook(AbstractContextManager):
         self.message = message
         self.progress_class = progress_class
         self.progress = None
+        self.first_blocks = 0
+        self.first_time = 0.0
 
     def __call__(
         self,
@@ -103,10 +119,17 @@ class ProgressReportHook(AbstractContextManager):
         block_size_in_bytes: int,
         total_size_in_bytes: int,
     ) -> None:
+        now = time.monotonic()
         if not self.progress:
             progress_max = int(ceil(total_size_in_bytes / block_size_in_bytes))
             self.progress = self.progress_class(self.message, max=progress_max)
-        self.progress.next()
+            self.first_blocks = blocks_so_far
+            self.first_time = now
+        elapsed = now - self.first_time
+        if elapsed > 0:
+            rate = (blocks_so_far - self.first_blocks) * block_size_in_bytes / elapsed
+            self.progress.message = f"{self.message} {format_rate(rate)}"
+        self.progress.goto(blocks_so_far)
 
     def __exit__(self, __exc_type, __exc_value, __traceback) -> bool:
         self.finish()
@@ -118,11 +141,251 @@ class ProgressReportHook(AbstractContextManager):
         self.progress = None
 
 
+def format_rate(bytes_per_second: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if bytes_per_second < 1024 or unit == "GiB":
+            break
+        bytes_per_second /= 1024
+    return f"{bytes_per_second:.1f} {unit}/s"
+
+
+class DownloadError(Exception):
+    """The server response cannot be used to continue the download"""
+
+
+class ChecksumMismatch(DownloadError):
+    """The downloaded file does not match the published checksum"""
+
+
+@dataclass
+class Segment:
+    start: int
+    end: int
+    done: int = 0
+
+    @property
+    def remaining(self) -> int:
+        return self.end - self.start - self.done
+
+
+@dataclass
+class DownloadState:
+    """Progress of a segmented download, saved next to the partial file"""
+
+    url: str
+    size: int
+    validator: Optional[str]
+    segments: list[Segment] = field(default_factory=list)
+
+    @classmethod
+    def plan(
+        cls, url: str, size: int, validator: Optional[str], count: int
+    ) -> "DownloadState":
+        count = max(1, min(count, size // DOWNLOAD_BLOCK_SIZE or 1))
+        bounds = [size * i // count for i in range(count + 1)]
+        segments = [Segment(a, b) for a, b in zip(bounds, bounds[1:])]
+        return cls(url, size, validator, segments)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["DownloadState"]:
+        try:
+            d = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        d["segments"] = [Segment(**_) for _ in d.get("segments", [])]
+        return cls(**d)
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(asdict(self)))
+        tmp.replace(path)
+
+    @property
+    def done(self) -> int:
+        return sum(_.done for _ in self.segments)
+
+
+@dataclass
+class RemoteFile:
+    size: Optional[int]
+    accepts_ranges: bool
+    validator: Optional[str]
+
+
+def probe(url: str) -> RemoteFile:
+    with urlopen(Request(url, method="HEAD")) as response:
+        length = response.headers.get("Content-Length")
+        accept_ranges = response.headers.get("Accept-Ranges", "none")
+        validator = response.headers.get("ETag") or response.headers.get(
+            "Last-Modified"
+        )
+    return RemoteFile(
+        int(length) if length is not None else None,
+        accept_ranges.strip().lower() == "bytes",
+        validator,
+    )
+
+
+def published_checksum(url: str) -> Optional[tuple[str, str]]:
+    """Look up (algorithm, hexdigest) for a dump file in its *sums.txt files
+
+    Wikimedia publishes e.g. enwiktionary-20240101-sha1sums.txt beside
+    enwiktionary-20240101-pages-articles.xml.bz2.
+    """
+    name = Path(urllib.parse.urlparse(url).path).name
+    dump_prefix = "-".join(name.split("-")[:2])
+    for algorithm in CHECKSUM_ALGORITHMS:
+        sums_url = urllib.parse.urljoin(url, f"{dump_prefix}-{algorithm}sums.txt")
+        try:
+            with urlopen(sums_url) as response:
+                lines = response.read().decode("utf-8").splitlines()
+        except (HTTPError, URLError) as e:
+            logging.debug("published_checksum - %s: %r", sums_url, e)
+            continue
+        for line in lines:
+            parts = line.split()
+            if len(parts) == 2 and parts[1].lstrip("*") == name:
+                return algorithm, parts[0].lower()
+    return None
+
+
+def file_checksum(path: Path, algorithm: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, algorithm).hexdigest()
+
+
+def verify_checksum(path: Path, url: str) -> bool:
+    """Compare against the published checksum, if there is one"""
+    published = published_checksum(url)
+    if not published:
+        logging.warning("no published checksum for %r", url)
+        return True
+    algorithm, expected = published
+    actual = file_checksum(path, algorithm)
+    logging.debug("verify_checksum - %s: %s (expected %s)", algorithm, actual, expected)
+    return actual == expected
+
+
+class SegmentedDownload:
+    """Download one URL with parallel HTTP range requests, resuming if possible"""
+
+    def __init__(
+        self,
+        url: str,
+        out_file: Path,
+        *,
+        segments: int = DOWNLOAD_SEGMENTS,
+        retries: int = DOWNLOAD_RETRIES,
+        reporthook: Callable[[int, int, int], None] = None,
+    ) -> None:
+        self.url = url
+        self.out_file = out_file
+        self.part_file = out_file.with_name(out_file.name + ".part")
+        self.state_file = out_file.with_name(out_file.name + ".part.json")
+        self.segments = segments
+        self.retries = retries
+        self.reporthook = reporthook
+        self.lock = threading.Lock()
+        self.state: Optional[DownloadState] = None
+        self.unsaved = 0
+
+    def run(self) -> Path:
+        remote = probe(self.url)
+        if remote.size is None or not remote.accepts_ranges:
+            logging.info("download - no range support, using one connection")
+            self.state = DownloadState(self.url, remote.size or 0, remote.validator)
+            self._fetch_whole()
+        else:
+            self.state = self._resume_or_plan(remote)
+            self._report()
+            with ThreadPoolExecutor(max_workers=len(self.state.segments)) as pool:
+                for future in [
+                    pool.submit(self._fetch_segment, _) for _ in self.state.segments
+                ]:
+                    future.result()
+        self.part_file.replace(self.out_file)
+        self.state_file.unlink(missing_ok=True)
+        return self.out_file
+
+    def _resume_or_plan(self, remote: RemoteFile) -> DownloadState:
+        state = DownloadState.load(self.state_file)
+        if (
+            state
+            and self.part_file.exists()
+            and state.url == self.url
+            and state.size == remote.size
+            and state.validator == remote.validator
+        ):
+            logging.info("download - resuming at %d of %d", state.done, state.size)
+            return state
+        state = DownloadState.plan(
+            self.url, remote.size, remote.validator, self.segments
+        )
+        with open(self.part_file, "wb") as f:
+            f.truncate(state.size)
+        state.save(self.state_file)
+        return state
+
+    def _report(self) -> None:
+        if self.reporthook:
+            blocks = self.state.done // DOWNLOAD_BLOCK_SIZE
+            self.reporthook(blocks, DOWNLOAD_BLOCK_SIZE, self.state.size)
+
+    def _advance(self, segment: Segment, nbytes: int) -> None:
+        with self.lock:
+            segment.done += nbytes
+            self.unsaved += nbytes
+            if self.unsaved >= STATE_SAVE_INTERVAL or not segment.remaining:
+                self.state.save(self.state_file)
+                self.unsaved = 0
+            self._report()
+
+    def _fetch_segment(self, segment: Segment) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                self._fetch_segment_once(segment)
+                return
+            except (URLError, ConnectionError, TimeoutError) as e:
+                if attempt == self.retries:
+                    raise
+                logging.warning("download - segment %d: %r", segment.start, e)
+                time.sleep(2**attempt)
+
+    def _fetch_segment_once(self, segment: Segment) -> None:
+        if segment.remaining <= 0:
+            return
+        first = segment.start + segment.done
+        byte_range = f"bytes={first}-{segment.end - 1}"
+        request = Request(self.url, headers={"Range": byte_range})
+        with urlopen(request) as response, open(self.part_file, "r+b", 0) as f:
+            if response.status != 206:
+                raise DownloadError(f"expected 206 but got {response.status}")
+            f.seek(first)
+            while segment.remaining > 0:
+                chunk = response.read(min(DOWNLOAD_BLOCK_SIZE, segment.remaining))
+                if not chunk:
+                    raise ConnectionError("connection closed before end of segment")
+                f.write(chunk)
+                self._advance(segment, len(chunk))
+
+    def _fetch_whole(self) -> None:
+        segment = Segment(0, self.state.size)
+        self.state.segments = [segment]
+        with urlopen(self.url) as response, open(self.part_file, "wb") as f:
+            while chunk := response.read(DOWNLOAD_BLOCK_SIZE):
+                f.write(chunk)
+                segment.done += len(chunk)
+                if self.state.size:
+                    self._report()
+
+
 def download(
     url,
     *,
     out_file: Path = None,
     out_dir: Path = ENWIKTIONARY_DUMPS_OUT,
+    segments: int = DOWNLOAD_SEGMENTS,
+    verify: bool = True,
     **kwargs,
 ) -> Path:
     for k in ("url", "out_file", "out_dir"):
@@ -132,15 +395,12 @@ def download(
     if not out_file:
         out_file = out_dir / Path(urllib.parse.urlparse(url).path).name
         logging.debug("download - out_file: %r", out_file)
+    out_file = Path(out_file)
     out_file.parent.mkdir(parents=True, exist_ok=True)
     with ProgressReportHook() as hook:
-        local_filename, headers = urlretrieve(url, out_file, reporthook=hook)
-    if not out_file.samefile(local_filename):
-        logging.warning(
-            "download moved: expected=%r, result=%r",
-            str(out_file),
-            str(local_filename),
-        )
+        SegmentedDownload(url, out_file, segments=int(segments), reporthook=hook).run()
+    if verify and not verify_checksum(out_file, url):
+        raise ChecksumMismatch(f"checksum mismatch for {str(out_file)!r}")
     return out_file
 
 
@@ -0,0 +1,108 @@
+import hashlib
+import http.server
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import download_wiktionary_export as dwe
+
+DUMP_NAME = "fakewiki-20240101-pages-articles.xml.bz2"
+DUMP_BYTES = bytes(range(256)) * 20000
+
+
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    files: dict[str, bytes] = {}
+    range_requests: list[str] = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        return self.files.get(self.path.lstrip("/"))
+
+    def do_HEAD(self):
+        body = self._body()
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", '"%s"' % hashlib.md5(body).hexdigest())
+        self.end_headers()
+
+    def do_GET(self):
+        body = self._body()
+        if body is None:
+            self.send_error(404)
+            return
+        byte_range = self.headers.get("Range")
+        if byte_range:
+            self.range_requests.append(byte_range)
+            first, last = byte_range.removeprefix("bytes=").split("-")
+            body = body[int(first) : int(last) + 1]
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestSegmentedDownload(unittest.TestCase):
+    def setUp(self):
+        RangeRequestHandler.files = {
+            DUMP_NAME: DUMP_BYTES,
+            "fakewiki-20240101-sha1sums.txt": (
+                f"{hashlib.sha1(DUMP_BYTES).hexdigest()}  {DUMP_NAME}\n".encode()
+            ),
+        }
+        RangeRequestHandler.range_requests = []
+        self.server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), RangeRequestHandler
+        )
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/{DUMP_NAME}"
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.out_file = Path(self.tmpdir.name) / DUMP_NAME
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_download_in_segments(self):
+        dwe.SegmentedDownload(self.url, self.out_file, segments=4).run()
+        self.assertEqual(DUMP_BYTES, self.out_file.read_bytes())
+        self.assertEqual(4, len(RangeRequestHandler.range_requests))
+        self.assertFalse(self.out_file.with_name(DUMP_NAME + ".part.json").exists())
+
+    def test_resume_from_partial_file(self):
+        download = dwe.SegmentedDownload(self.url, self.out_file, segments=2)
+        state = download._resume_or_plan(dwe.probe(self.url))
+        first = state.segments[0]
+        with open(download.part_file, "r+b") as f:
+            f.write(DUMP_BYTES[: first.end])
+        first.done = first.end - first.start
+        state.save(download.state_file)
+        download.run()
+        self.assertEqual(DUMP_BYTES, self.out_file.read_bytes())
+        self.assertEqual(1, len(RangeRequestHandler.range_requests))
+
+    def test_published_checksum(self):
+        self.assertEqual(
+            ("sha1", hashlib.sha1(DUMP_BYTES).hexdigest()),
+            dwe.published_checksum(self.url),
+        )
+
+    def test_checksum_mismatch(self):
+        RangeRequestHandler.files["fakewiki-20240101-sha1sums.txt"] = (
+            f"{'0' * 40}  {DUMP_NAME}\n".encode()
+        )
+        with self.assertRaises(dwe.ChecksumMismatch):
+            dwe.download(self.url, out_file=self.out_file)
+
+
+if __name__ == "__main__":
+    unittest.main()
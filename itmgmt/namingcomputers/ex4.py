@@ -1,20 +1,29 @@
 import collections
 import sys
+from pathlib import Path
 
 import rich
 
 from mediawiki_export_reading import opensesame, pages
-from wiktionary_export_reading import language_sections
+from wiktionary_export_reading import LanguageSectionCache, pages_with_language_sections
+
+SECTION_CACHE_PATH = Path() / "enwiktionary" / "language_sections.sqlite"
 
 if __name__ == "__main__":
-    with opensesame(sys.argv[1]) as f:
+    SECTION_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with (
+        opensesame(sys.argv[1]) as f,
+        LanguageSectionCache(SECTION_CACHE_PATH) as cache,
+    ):
         counts: dict[str, int] = collections.defaultdict(int)
-        for page_num, page in enumerate(pages(f), 1):
-            for language_section in language_sections(page, "English"):
-                for i, s in enumerate(language_section.sections, 1):
+        for page, language_sections in pages_with_language_sections(
+            pages(f), "English", cache=cache
+        ):
+            for language_section in language_sections:
+                for i, s in enumerate(language_section.headings, 1):
                     if s.level > 2:
                         counts[s.title or "?"] += 1
-                        # rich.print(f"{page_num:4}  {i:4} {' '*s.level} {s.title}")
+                        # rich.print(f"{page.title:20}  {i:4} {' '*s.level} {s.title}")
         top_counts = dict(
             sorted(counts.items(), key=lambda item: item[1], reverse=True)[:30]
         )
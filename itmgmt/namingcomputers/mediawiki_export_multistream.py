@@ -0,0 +1,170 @@
+"""Read mediawiki "pages-articles-multistream" dumps in parallel
+
+A multistream dump is a concatenation of independent bz2 streams, each holding
+a batch of <page> elements. The companion index file has one line per page,
+"offset:pageid:title", where offset is the byte position of the stream that
+holds the page. Each stream can be decompressed and parsed on its own, so the
+work is spread across a process pool and the results are reassembled in order.
+"""
+
+import bz2
+import io
+import os
+import sys
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Union
+
+from mediawiki_export_constants import EXPORT_NS, MEDIAWIKI
+from mediawiki_export_reading import (
+    Page,
+    TextPropertiesDict,
+    get_text_properties_as_dicts,
+    page_elements,
+    page_from_element,
+)
+
+MEDIAWIKI_OPEN = f'<{MEDIAWIKI} xmlns="{EXPORT_NS}">'.encode()
+MEDIAWIKI_CLOSE = f"</{MEDIAWIKI}>".encode()
+PAGE_OPEN = b"<page>"
+
+
+@dataclass(frozen=True)
+class StreamRange:
+    offset: int
+    length: int
+
+
+@dataclass
+class MultistreamDump:
+    path: Path
+    index_path: Path
+
+    @classmethod
+    def for_dump(cls, path: Union[str, Path], /) -> "MultistreamDump":
+        """Guess the index file name from the dump file name
+
+        enwiktionary-latest-pages-articles-multistream.xml.bz2 ->
+        enwiktionary-latest-pages-articles-multistream-index.txt.bz2
+        """
+        path = Path(path)
+        name = path.name
+        for suffix in (".xml.bz2", ".xml"):
+            if name.endswith(suffix):
+                name = name[: -len(suffix)]
+                break
+        return cls(path, path.with_name(f"{name}-index.txt.bz2"))
+
+    def stream_offsets(self) -> list[int]:
+        offsets: list[int] = []
+        last = None
+        with bz2.open(self.index_path, "rt", encoding="utf-8") as inf:
+            for line in inf:
+                offset = int(line.split(":", maxsplit=1)[0])
+                if offset != last:
+                    offsets.append(offset)
+                    last = offset
+        return offsets
+
+    def stream_ranges(self) -> Iterator[StreamRange]:
+        """Byte ranges of each stream, including the header stream before the first indexed one"""
+        offsets = self.stream_offsets()
+        size = self.path.stat().st_size
+        starts = ([0] if not offsets or offsets[0] > 0 else []) + offsets
+        for start, end in zip(starts, starts[1:] + [size]):
+            yield StreamRange(start, end - start)
+
+
+def read_stream_xml(path: Path, stream: StreamRange, /) -> bytes:
+    """Decompress one stream and wrap its <page> elements in a <mediawiki> root"""
+    with open(path, "rb") as inf:
+        inf.seek(stream.offset)
+        data = bz2.decompress(inf.read(stream.length))
+    # The first stream carries the <mediawiki> open tag and <siteinfo>,
+    # the last carries the close tag. Only the pages matter here.
+    start = data.find(PAGE_OPEN)
+    if start < 0:
+        return MEDIAWIKI_OPEN + MEDIAWIKI_CLOSE
+    end = data.rfind(MEDIAWIKI_CLOSE)
+    if end < start:
+        end = len(data)
+    return MEDIAWIKI_OPEN + data[start:end] + MEDIAWIKI_CLOSE
+
+
+def parse_stream_pages(path: Path, stream: StreamRange, /) -> list[Page]:
+    xml = read_stream_xml(path, stream)
+    return [page_from_element(_) for _ in page_elements(io.BytesIO(xml))]
+
+
+def parse_stream_dicts(
+    path: Path, stream: StreamRange, /
+) -> list[Optional[TextPropertiesDict]]:
+    xml = read_stream_xml(path, stream)
+    return [get_text_properties_as_dicts(_) for _ in page_elements(io.BytesIO(xml))]
+
+
+def _ordered_results(
+    dump: MultistreamDump,
+    parser: Callable[[Path, StreamRange], list],
+    *,
+    executor: Optional[Executor] = None,
+    max_workers: Optional[int] = None,
+    readahead: Optional[int] = None,
+) -> Iterator:
+    """Run parser on every stream, yielding results in stream order
+
+    Only a bounded window of streams is in flight at once, so a slow consumer
+    does not cause the whole dump to pile up in memory.
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    if readahead is None:
+        readahead = 4 * (max_workers or os.cpu_count() or 1)
+    pending: deque[Future] = deque()
+    try:
+        for stream in dump.stream_ranges():
+            pending.append(executor.submit(parser, dump.path, stream))
+            if len(pending) >= readahead:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def pages(
+    dump: MultistreamDump,
+    /,
+    matcher: Callable[[Page], bool] = lambda page: True,
+    **kwargs,
+) -> Iterator[Page]:
+    for page in _ordered_results(dump, parse_stream_pages, **kwargs):
+        if matcher(page):
+            yield page
+
+
+def pages_as_dicts(
+    dump: MultistreamDump, /, **kwargs
+) -> Iterator[Optional[TextPropertiesDict]]:
+    yield from _ordered_results(dump, parse_stream_dicts, **kwargs)
+
+
+if __name__ == "__main__":
+    import rich
+    from progress.counter import Counter  # type: ignore
+
+    dump = MultistreamDump.for_dump(sys.argv[1])
+    if len(sys.argv) > 2:
+        dump.index_path = Path(sys.argv[2])
+    count = 0
+    with Counter() as prgrss:
+        for page in pages(dump):
+            prgrss.next()
+            count += 1
+    rich.print(count)
@@ -1,6 +1,5 @@
 import bz2
 from dataclasses import dataclass
-from functools import cache
 from typing import Any, Callable, Iterator, Optional, TextIO, Union
 
 from lxml import etree  # type: ignore
@@ -22,6 +21,10 @@ QPAGE = etree.QName(EXPORT_NS, PAGE)
 QTEXT = etree.QName(EXPORT_NS, TEXT)
 QTITLE = etree.QName(EXPORT_NS, TITLE)
 
+PAGE_PROPERTY_NAMES_BY_TAG = {
+    _.text: _.localname for _ in (QTITLE, QMODEL, QFORMAT, QTEXT)
+}
+
 
 @dataclass
 class Page:
@@ -58,7 +61,6 @@ def opensesame(*args, **kwargs):
     return open(*args, **kwargs)
 
 
-@cache
 def get_text_property(
     el: etree.Element,
     property_uri: str,
@@ -83,15 +85,26 @@ def pages(
     matcher: Callable[[Page], bool] = lambda page: True,
 ) -> Iterator[Page]:
     for page_el in page_elements(xmlfile):
-        title = get_text_property(page_el, EXPORT_NS, TITLE)
-        model = get_text_property(page_el, EXPORT_NS, MODEL)
-        format_ = get_text_property(page_el, EXPORT_NS, FORMAT)
-        text = get_text_property(page_el, EXPORT_NS, TEXT)
-        page = Page(title, model, format_, text)
+        page = page_from_element(page_el)
         if matcher(page):
             yield page
 
 
+def page_from_element(page_el: etree.Element) -> Page:
+    """Collect title, model, format, and text in one pass over the children"""
+    found: dict[str, Optional[str]] = {}
+    for child in page_el:
+        name = PAGE_PROPERTY_NAMES_BY_TAG.get(child.tag)
+        if name is not None and name not in found:
+            found[name] = get_element_as_text(child)
+    return Page(
+        found.get(TITLE),
+        found.get(MODEL),
+        found.get(FORMAT),
+        found.get(TEXT),
+    )
+
+
 TextPropertiesDict = dict[str, Any]
 
 
@@ -115,6 +128,16 @@ def pages_as_dicts(xmlfile) -> Iterator[Optional[TextPropertiesDict]]:
 
 
 def page_elements(xmlfile: TextIO) -> Iterator[etree.Element]:
+    """Yield each <page> element, discarding it and its predecessors afterwards
+
+    iterparse keeps building the tree under the <mediawiki> root, so clearing
+    the page alone still leaves an empty element behind for every page.
+    Deleting the preceding siblings keeps memory flat across the whole dump.
+    """
     for _, page_el in etree.iterparse(xmlfile, tag=QPAGE):
         yield page_el
         page_el.clear(keep_tail=True)
+        parent = page_el.getparent()
+        if parent is not None:
+            while page_el.getprevious() is not None:
+                del parent[0]
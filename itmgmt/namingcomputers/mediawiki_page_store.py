@@ -0,0 +1,278 @@
+"""Namespace-partitioned Avro page store with a title index
+
+Converts a mediawiki export straight into one Avro file per namespace, written
+with fastavro and a block codec. Every page's location is recorded in a
+sqlite index as (partition, block byte offset, record offset within block), so
+a single page can be read by seeking to its block, and a namespace can be
+scanned by reading only its own partition.
+"""
+
+import json
+import logging
+import sqlite3
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+import fastavro  # type: ignore
+
+from mediawiki_export_reading import TextPropertiesDict, opensesame, pages_as_dicts
+
+PAGE_SCHEMA_PATH = Path(__file__).with_name("page.avsc")
+INDEX_NAME = "index.sqlite"
+DEFAULT_CODEC = "deflate"
+DEFAULT_BLOCK_RECORDS = 500
+MISSING_NS = "_missingns_"
+EMPTY_NS = "_empty_"
+
+INDEX_DDL = """
+create table if not exists partitions (
+    label text primary key,
+    ns text not null,
+    prefix text not null,
+    filename text not null
+);
+create table if not exists pages (
+    title text primary key,
+    label text not null references partitions (label),
+    block integer not null,
+    offset integer not null
+);
+create index if not exists pages_label on pages (label);
+"""
+
+
+def ns_and_prefix_for_page(page: dict, /) -> tuple[str, str]:
+    ns = page.get("ns", MISSING_NS)
+    if ns in ("0", MISSING_NS):
+        return ns, ""
+    if ns == "":
+        return EMPTY_NS, ""
+    title = page.get("title", "")
+    prefix = title.split(":")[0]
+    return ns, prefix
+
+
+def outlabel_for_ns_and_prefix(ns: str, prefix: str, /) -> str:
+    prefix = prefix.lower().replace(" ", "_")
+    return "-".join([_ for _ in (ns, prefix) if _])
+
+
+def load_page_schema(path: Path = PAGE_SCHEMA_PATH) -> dict:
+    return fastavro.parse_schema(json.loads(path.read_text()))
+
+
+@dataclass
+class PartitionWriter:
+    """Avro writer that flushes fixed-size blocks and tracks record positions"""
+
+    label: str
+    ns: str
+    prefix: str
+    path: Path
+    fo: BinaryIO
+    writer: fastavro.write.Writer
+    block_records: int
+    block_start: int = 0
+    pending_titles: list[Optional[str]] = field(default_factory=list)
+
+    def append(self, page: TextPropertiesDict) -> Optional[tuple[str, int, int]]:
+        if not self.pending_titles:
+            self.block_start = self.fo.tell()
+        self.writer.write(page)
+        title = page.get("title")
+        self.pending_titles.append(title)
+        if title is None:
+            return None
+        return (title, self.block_start, len(self.pending_titles) - 1)
+
+    def block_is_full(self) -> bool:
+        return len(self.pending_titles) >= self.block_records
+
+    def flush(self) -> None:
+        self.writer.flush()
+        self.pending_titles.clear()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self.fo.close()
+
+
+@dataclass
+class BuildStatistics:
+    pages_seen: int = 0
+    pages_by_label: dict[str, int] = field(default_factory=dict)
+
+
+class PageStore:
+    def __init__(self, directory: Path, /) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.directory / INDEX_NAME)
+        self.db.executescript(INDEX_DDL)
+        self._pending_rows: list[tuple[str, str, int, int]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def build(
+        self,
+        inf,
+        /,
+        *,
+        codec: str = DEFAULT_CODEC,
+        block_records: int = DEFAULT_BLOCK_RECORDS,
+        schema: Optional[dict] = None,
+        progress=None,
+    ) -> BuildStatistics:
+        """Partition every page of an export, replacing any existing store"""
+        schema = schema or load_page_schema()
+        stats = BuildStatistics()
+        writers: dict[str, PartitionWriter] = {}
+        with self.db:
+            self.db.execute("delete from pages")
+            self.db.execute("delete from partitions")
+        try:
+            for page in pages_as_dicts(inf):
+                if page is None:
+                    continue
+                stats.pages_seen += 1
+                if progress:
+                    progress.next()
+                ns, prefix = ns_and_prefix_for_page(page)
+                if ns not in writers:
+                    writers[ns] = self._make_writer(
+                        ns, prefix, schema, codec, block_records
+                    )
+                writer = writers[ns]
+                if writer.prefix != prefix:
+                    logging.debug(
+                        "mismatched ns prefix at title %r: expected %r, got %r",
+                        page.get("title"),
+                        writer.prefix,
+                        prefix,
+                    )
+                location = writer.append(page)
+                if location:
+                    title, block, offset = location
+                    self._pending_rows.append((title, writer.label, block, offset))
+                stats.pages_by_label[writer.label] = (
+                    stats.pages_by_label.get(writer.label, 0) + 1
+                )
+                if writer.block_is_full():
+                    writer.flush()
+                    self._save_pending_rows()
+        finally:
+            for writer in writers.values():
+                writer.close()
+            self._save_pending_rows()
+        return stats
+
+    def _make_writer(
+        self,
+        ns: str,
+        prefix: str,
+        schema: dict,
+        codec: str,
+        block_records: int,
+    ) -> PartitionWriter:
+        label = outlabel_for_ns_and_prefix(ns, prefix)
+        logging.info("new partition: %s", label)
+        path = self.directory / f"pages-{label}.avro"
+        fo = open(path, "wb")
+        # Blocks are flushed explicitly every block_records pages, so the
+        # automatic size-based flushing is pushed out of the way.
+        writer = fastavro.write.Writer(fo, schema, codec=codec, sync_interval=2**62)
+        with self.db:
+            self.db.execute(
+                "insert or replace into partitions values (?, ?, ?, ?)",
+                (label, ns, prefix, path.name),
+            )
+        return PartitionWriter(label, ns, prefix, path, fo, writer, block_records)
+
+    def _save_pending_rows(self) -> None:
+        if not self._pending_rows:
+            return
+        with self.db:
+            self.db.executemany(
+                "insert or replace into pages values (?, ?, ?, ?)",
+                self._pending_rows,
+            )
+        self._pending_rows = []
+
+    def locate(self, title: str, /) -> Optional[tuple[Path, int, int]]:
+        row = self.db.execute(
+            "select filename, block, offset"
+            " from pages join partitions using (label)"
+            " where title = ?",
+            (title,),
+        ).fetchone()
+        if row is None:
+            return None
+        filename, block, offset = row
+        return self.directory / filename, block, offset
+
+    def get(self, title: str, /) -> Optional[TextPropertiesDict]:
+        location = self.locate(title)
+        if location is None:
+            return None
+        path, block, offset = location
+        with open(path, "rb") as fo:
+            blocks = fastavro.block_reader(fo)
+            fo.seek(block)
+            for i, record in enumerate(next(blocks)):
+                if i == offset:
+                    return record
+        raise LookupError(f"index points past end of block for {title!r}")
+
+    def namespaces(self) -> list[tuple[str, str, str]]:
+        return self.db.execute(
+            "select ns, prefix, label from partitions order by label"
+        ).fetchall()
+
+    def scan(self, ns: str, /) -> Iterator[TextPropertiesDict]:
+        for (filename,) in self.db.execute(
+            "select filename from partitions where ns = ? order by label", (ns,)
+        ).fetchall():
+            with open(self.directory / filename, "rb") as fo:
+                yield from fastavro.reader(fo)
+
+
+def main(argv: list[str]) -> None:
+    import rich
+    from progress.counter import Counter  # type: ignore
+
+    usage = (
+        f"usage: {argv[0]} build DUMP STOREDIR | get STOREDIR TITLE | scan STOREDIR NS"
+    )
+    if len(argv) != 4:
+        sys.exit(usage)
+    command, first, second = argv[1:]
+    if command == "build":
+        with PageStore(Path(second)) as store, Counter() as prgrss:
+            with opensesame(first, "r") as inf:
+                stats = store.build(inf, progress=prgrss)
+        print()
+        rich.print(stats)
+    elif command == "get":
+        with PageStore(Path(first)) as store:
+            rich.print(store.get(second))
+    elif command == "scan":
+        with PageStore(Path(first)) as store:
+            for page in store.scan(second):
+                print(page.get("title"))
+    else:
+        sys.exit(usage)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
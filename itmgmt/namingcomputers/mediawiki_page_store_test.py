@@ -0,0 +1,62 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+import mediawiki_page_store as mps
+from mediawiki_export_constants import EXPORT_NS
+
+
+def export_xml(pages: list[tuple[str, str, str]]) -> bytes:
+    body = "".join(
+        f"<page><title>{title}</title><ns>{ns}</ns>"
+        f"<revision><model>wikitext</model><text>{text}</text></revision></page>"
+        for title, ns, text in pages
+    )
+    return f'<mediawiki xmlns="{EXPORT_NS}">{body}</mediawiki>'.encode()
+
+
+PAGES = [(f"word{i}", "0", f"text of word{i}") for i in range(12)] + [
+    ("Template:en-noun", "10", "template text"),
+    ("Template:en-verb", "10", "other template text"),
+]
+
+
+class TestPageStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = mps.PageStore(Path(self.tmpdir.name))
+        self.stats = self.store.build(io.BytesIO(export_xml(PAGES)), block_records=5)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_build_partitions_by_namespace(self):
+        self.assertEqual(len(PAGES), self.stats.pages_seen)
+        self.assertEqual({"0": 12, "10-template": 2}, self.stats.pages_by_label)
+        self.assertEqual(
+            [("0", "", "0"), ("10", "Template", "10-template")],
+            self.store.namespaces(),
+        )
+
+    def test_get_every_page_by_title(self):
+        for title, ns, text in PAGES:
+            page = self.store.get(title)
+            self.assertEqual((title, ns), (page["title"], page["ns"]))
+            self.assertEqual(text, page["revision"]["text"])
+        self.assertIsNone(self.store.get("missing"))
+
+    def test_scan_reads_one_namespace_in_order(self):
+        self.assertEqual(
+            [title for title, ns, _ in PAGES if ns == "10"],
+            [_["title"] for _ in self.store.scan("10")],
+        )
+        self.assertEqual(
+            [title for title, ns, _ in PAGES if ns == "0"],
+            [_["title"] for _ in self.store.scan("0")],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
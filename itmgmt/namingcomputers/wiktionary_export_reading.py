@@ -1,4 +1,13 @@
-from typing import Iterator
+import hashlib
+import os
+import re
+import sqlite3
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
 
 import wikitextparser as wtp  # type: ignore
 
@@ -6,9 +15,11 @@ from mediawiki_export_constants import WIKITEXT_FORMAT, WIKITEXT_MODEL
 from mediawiki_export_reading import Page
 
 LANGUAGE_SECTION_LEVEL = 2
+LANGUAGE_HEADING_RE = re.compile(r"^==(?!=)(.+?)(?<!=)==[ \t]*$", re.MULTILINE)
+DEFAULT_BATCH_SIZE = 256
 
 
-def language_sections(page: Page, /, match_title: str = None) -> Iterator[wtp.Section]:
+def check_wikitext(page: Page, /) -> None:
     if page.model != WIKITEXT_MODEL:
         raise ValueError(
             "expected wikitext model %r but got %r", WIKITEXT_MODEL, page.model
@@ -18,11 +29,293 @@ def language_sections(page: Page, /, match_title: str = None) -> Iterator[wtp.Se
             "expected wikitext format %r but got %r", WIKITEXT_FORMAT, page.format
         )
 
+
+def language_section_slices(text: Optional[str], /) -> list[tuple[str, str]]:
+    """Split wikitext at level 2 headings without parsing it
+
+    Returns (heading title, section wikitext) pairs, where the section runs
+    from its heading up to the next level 2 heading.
+    """
+    if not text:
+        return []
+    headings = list(LANGUAGE_HEADING_RE.finditer(text))
+    ends = [_.start() for _ in headings[1:]] + [len(text)]
+    return [(h.group(1).strip(), text[h.start() : e]) for h, e in zip(headings, ends)]
+
+
+def language_sections(page: Page, /, match_title: str = None) -> Iterator[wtp.Section]:
+    check_wikitext(page)
     if match_title:
         title_matches = lambda s: s.title == match_title
     else:
         title_matches = lambda s: True
-    wikitext = wtp.parse(page.text)
-    for section in wikitext.sections:
-        if section.level == LANGUAGE_SECTION_LEVEL and title_matches(section):
-            yield section
+    for heading, wikitext in language_section_slices(page.text):
+        if match_title and heading != match_title.strip():
+            continue
+        for section in wtp.parse(wikitext).sections:
+            if section.level == LANGUAGE_SECTION_LEVEL and title_matches(section):
+                yield section
+
+
+def page_revision(page: Page, /) -> str:
+    """Stand-in revision key, since filtered exports do not keep revision ids"""
+    return hashlib.sha1((page.text or "").encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class SectionHeading:
+    """A heading within a language section, with the span of its section"""
+
+    level: int
+    title: Optional[str]
+    start: int
+    end: int
+
+
+@dataclass(frozen=True)
+class LanguageSection:
+    page_title: Optional[str]
+    language: str
+    wikitext: str
+    headings: tuple[SectionHeading, ...] = ()
+
+    def text_of(self, heading: SectionHeading, /) -> str:
+        return self.wikitext[heading.start : heading.end]
+
+    def parse(self) -> wtp.Section:
+        for section in wtp.parse(self.wikitext).sections:
+            if section.level == LANGUAGE_SECTION_LEVEL:
+                return section
+        raise ValueError(f"no language section in {self.page_title!r}")
+
+
+HeadingTuple = tuple[int, Optional[str], int, int]
+ParsedSlice = tuple[str, str, Optional[list[HeadingTuple]]]
+
+
+def is_wanted_language(language: str, match_title: Optional[str], /) -> bool:
+    return not match_title or language == match_title.strip()
+
+
+def parse_headings(wikitext: str, /) -> list[HeadingTuple]:
+    """(level, title, start, end) of a language section and every section in it"""
+    return [
+        (s.level, s.title, *s.span)
+        for s in wtp.parse(wikitext).sections
+        if s.level >= LANGUAGE_SECTION_LEVEL
+    ]
+
+
+def parse_language_sections(
+    text: Optional[str], /, match_title: str = None
+) -> list[ParsedSlice]:
+    """Split wikitext at level 2 headings and parse the headings of each part
+
+    Returns (language, section wikitext, headings) triples, where headings are
+    (level, title, start, end) tuples for the language section itself and
+    every section nested in it, spanning offsets into the section wikitext.
+    With match_title, only that language is parsed, and the headings of the
+    others are None.
+    """
+    return [
+        (
+            language,
+            wikitext,
+            (
+                parse_headings(wikitext)
+                if is_wanted_language(language, match_title)
+                else None
+            ),
+        )
+        for language, wikitext in language_section_slices(text)
+    ]
+
+
+class LanguageSectionCache:
+    """Level 2 sections persisted per (page title, revision)
+
+    Every section's wikitext is kept, but headings only for the sections
+    that were parsed.
+    """
+
+    SCHEMA_VERSION = 2
+
+    def __init__(self, path: Path, /) -> None:
+        self.db = sqlite3.connect(path)
+        (version,) = self.db.execute("pragma user_version").fetchone()
+        if version != self.SCHEMA_VERSION:
+            # Caches from before the current schema are started over.
+            self.db.executescript(
+                f"""
+                drop table if exists headings;
+                drop table if exists sections;
+                drop table if exists pages;
+                pragma user_version = {self.SCHEMA_VERSION};
+                """
+            )
+        self.db.executescript(
+            """
+            create table if not exists pages (
+                title text primary key,
+                revision text not null
+            );
+            create table if not exists sections (
+                title text not null references pages (title),
+                seq integer not null,
+                language text not null,
+                wikitext text not null,
+                parsed integer not null,
+                primary key (title, seq)
+            );
+            create table if not exists headings (
+                title text not null references pages (title),
+                seq integer not null,
+                n integer not null,
+                level integer not null,
+                heading text,
+                start integer not null,
+                end integer not null,
+                primary key (title, seq, n)
+            );
+            """
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def get(self, title: str, revision: str) -> Optional[list[ParsedSlice]]:
+        row = self.db.execute(
+            "select revision from pages where title = ?", (title,)
+        ).fetchone()
+        if row is None or row[0] != revision:
+            return None
+        parsed: list[ParsedSlice] = [
+            (language, wikitext, [] if was_parsed else None)
+            for language, wikitext, was_parsed in self.db.execute(
+                "select language, wikitext, parsed from sections where title = ?"
+                " order by seq",
+                (title,),
+            )
+        ]
+        for seq, *heading in self.db.execute(
+            "select seq, level, heading, start, end from headings where title = ?"
+            " order by seq, n",
+            (title,),
+        ):
+            parsed[seq][2].append(tuple(heading))
+        return parsed
+
+    def put_many(self, entries: Iterable[tuple[str, str, list[ParsedSlice]]]):
+        with self.db:
+            for title, revision, parsed in entries:
+                self.db.execute("delete from headings where title = ?", (title,))
+                self.db.execute("delete from sections where title = ?", (title,))
+                self.db.execute(
+                    "insert or replace into pages values (?, ?)", (title, revision)
+                )
+                self.db.executemany(
+                    "insert into sections values (?, ?, ?, ?, ?)",
+                    [
+                        (title, seq, language, wikitext, headings is not None)
+                        for seq, (language, wikitext, headings) in enumerate(parsed)
+                    ],
+                )
+                self.db.executemany(
+                    "insert into headings values (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (title, seq, n, *heading)
+                        for seq, (_, _, headings) in enumerate(parsed)
+                        for n, heading in enumerate(headings or ())
+                    ],
+                )
+
+
+def _parse_batch(
+    texts: list[Optional[str]], /, match_title: str = None
+) -> list[list[ParsedSlice]]:
+    return [parse_language_sections(_, match_title) for _ in texts]
+
+
+def _batches(it: Iterable, size: int, /) -> Iterator[list]:
+    it = iter(it)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def pages_with_language_sections(
+    pages: Iterable[Page],
+    /,
+    match_title: str = None,
+    *,
+    cache: Optional[LanguageSectionCache] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_workers: Optional[int] = None,
+) -> Iterator[tuple[Page, list[LanguageSection]]]:
+    """Pair each wikitext page with its language sections, in page order
+
+    Pages whose revision is already in the cache are answered from it. The
+    rest are split into sections by worker processes, one batch at a time,
+    and only the sections matching match_title have their headings parsed
+    there. Results are saved back to the cache, where a matching section
+    that an earlier run with another match_title left unparsed is parsed on
+    the way out. LanguageSection.parse() is only needed for more than headings.
+    """
+    readahead = 2 * (max_workers or os.cpu_count() or 1)
+    pending: deque[tuple[list, Optional[Future]]] = deque()
+
+    def finish(entry: tuple[list, Optional[Future]]):
+        batch, future = entry
+        found = iter(future.result()) if future else iter(())
+        fresh = []
+        for page, revision, cached in batch:
+            parsed = cached if cached is not None else next(found)
+            stale = cached is None
+            sections = []
+            for i, (language, wikitext, headings) in enumerate(parsed):
+                if not is_wanted_language(language, match_title):
+                    continue
+                if headings is None:
+                    headings = parse_headings(wikitext)
+                    parsed[i] = (language, wikitext, headings)
+                    stale = True
+                sections.append(
+                    LanguageSection(
+                        page.title,
+                        language,
+                        wikitext,
+                        tuple(SectionHeading(*_) for _ in headings),
+                    )
+                )
+            if stale and cache and page.title is not None:
+                fresh.append((page.title, revision, parsed))
+            yield page, sections
+        if fresh:
+            cache.put_many(fresh)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for page_batch in _batches(pages, batch_size):
+            batch = []
+            misses = []
+            for page in page_batch:
+                check_wikitext(page)
+                revision = page_revision(page)
+                cached = None
+                if cache and page.title is not None:
+                    cached = cache.get(page.title, revision)
+                if cached is None:
+                    misses.append(page.text)
+                batch.append((page, revision, cached))
+            future = None
+            if misses:
+                future = executor.submit(_parse_batch, misses, match_title)
+            pending.append((batch, future))
+            if len(pending) >= readahead:
+                yield from finish(pending.popleft())
+        while pending:
+            yield from finish(pending.popleft())
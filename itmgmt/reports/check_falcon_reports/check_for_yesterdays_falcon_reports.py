@@ -13,13 +13,14 @@ import sys
 import urllib.parse
 from enum import Flag, auto
 from pathlib import Path
-from typing import Any, List, Mapping, Tuple, Union
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, Union
 
 FINGERPRINT = hashlib.sha256(open(__file__, "br").read()).digest()
 
 CHECK_FALCON_REPORTS_SETTINGS_ATTRIBUTE_NAMES = [
     "access_log",
     "date_expression",
+    "through",
     "database",
 ]
 CHECK_FALCON_REPORTS_SETTINGS_SECTION_NAME = "settings"
@@ -30,6 +31,7 @@ StrOrBytesPath = Union[str, bytes, "os.PathLike[str]", "os.PathLike[bytes]"]
 class CheckFalconReportsSettings:
     access_log: Path
     date_expression: str = "yesterday"
+    through: Optional[str] = None
     database: StrOrBytesPath
 
     def __init__(self, name="check_falcon_reports", argv=[]):
@@ -83,6 +85,37 @@ class HistorySaveFlag(Flag):
     ALL_LINES = MATCHED_LINES | UNMATCHED_LINES | PARSED_LINES | UNPARSED_LINES
 
 
+class LogCheckpoint:
+    """Where to resume reading a log file on the next run
+
+    offset is the start of the first line dated after the last date read, so
+    everything before it has already been looked at. line_no is the number of
+    that line, which keeps record ids stable across runs.
+    """
+
+    def __init__(
+        self,
+        log: str,
+        inode: int = 0,
+        offset: int = 0,
+        line_no: int = 0,
+        date: Optional[datetime.date] = None,
+    ) -> None:
+        self.log = log
+        self.inode = inode
+        self.offset = offset
+        self.line_no = line_no
+        self.date = date
+
+    def __repr__(self) -> str:
+        return "LogCheckpoint({0!r}, {1!r}, {2!r}, {3!r}, {4!r})".format(
+            self.log, self.inode, self.offset, self.line_no, self.date
+        )
+
+    def is_before(self, date: datetime.date) -> bool:
+        return self.date is None or self.date < date
+
+
 class History:
     @property
     def all_lines(self) -> List[str]:
@@ -110,15 +143,19 @@ class History:
 
     def __init__(
         self,
-        date_filter: str,
+        date_filter: Union[str, List[str]],
         lines_to_save=HistorySaveFlag.RECORDS_ONLY,
         err=None,
     ) -> None:
         self._lines = {}
-        for flag in HistorySaveFlag:
+        for flag in HistorySaveFlag.__members__.values():
             self._lines[flag] = []
         self._records = self._lines[HistorySaveFlag.RECORDS_ONLY]
-        self.date_filter = date_filter
+        if isinstance(date_filter, str):
+            date_filter = [date_filter]
+        self.date_filters = list(date_filter)
+        self.date_filter = self.date_filters[0]
+        self._date_filter_set = frozenset(self.date_filters)
         self.lines_to_save = lines_to_save
         self.err = err
 
@@ -126,60 +163,130 @@ class History:
         if (self.lines_to_save & flag) == flag:
             self._lines[flag].append(line)
 
-    def read_records_from_logs(self, *logs):
+    @property
+    def needs_every_line(self) -> bool:
+        """Whether lines besides matches are saved, which rules out prefiltering"""
+        return bool(self.lines_to_save & ~HistorySaveFlag.MATCHED_LINES)
+
+    def _is_match(self, d: Mapping[str, str]) -> bool:
+        return d["t"][:11] in self._date_filter_set and d["r"].lower().startswith(
+            FALCON_REPORT_REQUEST_PREFIX
+        )
+
+    def read_records_from_logs(
+        self,
+        *logs,
+        checkpoints: Optional[Dict[str, LogCheckpoint]] = None,
+    ):
+        """Collect the falcon report records for the date filters from logs
+
+        With checkpoints, each log is read from where the previous run left
+        off, and the checkpoints are moved forward. Unless other lines are
+        being saved, lines are prefiltered on their day and a plain substring
+        before the full regex, and only matching lines get their timestamp
+        parsed.
+        """
+        if checkpoints is None and self.needs_every_line:
+            self._read_every_line(*logs)
+            return
+        for log_filename in logs:
+            checkpoint = None
+            if checkpoints is not None:
+                checkpoint = checkpoints.setdefault(
+                    log_filename, LogCheckpoint(log_filename)
+                )
+            self._read_candidate_lines(log_filename, checkpoint)
+
+    def _read_every_line(self, *logs):
         lognames = dict([(_, os.path.basename(_)) for _ in logs])
         for line, line_no, log_filename in lines_from_log_files(*logs):
             self._save_line(HistorySaveFlag.ALL_LINES, line)
             d = parse(line)
             if d:
                 self._save_line(HistorySaveFlag.PARSED_LINES, line)
-                if d["t"].startswith(self.date_filter) and d["r"].lower().startswith(
-                    "get /falcon-report.txt?"
-                ):
+                if self._is_match(d):
                     self._save_line(HistorySaveFlag.MATCHED_LINES, line)
-
-                    t_date, t_time = d["t"].split(":", 1)
-                    t_time, t_zone = t_time.split(None, 1)
-
-                    lead, psbuild = d["user_agent"].rsplit("/", 1)
-                    if not lead.lower().endswith("powershell"):
-                        psbuild = "n/a"
-
-                    record = Record(
-                        recordid="{0}:{1}".format(lognames[log_filename], line_no),
-                        timestamp=d["timestamp"],
-                        ip=d["h"],
-                        user=d["u"],
-                        date=t_date,
-                        time=t_time,
-                        zone=t_zone,
-                        psbuild=psbuild,
-                        tagged="untagged",
-                    )
-
-                    method, rest = d["r"].split(None, 1)
-                    path, rest = rest.rsplit(None, 1)
-                    query = urllib.parse.urlparse(path, "http").query
-                    data = urllib.parse.parse_qs(query)
-
-                    for k in data.keys():
-                        v = data[k][0]
-                        if k == "tag":
-                            record["tagged"] = "tagged"
-                        elif k == "computer" and "." in v:
-                            v = v.split(".")[0]
-                        record[k] = v
-                        if not k in Record.FIELD_LABELS:
-                            if self.err:
-                                print("## unexpected parameter:", k, file=self.err)
-                            Record.FIELD_LABELS[k] = k
-
-                    self.records.append(record)
+                    self._add_record(d, lognames[log_filename], line_no)
                 else:
                     self._save_line(HistorySaveFlag.UNMATCHED_LINES, line)
             else:
                 self._save_line(HistorySaveFlag.UNPARSED_LINES, line)
 
+    def _read_candidate_lines(
+        self, log_filename: str, checkpoint: Optional[LogCheckpoint]
+    ):
+        logname = os.path.basename(log_filename)
+        dates = [date_from_date_filter(_) for _ in self.date_filters]
+        day_needles = frozenset(_.encode() for _ in self.date_filters)
+        moves_checkpoint = checkpoint is not None and checkpoint.is_before(min(dates))
+        reader = RawLogLines(log_filename, checkpoint if moves_checkpoint else None)
+        is_later = LaterDayDetector(max(dates))
+        resume_at = None
+        for raw, line_no, offset in reader:
+            if resume_at is None and moves_checkpoint and is_later(raw):
+                resume_at = (offset, line_no)
+            if line_day(raw) not in day_needles:
+                continue
+            if FALCON_REPORT_PATH_NEEDLE not in raw.lower():
+                continue
+            line = raw.decode("utf-8", "replace")
+            m = COMBINED_LOG_RE.match(line)
+            if not m:
+                continue
+            d = m.groupdict()
+            if self._is_match(d):
+                self._save_line(HistorySaveFlag.MATCHED_LINES, line)
+                d["timestamp"] = parse_timestamp(d["t"])
+                self._add_record(d, logname, line_no)
+        if not moves_checkpoint:
+            return
+        if resume_at is None:
+            # Nothing dated later yet, so every complete line read so far
+            # belongs to the date of interest or earlier.
+            resume_at = (reader.end_offset, reader.end_line_no)
+        checkpoint.inode = reader.inode
+        checkpoint.offset, checkpoint.line_no = resume_at
+        checkpoint.date = max(dates)
+
+    def _add_record(self, d: Mapping[str, Any], logname: str, line_no: int) -> None:
+        t_date, t_time = d["t"].split(":", 1)
+        t_time, t_zone = t_time.split(None, 1)
+
+        lead, psbuild = d["user_agent"].rsplit("/", 1)
+        if not lead.lower().endswith("powershell"):
+            psbuild = "n/a"
+
+        record = Record(
+            recordid="{0}:{1}".format(logname, line_no),
+            timestamp=d["timestamp"],
+            ip=d["h"],
+            user=d["u"],
+            date=t_date,
+            time=t_time,
+            zone=t_zone,
+            psbuild=psbuild,
+            tagged="untagged",
+        )
+
+        method, rest = d["r"].split(None, 1)
+        path, rest = rest.rsplit(None, 1)
+        query = urllib.parse.urlparse(path, "http").query
+        data = urllib.parse.parse_qs(query)
+
+        for k in data.keys():
+            v = data[k][0]
+            if k == "tag":
+                record["tagged"] = "tagged"
+            elif k == "computer" and "." in v:
+                v = v.split(".")[0]
+            record[k] = v
+            if not k in Record.FIELD_LABELS:
+                if self.err:
+                    print("## unexpected parameter:", k, file=self.err)
+                Record.FIELD_LABELS[k] = k
+
+        self.records.append(record)
+
 
 class Database:
     def __init__(self, column_names: List[str]) -> None:
@@ -219,6 +326,12 @@ class Database:
     def upsert(self, records: List[Record]) -> None:
         raise NotImplementedError()
 
+    def load_checkpoints(self, logs: List[str]) -> Dict[str, LogCheckpoint]:
+        raise NotImplementedError()
+
+    def save_checkpoints(self, checkpoints: Dict[str, LogCheckpoint]) -> None:
+        raise NotImplementedError()
+
 
 class Sqlite3Database(Database):
     def __init__(self, database: StrOrBytesPath, column_names: List[str]) -> None:
@@ -226,6 +339,7 @@ class Sqlite3Database(Database):
         self.database = database
         self._connect()
         self._repair_records_schema()
+        self._repair_checkpoints_schema()
 
     def _connect(self):
         if not str(self.database).startswith(":"):
@@ -238,6 +352,15 @@ class Sqlite3Database(Database):
     def _new_context(self) -> sqlite3.Cursor:
         return self.connection.cursor()
 
+    def _repair_checkpoints_schema(self) -> None:
+        sql = (
+            "CREATE TABLE IF NOT EXISTS log_checkpoints (log TEXT PRIMARY KEY,"
+            " inode INTEGER, offset INTEGER, line_no INTEGER, date TEXT)"
+        )
+        logging.debug("repair checkpoints schema: %r", sql)
+        with self.connection:
+            self.connection.execute(sql)
+
     def _does_records_table_exist(self, ctx: sqlite3.Cursor) -> bool:
         if sqlite3.sqlite_version_info < (3, 30, 0):
             schema_table_name = "sqlite_master"
@@ -310,6 +433,32 @@ class Sqlite3Database(Database):
                 [[record.get(_, None) for _ in names] for record in records],
             )
 
+    def load_checkpoints(self, logs: List[str]) -> Dict[str, LogCheckpoint]:
+        checkpoints = {}
+        for log in logs:
+            row = self.connection.execute(
+                "SELECT inode, offset, line_no, date FROM log_checkpoints"
+                " WHERE log = ?",
+                (log,),
+            ).fetchone()
+            if row:
+                inode, offset, line_no, date = row
+                checkpoints[log] = LogCheckpoint(
+                    log, inode, offset, line_no, datetime.date.fromisoformat(date)
+                )
+        return checkpoints
+
+    def save_checkpoints(self, checkpoints: Dict[str, LogCheckpoint]) -> None:
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO log_checkpoints VALUES (?, ?, ?, ?, ?)",
+                [
+                    (_.log, _.inode, _.offset, _.line_no, _.date.isoformat())
+                    for _ in checkpoints.values()
+                    if _.date is not None
+                ],
+            )
+
 
 class XDG:
     """
@@ -365,20 +514,28 @@ def run(
     out=sys.stdout,
     err=sys.stderr,
 ) -> int:
-    date_of_interest = get_date_for_expression(settings.date_expression)
-    date_filter = determine_date_filter(date_of_interest)
-    logs = determine_log_filenames(settings.access_log, date_of_interest)
-
-    history = History(date_filter, err=err)
-    history.read_records_from_logs(*logs)
+    first = get_date_for_expression(settings.date_expression)
+    last = first
+    if settings.through:
+        last = get_date_for_expression(settings.through)
+    first, last = min(first, last), max(first, last)
+    date_filters = [determine_date_filter(_) for _ in dates_between(first, last)]
+    logs = determine_log_filenames_for_range(settings.access_log, first, last)
+
+    db = Sqlite3Database(settings.database, Record.FIELD_LABELS.keys())
+    checkpoints = db.load_checkpoints(list(logs))
+    history = History(date_filters, err=err)
+    history.read_records_from_logs(*logs, checkpoints=checkpoints)
 
     if history.unparsed_lines:
         print(history.unparsed_lines[0], file=err)
         return 1
     if history.records:
         write_records_as_csv(history.records, out=out)
-        db = Sqlite3Database(settings.database, Record.FIELD_LABELS.keys())
+        db.column_names = list(Record.FIELD_LABELS.keys())
+        db._repair_records_schema()
         db.upsert(history.records)
+    db.save_checkpoints(checkpoints)
     return 0
 
 
@@ -511,7 +668,17 @@ def determine_date_filter(date: datetime.date) -> str:
     return date.strftime("%d/%b/%Y")
 
 
+def date_from_date_filter(date_filter: str) -> datetime.date:
+    return datetime.datetime.strptime(date_filter, "%d/%b/%Y").date()
+
+
 def get_date_for_expression(date_expression: str) -> datetime.date:
+    try:
+        return evaluate_date_expression(date_expression)
+    except ValueError:
+        if not (shutil.which("gdate") or shutil.which("date")):
+            raise
+        logging.debug("falling back to GNU date for %r", date_expression)
     gdate = find_gnu_date()
     dd_mm_yyyy = (
         subprocess.Popen(
@@ -531,15 +698,27 @@ def get_date_for_expression(date_expression: str) -> datetime.date:
 
 
 def determine_log_filenames(access_log: str, today: datetime.date) -> Tuple[str, str]:
-    yesterday = today - datetime.timedelta(days=1)
-    logs = [
-        "{0}.{1}".format(access_log, _.strftime("%Y_%b")) for _ in (yesterday, today)
-    ]
-    if logs[0] == logs[1]:
-        del logs[1]
+    return determine_log_filenames_for_range(access_log, today, today)
+
+
+def determine_log_filenames_for_range(
+    access_log: str, first: datetime.date, last: datetime.date
+) -> Tuple[str, ...]:
+    logs = []
+    for day in dates_between(first - datetime.timedelta(days=1), last):
+        log = "{0}.{1}".format(access_log, day.strftime("%Y_%b"))
+        if log not in logs:
+            logs.append(log)
     return tuple(logs)
 
 
+def dates_between(first: datetime.date, last: datetime.date) -> Iterator[datetime.date]:
+    day = first
+    while day <= last:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
 def lines_from_log_files(*filenames) -> Tuple[str, int, str]:
     for fn in filenames:
         with open(fn) as f:
@@ -547,6 +726,79 @@ def lines_from_log_files(*filenames) -> Tuple[str, int, str]:
                 yield line, i, fn
 
 
+class RawLogLines:
+    """Complete lines of a log file as bytes, with line numbers and offsets
+
+    Starts at the checkpoint when it refers to the same file (same inode, and
+    not longer than the file now is), otherwise at the beginning. A trailing
+    line without a newline is still being written and is left for next time.
+    After iterating, inode, end_offset and end_line_no describe where the
+    complete lines ended.
+    """
+
+    def __init__(
+        self, filename: str, checkpoint: Optional[LogCheckpoint] = None
+    ) -> None:
+        self.filename = filename
+        self.checkpoint = checkpoint
+        self.inode = 0
+        self.end_offset = 0
+        self.end_line_no = 0
+
+    def __iter__(self) -> Iterator[Tuple[bytes, int, int]]:
+        with open(self.filename, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.inode = st.st_ino
+            offset, line_no = 0, 0
+            cp = self.checkpoint
+            if cp and cp.inode == st.st_ino and cp.offset <= st.st_size:
+                offset, line_no = cp.offset, cp.line_no
+                f.seek(offset)
+            elif cp:
+                logging.debug("not resuming from stale checkpoint: %r", cp)
+            self.end_offset, self.end_line_no = offset, line_no
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                yield raw, line_no, offset
+                offset += len(raw)
+                line_no += 1
+                self.end_offset, self.end_line_no = offset, line_no
+
+
+def line_day(raw: bytes) -> bytes:
+    """The dd/Mon/yyyy part of a raw log line's timestamp, without parsing it"""
+    start = raw.find(b"[")
+    if start < 0:
+        return b""
+    return raw[start + 1 : start + 12]
+
+
+class LaterDayDetector:
+    """Tell whether a raw log line is dated after a given day
+
+    Only the dd/Mon/yyyy part of the timestamp is looked at, and each distinct
+    day string is parsed once.
+    """
+
+    def __init__(self, date: datetime.date) -> None:
+        self.date = date
+        self._is_later: Dict[bytes, bool] = {}
+
+    def __call__(self, raw: bytes) -> bool:
+        day = line_day(raw)
+        if not day:
+            return False
+        if day not in self._is_later:
+            try:
+                self._is_later[day] = (
+                    date_from_date_filter(day.decode("ascii")) > self.date
+                )
+            except ValueError:
+                self._is_later[day] = False
+        return self._is_later[day]
+
+
 def pat(name, pattern):
     return "(?P<" + name + ">" + pattern + ")"
 
@@ -580,16 +832,166 @@ COMBINED_LOG_PATTERN = (
 )
 COMBINED_LOG_RE = re.compile(COMBINED_LOG_PATTERN)
 
+FALCON_REPORT_REQUEST_PREFIX = "get /falcon-report.txt?"
+FALCON_REPORT_PATH_NEEDLE = b"/falcon-report.txt?"
+
+
+def parse_timestamp(t: str) -> datetime.datetime:
+    return datetime.datetime.strptime(t, "%d/%b/%Y:%H:%M:%S %z")
+
 
 def parse(line):
     d = {}
     m = COMBINED_LOG_RE.match(line)
     if m:
         d = m.groupdict()
-        d["timestamp"] = datetime.datetime.strptime(d["t"], "%d/%b/%Y:%H:%M:%S %z")
+        d["timestamp"] = parse_timestamp(d["t"])
     return d
 
 
+WEEKDAY_NAMES = [
+    ("monday", "mon"),
+    ("tuesday", "tue", "tues"),
+    ("wednesday", "wed", "wednes"),
+    ("thursday", "thu", "thur", "thurs"),
+    ("friday", "fri"),
+    ("saturday", "sat"),
+    ("sunday", "sun"),
+]
+WEEKDAY_NUMBERS = dict(
+    [(name, number) for number, names in enumerate(WEEKDAY_NAMES) for name in names]
+)
+ORDINAL_WORDS = {"last": -1, "this": 0, "next": 1}
+UNIT_DAYS = {"day": 1, "week": 7, "fortnight": 14}
+UNIT_MONTHS = {"month": 1, "year": 12}
+DATE_EXPRESSION_TOKEN_RE = re.compile(
+    r"\s*(?:"
+    + "|".join(
+        [
+            pat("iso", r"\d{4}-\d{1,2}-\d{1,2}"),
+            pat("dmy", r"\d{1,2}/[a-z]{3}/\d{4}"),
+            pat("word", r"today|now|yesterday|tomorrow"),
+            pat("ago", r"ago\b"),
+            pat("ordinal", "|".join(ORDINAL_WORDS) + r"\b"),
+            pat("number", r"[-+]?\s*\d+"),
+            pat("unit", "(?:" + "|".join([*UNIT_DAYS, *UNIT_MONTHS]) + r")s?\b"),
+            pat(
+                "weekday",
+                "(?:" + "|".join(sorted(WEEKDAY_NUMBERS, key=len, reverse=True)) + r")",
+            )
+            + r"\b,?",
+        ]
+    )
+    + r")"
+)
+
+
+def add_months(date: datetime.date, months: int) -> datetime.date:
+    """Shift by calendar months, letting day overflow spill over like mktime"""
+    year, month = divmod(date.year * 12 + date.month - 1 + months, 12)
+    first = datetime.date(year, month + 1, 1)
+    return first + datetime.timedelta(days=date.day - 1)
+
+
+def evaluate_date_expression(
+    date_expression: str, today: Optional[datetime.date] = None
+) -> datetime.date:
+    """Evaluate the date forms of GNU date -d that the checker is run with
+
+    Covers today/yesterday/tomorrow, ISO (yyyy-mm-dd) and log (dd/Mon/yyyy)
+    dates, weekday names with an optional last/this/next, and relative items
+    such as "3 days ago", "-2 weeks" or "next month". Like GNU date, a
+    weekday moves the date forward to that day, then relative items apply.
+
+    >>> wednesday = datetime.date(2024, 3, 6)
+    >>> evaluate_date_expression("yesterday", wednesday)
+    datetime.date(2024, 3, 5)
+    >>> evaluate_date_expression("last monday", wednesday)
+    datetime.date(2024, 3, 4)
+    >>> evaluate_date_expression("wednesday", wednesday)
+    datetime.date(2024, 3, 6)
+    >>> evaluate_date_expression("next wed", wednesday)
+    datetime.date(2024, 3, 13)
+    >>> evaluate_date_expression("2024-01-31 +1 month")
+    datetime.date(2024, 3, 2)
+    >>> evaluate_date_expression("2 weeks ago", wednesday)
+    datetime.date(2024, 2, 21)
+    >>> evaluate_date_expression("01/Mar/2024 -1 day")
+    datetime.date(2024, 2, 29)
+    """
+    base = today or datetime.date.today()
+    text = date_expression.strip().lower()
+    date_seen = False
+    weekday: Optional[Tuple[int, int]] = None
+    rel_days = 0
+    rel_months = 0
+    last_rel: Optional[Tuple[int, int]] = None
+    pending_count: Optional[int] = None
+    pos = 0
+    while pos < len(text):
+        m = DATE_EXPRESSION_TOKEN_RE.match(text, pos)
+        if not m or m.end() == pos:
+            raise ValueError(
+                "unsupported date expression: {0!r} at {1!r}".format(
+                    date_expression, text[pos:]
+                )
+            )
+        pos = m.end()
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == "number" or kind == "ordinal":
+            if pending_count is not None:
+                raise ValueError("unsupported date expression: " + date_expression)
+            if kind == "number":
+                pending_count = int(value.replace(" ", ""))
+            else:
+                pending_count = ORDINAL_WORDS[value]
+            continue
+        if kind == "iso" or kind == "dmy":
+            if date_seen:
+                raise ValueError("more than one date in: " + date_expression)
+            date_seen = True
+            if kind == "iso":
+                base = datetime.date(*[int(_) for _ in value.split("-")])
+            else:
+                base = date_from_date_filter(value.title())
+        elif kind == "word":
+            rel_days += {"yesterday": -1, "tomorrow": 1}.get(value, 0)
+        elif kind == "weekday":
+            if weekday is not None:
+                raise ValueError("more than one weekday in: " + date_expression)
+            ordinal = 0 if pending_count is None else pending_count
+            weekday = (ordinal, WEEKDAY_NUMBERS[value.rstrip(",")])
+            pending_count = None
+        elif kind == "unit":
+            count = 1 if pending_count is None else pending_count
+            unit = value.rstrip("s") if value != "days" else "day"
+            if unit in UNIT_DAYS:
+                last_rel = (count * UNIT_DAYS[unit], 0)
+            else:
+                last_rel = (0, count * UNIT_MONTHS[unit])
+            rel_days += last_rel[0]
+            rel_months += last_rel[1]
+            pending_count = None
+        elif kind == "ago":
+            if last_rel is None:
+                raise ValueError("nothing to count back in: " + date_expression)
+            rel_days -= 2 * last_rel[0]
+            rel_months -= 2 * last_rel[1]
+        if kind != "unit":
+            last_rel = None
+    if pending_count is not None:
+        raise ValueError("dangling number in: " + date_expression)
+    if weekday is not None and not date_seen:
+        ordinal, number = weekday
+        current = base.weekday()
+        base += datetime.timedelta(
+            days=(number - current + 7) % 7
+            + 7 * (ordinal - (0 < ordinal and current != number))
+        )
+    return add_months(base, rel_months) + datetime.timedelta(days=rel_days)
+
+
 LOOKS_LIKE_A_NUMBER_RE = re.compile(r"^[-+]?[,.0-9]+$")
 
 
@@ -0,0 +1,140 @@
+import datetime
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import check_for_yesterdays_falcon_reports as cfr
+
+
+def log_line(day: str, computer: str, path: str = "/falcon-report.txt") -> str:
+    return (
+        '10.0.0.1 - - [{0}:12:00:00 +0000] "GET {1}?computer={2}&serial=9 HTTP/1.1"'
+        ' 200 2 "-" "Mozilla/5.0 WindowsPowerShell/5.1"\n'.format(day, path, computer)
+    )
+
+
+class TestIncrementalRead(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.log = str(Path(self.tmpdir.name, "access_log.2024_Mar"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def append(self, *lines):
+        with open(self.log, "a") as f:
+            f.writelines(lines)
+
+    def read(self, day, checkpoints):
+        history = cfr.History(day)
+        history.read_records_from_logs(self.log, checkpoints=checkpoints)
+        return [(_["recordid"], _["computer"]) for _ in history.records]
+
+    def test_same_records_as_full_read(self):
+        self.append(
+            log_line("01/Mar/2024", "a.example.org"),
+            log_line("02/Mar/2024", "b"),
+            log_line("02/Mar/2024", "c", "/index.html"),
+            "garbage\n",
+            log_line("02/Mar/2024", "d"),
+            log_line("03/Mar/2024", "e"),
+        )
+        full = cfr.History("02/Mar/2024")
+        full.read_records_from_logs(self.log)
+        self.assertEqual(
+            [(_["recordid"], _["computer"]) for _ in full.records],
+            self.read("02/Mar/2024", {}),
+        )
+        self.assertEqual(
+            [("access_log.2024_Mar:1", "b"), ("access_log.2024_Mar:4", "d")],
+            self.read("02/Mar/2024", {}),
+        )
+
+    def test_resumes_from_checkpoint(self):
+        self.append(log_line("01/Mar/2024", "a"), log_line("02/Mar/2024", "b"))
+        checkpoints = {}
+        self.assertEqual(
+            [("access_log.2024_Mar:0", "a")], self.read("01/Mar/2024", checkpoints)
+        )
+        checkpoint = checkpoints[self.log]
+        self.assertEqual(
+            (1, datetime.date(2024, 3, 1)), (checkpoint.line_no, checkpoint.date)
+        )
+        self.append(log_line("02/Mar/2024", "c"), log_line("03/Mar/2024", "d"))
+        # the first line would match too, if it were read again
+        with open(self.log, "r+") as f:
+            f.write(log_line("02/Mar/2024", "x"))
+        self.assertEqual(
+            [("access_log.2024_Mar:1", "b"), ("access_log.2024_Mar:2", "c")],
+            self.read("02/Mar/2024", checkpoints),
+        )
+        self.assertEqual(3, checkpoint.line_no)
+
+    def test_partial_line_is_left_for_later(self):
+        self.append(log_line("01/Mar/2024", "a"), log_line("01/Mar/2024", "b")[:20])
+        checkpoints = {}
+        self.assertEqual(
+            [("access_log.2024_Mar:0", "a")], self.read("01/Mar/2024", checkpoints)
+        )
+        self.assertEqual(1, checkpoints[self.log].line_no)
+
+    def test_stale_checkpoint_is_ignored(self):
+        self.append(log_line("01/Mar/2024", "a"), log_line("02/Mar/2024", "b"))
+        checkpoints = {
+            self.log: cfr.LogCheckpoint(
+                self.log,
+                os.stat(self.log).st_ino + 1,
+                10**6,
+                99,
+                datetime.date(2024, 3, 1),
+            )
+        }
+        self.assertEqual(
+            [("access_log.2024_Mar:1", "b")], self.read("02/Mar/2024", checkpoints)
+        )
+
+    def test_checkpoints_are_saved(self):
+        db = cfr.Sqlite3Database(":memory:", cfr.Record.FIELD_LABELS.keys())
+        checkpoint = cfr.LogCheckpoint(self.log, 5, 100, 3, datetime.date(2024, 3, 2))
+        db.save_checkpoints({self.log: checkpoint})
+        loaded = db.load_checkpoints([self.log, "other"])[self.log]
+        self.assertEqual(repr(checkpoint), repr(loaded))
+
+
+class TestDateRange(unittest.TestCase):
+    def test_range_is_read_in_one_pass(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log = str(Path(tmpdir, "access_log.2024_Mar"))
+            with open(log, "w") as f:
+                f.writelines(
+                    log_line("{0:02d}/Mar/2024".format(_), str(_)) for _ in range(1, 6)
+                )
+            checkpoints = {}
+            history = cfr.History(["02/Mar/2024", "03/Mar/2024", "04/Mar/2024"])
+            history.read_records_from_logs(log, checkpoints=checkpoints)
+            self.assertEqual(["2", "3", "4"], [_["computer"] for _ in history.records])
+            self.assertEqual(
+                (4, datetime.date(2024, 3, 4)),
+                (checkpoints[log].line_no, checkpoints[log].date),
+            )
+
+    def test_log_filenames_for_range(self):
+        self.assertEqual(
+            ("log.2024_Feb", "log.2024_Mar", "log.2024_Apr"),
+            cfr.determine_log_filenames_for_range(
+                "log", datetime.date(2024, 3, 1), datetime.date(2024, 4, 2)
+            ),
+        )
+        self.assertEqual(
+            ("log.2024_Mar",),
+            cfr.determine_log_filenames("log", datetime.date(2024, 3, 15)),
+        )
+
+    def test_unsupported_expression(self):
+        with self.assertRaises(ValueError):
+            cfr.evaluate_date_expression("the day after the big storm")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,21 +1,25 @@
 from __future__ import annotations
 
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from csv import DictWriter
 from dataclasses import dataclass, field
 from pathlib import Path
 from sys import exit, stdout
-from typing import Any, Generator
+from time import sleep
+from typing import Any, Callable, Generator, TypeVar
 
 from dataset import Database, Table, connect
 from gitlab import Gitlab
 from gitlab.const import AccessLevel
+from gitlab.exceptions import GitlabError
 from gitlab.v4.objects.groups import Group, GroupManager
 from gitlab.v4.objects.members import GroupMember, ProjectMember
 from gitlab.v4.objects.projects import Project, ProjectManager
 from icecream import ic
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError
 from rich import inspect as ri
-from sqlalchemy.exc import IntegrityError
 from sqlalchemy.types import Integer, TypeEngine
 
 __ALL__ = [
@@ -27,6 +31,14 @@ __ALL__ = [
 
 DEFAULT_GITLAB_ID = None
 DEFAULT_GITLAB_CONFIG_FILES = [str(Path("secrets", "gitlab.cfg"))]
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_PER_PAGE = 100
+DEFAULT_FLUSH_ROWS = 1000
+DEFAULT_BACKOFF_ATTEMPTS = 5
+DEFAULT_BACKOFF_SECONDS = 1.0
+RETRYABLE_RESPONSE_CODES = frozenset({429, 500, 502, 503, 504})
+
+T = TypeVar("T")
 
 
 ClubT = Group | Project
@@ -286,10 +298,17 @@ class DbHelper:
 
     list_index_key: str = "_i"
 
+    max_workers: int = DEFAULT_MAX_WORKERS
+    flush_rows: int = DEFAULT_FLUSH_ROWS
+
     debug: defaultdict[str, dict[ItemWithAttributesKeyT, ItemWithAttributesT]] = field(
         default_factory=lambda: defaultdict(dict)
     )
 
+    pending_rows: defaultdict[str, list[dict[str, Any]]] = field(
+        default_factory=lambda: defaultdict(list)
+    )
+
     def has_member_data(
         self,
         member_key: MemberKeyT,
@@ -313,13 +332,48 @@ class DbHelper:
         self.members[member_key] = member_data
 
     def import_groups(self, manager: GroupManager, /) -> DbHelper:
-        for group in self._iterate_clubs(manager):
-            self.import_group(group)
+        try:
+            for group, members in self._iterate_clubs_with_members(manager):
+                self.import_group(group, members)
+        finally:
+            self.flush()
         return self
 
     def import_projects(self, manager: ProjectManager, /) -> DbHelper:
-        for project in self._iterate_clubs(manager):
-            self.import_project(project)
+        try:
+            for project, members in self._iterate_clubs_with_members(manager):
+                self.import_project(project, members)
+        finally:
+            self.flush()
+        return self
+
+    def _buffer_row(self, table_name: str, row: dict[str, Any], /) -> None:
+        self.pending_rows[table_name].append(row)
+        if sum(len(_) for _ in self.pending_rows.values()) >= self.flush_rows:
+            self.flush()
+
+    def flush(self) -> DbHelper:
+        """Write all buffered rows, one bulk insert per table, in one transaction"""
+        if not any(self.pending_rows.values()):
+            return self
+        # Add any new columns up front, so the schema is not changed
+        # inside the transaction.
+        for table_name, rows in self.pending_rows.items():
+            table: Table = self.db[table_name]
+            for row in rows:
+                for k, v in row.items():
+                    if not table.has_column(k):
+                        table.create_column_by_example(k, v)
+        self.db.begin()
+        try:
+            for table_name, rows in self.pending_rows.items():
+                if rows:
+                    self.db[table_name].insert_many(rows)
+            self.db.commit()
+        except BaseException:
+            self.db.rollback()
+            raise
+        self.pending_rows.clear()
         return self
 
     def get_property_table(
@@ -359,20 +413,65 @@ class DbHelper:
     ) -> Generator[ClubT, None, None]:
         for club in manager.list(
             iterator=True,
+            per_page=DEFAULT_PER_PAGE,
             min_access_level=int(min_access_level),
         ):
             yield club
 
-    def import_group(self, group: Group, /) -> DbHelper:
+    def _iterate_clubs_with_members(
+        self,
+        manager: ClubManagerT,
+        /,
+        *,
+        want: Callable[[ClubT], bool] | None = None,
+    ) -> Generator[tuple[ClubT, list[MemberT]], None, None]:
+        """Pair each club with its direct members, fetched by a thread pool
+
+        Member lists for up to 2 * max_workers clubs are in flight at once.
+        Clubs come back in listing order, and all database writes stay on the
+        calling thread. Clubs for which want returns false are skipped.
+        """
+        readahead = 2 * self.max_workers
+        pending: deque[tuple[ClubT, Future[list[MemberT]]]] = deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                for club in self._iterate_clubs(manager):
+                    if want is not None and not want(club):
+                        continue
+                    future = executor.submit(self._list_direct_members_of_club, club)
+                    pending.append((club, future))
+                    if len(pending) >= readahead:
+                        club, future = pending.popleft()
+                        yield club, future.result()
+                while pending:
+                    club, future = pending.popleft()
+                    yield club, future.result()
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    def import_group(
+        self,
+        group: Group,
+        members: list[GroupMember] | None = None,
+        /,
+    ) -> DbHelper:
         return self._import_club(
             club=group,
             club_spec=self.group_table_spec,
+            members=members,
         )
 
-    def import_project(self, project: Project, /) -> DbHelper:
+    def import_project(
+        self,
+        project: Project,
+        members: list[ProjectMember] | None = None,
+        /,
+    ) -> DbHelper:
         return self._import_club(
             club=project,
             club_spec=self.project_table_spec,
+            members=members,
         )
 
     def _import_club(
@@ -380,12 +479,15 @@ class DbHelper:
         *,
         club: ClubT,
         club_spec: TableSpecification,
+        members: list[MemberT] | None = None,
     ) -> DbHelper:
         self._import_item_with_attributes(
             item=club,
             spec=club_spec,
         )
-        for member in self._iterate_direct_members_of_club(club):
+        if members is None:
+            members = self._iterate_direct_members_of_club(club)
+        for member in members:
             self._import_direct_member_of_club(
                 member=member,
                 club=club,
@@ -399,7 +501,7 @@ class DbHelper:
         /,
     ) -> MemberKeyT:
         k: MemberKeyT = self._item_with_attributes_key(
-            member.attributes,
+            member,
             self.member_table_spec,
         )
         return k
@@ -418,9 +520,18 @@ class DbHelper:
         club: ClubT,
         /,
     ) -> Generator[MemberT, None, None]:
-        for member in club.members.list(iterator=True):
+        for member in club.members.list(iterator=True, per_page=DEFAULT_PER_PAGE):
             yield member
 
+    def _list_direct_members_of_club(
+        self,
+        club: ClubT,
+        /,
+    ) -> list[MemberT]:
+        return with_backoff(
+            lambda: club.members.list(get_all=True, per_page=DEFAULT_PER_PAGE)
+        )
+
     def _import_direct_member_of_club(
         self,
         member: MemberT,
@@ -428,14 +539,12 @@ class DbHelper:
         club_spec: TableSpecification,
     ) -> DbHelper:
         prep = self._import_member(member)
-        table: Table = self.db[
-            "__".join(
-                [
-                    club_spec.name,
-                    self.member_table_spec.name,
-                ]
-            )
-        ]
+        table_name = "__".join(
+            [
+                club_spec.name,
+                self.member_table_spec.name,
+            ]
+        )
         club_key = club.attributes[club_spec.key_name]
         row = {
             club_spec.name_when_used_as_foreign_key: club_key,
@@ -444,13 +553,7 @@ class DbHelper:
         for k, v in prep.extra.items():
             if k not in self.club_member_spec.attrs_ignore:
                 row[k] = v
-        table.insert(
-            row,
-            [
-                club_spec.name_when_used_as_foreign_key,
-                self.member_table_spec.name_when_used_as_foreign_key,
-            ],
-        )
+        self._buffer_row(table_name, row)
         return self
 
     def _import_member(
@@ -489,41 +592,42 @@ class DbHelper:
         item: ItemWithAttributesT,
         spec: TableSpecification,
     ) -> PreparedItemWithAttributes:
-        table: Table = self.db[spec.name]
         prep = PreparedItemWithAttributes.prepare_from_item_and_spec(
             item=item,
             spec=spec,
         )
         row = {spec.key_name: prep.key} | prep.attributes
-        try:
-            new_key = table.insert(row)
-            self.debug[spec.name][new_key] = item
-            assert (
-                prep.key == new_key
-            ), f"Unexpected key mismatch for table {spec.name!r}: {prep.key!r} != {new_key!r}"
-        except IntegrityError as ie:
+        # Rows are only written on flush, so duplicates are caught here
+        # instead of by the primary key constraint.
+        if prep.key in self.debug[spec.name]:
             existing = self.debug[spec.name][prep.key]
-            raise KeyboardInterrupt(existing, item) from ie
+            raise KeyboardInterrupt(existing, item)
+        self.debug[spec.name][prep.key] = item
+        self._buffer_row(spec.name, row)
         property_fk_name = spec.name_when_used_as_foreign_key
         actual_properties: ItemWithAttributesDataT = {}
         for k, v in prep.normalize_attributes.items():
-            property_table = self.get_property_table(spec, k)
             skip_actual = False
             match k, v:
                 case _, None:
                     # avoid(?) normalized nulls
                     skip_actual = True
                 case _, str() | bool() | int():
+                    property_table = self.get_property_table(spec, k)
                     property_row = {property_fk_name: prep.key, k: v}
-                    property_table.upsert(property_row, [property_fk_name])
+                    self._buffer_row(property_table.name, property_row)
                 case _, list():
-                    property_rows = [
-                        {property_fk_name: prep.key, self.list_index_key: i, k: v}
-                        for i, x in enumerate(v)
-                    ]
-                    property_table.upsert_many(
-                        property_rows, [property_fk_name, self.list_index_key]
+                    # one row per element, so the entity key alone is not unique
+                    property_table = self.get_property_table(
+                        spec, k, entity_fk_is_primary_key=False
                     )
+                    for i, x in enumerate(v):
+                        property_row = {
+                            property_fk_name: prep.key,
+                            self.list_index_key: i,
+                            k: x,
+                        }
+                        self._buffer_row(property_table.name, property_row)
                 case _, dict():
                     ic("dict", spec.name, prep.key, k, v)
                     exit()
@@ -541,6 +645,44 @@ class DbHelper:
         return result
 
 
+def with_backoff(
+    fn: Callable[[], T],
+    /,
+    *,
+    attempts: int = DEFAULT_BACKOFF_ATTEMPTS,
+    delay: float = DEFAULT_BACKOFF_SECONDS,
+) -> T:
+    """Call fn, retrying with exponential backoff on throttling or server errors
+
+    python-gitlab already honors Retry-After on 429s; this covers what is left
+    once its own retries run out, plus dropped connections.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except GitlabError as e:
+            # List and get failures arrive as GitlabListError, GitlabGetError,
+            # etc., not the GitlabHttpError they wrap.
+            if e.response_code not in RETRYABLE_RESPONSE_CODES:
+                raise
+            if attempt + 1 == attempts:
+                raise
+        except RequestsConnectionError:
+            if attempt + 1 == attempts:
+                raise
+        sleep(delay * 2**attempt)
+    raise AssertionError("unreachable")
+
+
+def configure_session(gl: Gitlab, /, *, pool_size: int = DEFAULT_MAX_WORKERS) -> Gitlab:
+    """Size the connection pool for concurrent requests and retry transient errors"""
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    gl.session.mount("https://", adapter)
+    gl.session.mount("http://", adapter)
+    gl.retry_transient_errors = True
+    return gl
+
+
 def get_default_gitlab(
     *,
     gitlab_id: str | None = DEFAULT_GITLAB_ID,
@@ -551,9 +693,16 @@ def get_default_gitlab(
     return gl
 
 
-def import_gitlab(gl: Gitlab, /, db_connect_url="sqlite:///:memory:") -> Database:
+def import_gitlab(
+    gl: Gitlab,
+    /,
+    db_connect_url="sqlite:///:memory:",
+    *,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> Database:
+    configure_session(gl, pool_size=max_workers)
     db = connect(db_connect_url)
-    helper = DbHelper(db=db)
+    helper = DbHelper(db=db, max_workers=max_workers)
     try:
         helper.import_groups(gl.groups)
         helper.import_projects(gl.projects)
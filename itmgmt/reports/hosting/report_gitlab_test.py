@@ -0,0 +1,130 @@
+import http.server
+import json
+import threading
+import unittest
+from urllib.parse import urlparse
+
+from gitlab import Gitlab
+
+import report_gitlab
+
+GROUPS = [
+    {"id": 1, "name": "alpha", "path": "alpha", "full_path": "alpha"},
+    {"id": 2, "name": "beta", "path": "beta", "full_path": "beta"},
+]
+PROJECTS = [
+    {
+        "id": 10 + i,
+        "name": f"p{i}",
+        "path": f"p{i}",
+        "last_activity_at": "2024",
+        "topics": ["x", f"t{i}"],
+    }
+    for i in range(5)
+]
+USERS = {
+    101: {"id": 101, "username": "ann", "name": "Ann", "state": "active"},
+    102: {"id": 102, "username": "bob", "name": "Bob", "state": "active"},
+}
+MEMBERS = {
+    "groups/1": [101],
+    "groups/2": [101, 102],
+    **{f"projects/{10 + i}": [101 + i % 2] for i in range(5)},
+}
+
+
+class FakeGitlabHandler(http.server.BaseHTTPRequestHandler):
+    """Just enough of the GitLab v4 API for importing clubs and members"""
+
+    requests_seen: list[str] = []
+    throttle_once: set[str] = set()
+    unavailable_once: set[str] = set()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, value, status=200, headers={}):
+        body = json.dumps(value).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path.removeprefix("/api/v4/")
+        self.requests_seen.append(path)
+        if path in self.throttle_once:
+            self.throttle_once.discard(path)
+            self._send_json({"message": "slow down"}, 429, {"Retry-After": "0"})
+        elif path in self.unavailable_once:
+            self.unavailable_once.discard(path)
+            self._send_json({"message": "try again"}, 503)
+        elif path == "groups":
+            self._send_json(GROUPS)
+        elif path == "projects":
+            self._send_json(PROJECTS)
+        elif path.endswith("/members"):
+            club = path.removesuffix("/members")
+            members = [
+                USERS[_] | {"access_level": 30, "created_at": "2024"}
+                for _ in MEMBERS.get(club, [])
+            ]
+            self._send_json(members)
+        else:
+            self._send_json({"message": "404 Not Found"}, 404)
+
+
+class TestConcurrentImport(unittest.TestCase):
+    def setUp(self):
+        FakeGitlabHandler.requests_seen = []
+        FakeGitlabHandler.throttle_once = {"groups/2/members"}
+        FakeGitlabHandler.unavailable_once = set()
+        self.server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), FakeGitlabHandler
+        )
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.gl = Gitlab(f"http://127.0.0.1:{self.server.server_port}")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_import_gitlab(self):
+        db = report_gitlab.import_gitlab(self.gl, max_workers=4)
+        self.assertEqual(2, db["group"].count())
+        self.assertEqual(5, db["project"].count())
+        self.assertEqual(2, db["member"].count())
+        self.assertEqual(3, db["group__member"].count())
+        self.assertEqual(5, db["project__member"].count())
+        self.assertEqual(
+            {101, 102},
+            {_["member_id"] for _ in db["group__member"].find(group_id=2)},
+        )
+        self.assertEqual(
+            ["x", "t3"],
+            [
+                _["topics"]
+                for _ in db["project__topics"].find(project_id=13, order_by="_i")
+            ],
+        )
+
+    def test_throttled_member_list_is_retried(self):
+        report_gitlab.import_gitlab(self.gl, max_workers=2)
+        self.assertEqual(2, FakeGitlabHandler.requests_seen.count("groups/2/members"))
+
+    def test_failed_member_list_is_retried_by_with_backoff(self):
+        FakeGitlabHandler.unavailable_once = {"groups/1/members"}
+        self.gl.retry_transient_errors = False
+        members = report_gitlab.with_backoff(
+            lambda: self.gl.groups.get(1, lazy=True).members.list(get_all=True),
+            delay=0,
+        )
+        self.assertEqual([101], [_.id for _ in members])
+        self.assertEqual(2, FakeGitlabHandler.requests_seen.count("groups/1/members"))
+
+
+if __name__ == "__main__":
+    unittest.main()
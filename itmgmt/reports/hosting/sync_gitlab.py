@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+from csv import DictWriter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from sys import argv, exit, stdout
+from typing import Any
+
+from dataset import Database, Table, connect
+from gitlab import Gitlab
+from gitlab.v4.objects.groups import GroupManager
+from gitlab.v4.objects.projects import ProjectManager
+
+from report_gitlab import (
+    DEFAULT_MAX_WORKERS,
+    ClubManagerT,
+    ClubT,
+    DbHelper,
+    ItemWithAttributesDataT,
+    ItemWithAttributesKeyT,
+    ItemWithAttributesT,
+    MemberT,
+    PreparedItemWithAttributes,
+    TableSpecification,
+    configure_session,
+    get_default_gitlab,
+)
+
+__ALL__ = [
+    "main",
+    "report_membership_changes",
+    "sync_gitlab",
+]
+
+
+DEFAULT_SNAPSHOT_URL = "sqlite:///gitlab.sqlite"
+ACTIVITY_ATTRIBUTES = ("last_activity_at", "updated_at")
+SYNC_TABLE_NAME = "sync_activity"
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+
+def club_activity(club: ClubT, /) -> str | None:
+    for name in ACTIVITY_ATTRIBUTES:
+        value = club.attributes.get(name)
+        if value:
+            return value
+    return None
+
+
+@dataclass(kw_only=True, frozen=True)
+class SnapshotHelper(DbHelper):
+    """DbHelper that refreshes an existing snapshot in place
+
+    Only clubs whose activity timestamp moved since the previous sync have
+    their rows and direct members re-fetched. Clubs without a timestamp are
+    always refreshed. Membership differences are appended to a history table
+    per club type, and clubs that no longer show up are dropped.
+    """
+
+    synced_at: str = field(
+        default_factory=lambda: datetime.now(timezone.utc).isoformat()
+    )
+    replaced: set[tuple[str, ItemWithAttributesKeyT]] = field(default_factory=set)
+    refreshed: dict[str, int] = field(default_factory=dict)
+
+    def import_groups(self, manager: GroupManager, /) -> SnapshotHelper:
+        return self._sync_clubs(manager, self.group_table_spec)
+
+    def import_projects(self, manager: ProjectManager, /) -> SnapshotHelper:
+        return self._sync_clubs(manager, self.project_table_spec)
+
+    def _sync_clubs(
+        self,
+        manager: ClubManagerT,
+        club_spec: TableSpecification,
+        /,
+    ) -> SnapshotHelper:
+        sync_table = self.db.get_table(SYNC_TABLE_NAME)
+        previous: dict[ItemWithAttributesKeyT, str | None] = {}
+        if sync_table.exists:
+            previous = {
+                _["club_id"]: _["activity_at"]
+                for _ in sync_table.find(club_table=club_spec.name)
+            }
+        seen: dict[ItemWithAttributesKeyT, str | None] = {}
+
+        def has_changed(club: ClubT) -> bool:
+            key = club.attributes[club_spec.key_name]
+            activity = seen[key] = club_activity(club)
+            if activity is None or key not in previous:
+                return True
+            return previous[key] != activity
+
+        self.refreshed[club_spec.name] = 0
+        try:
+            for club, members in self._iterate_clubs_with_members(
+                manager, want=has_changed
+            ):
+                self._refresh_club(club, club_spec, members)
+                self.refreshed[club_spec.name] += 1
+            for key in previous.keys() - seen.keys():
+                self._drop_club(key, club_spec)
+        finally:
+            self.flush()
+        # Recorded last, so an interrupted sync is simply refreshed next time.
+        if sync_table.exists:
+            sync_table.delete(club_table=club_spec.name)
+        for key, activity in seen.items():
+            row = dict(
+                club_table=club_spec.name,
+                club_id=key,
+                activity_at=activity,
+                synced_at=self.synced_at,
+            )
+            self._buffer_row(SYNC_TABLE_NAME, row)
+        self.flush()
+        return self
+
+    def _club_member_table_name(self, club_spec: TableSpecification, /) -> str:
+        return "__".join([club_spec.name, self.member_table_spec.name])
+
+    def _history_table_name(self, club_spec: TableSpecification, /) -> str:
+        return "__".join([self._club_member_table_name(club_spec), "history"])
+
+    def _current_members(
+        self,
+        club_key: ItemWithAttributesKeyT,
+        club_spec: TableSpecification,
+        /,
+    ) -> dict[ItemWithAttributesKeyT, dict[str, Any]]:
+        table_name = self._club_member_table_name(club_spec)
+        if table_name not in self.db:
+            return {}
+        table: Table = self.db[table_name]
+        member_fk_name = self.member_table_spec.name_when_used_as_foreign_key
+        return {
+            _[member_fk_name]: _
+            for _ in table.find(**{club_spec.name_when_used_as_foreign_key: club_key})
+        }
+
+    def _refresh_club(
+        self,
+        club: ClubT,
+        club_spec: TableSpecification,
+        members: list[MemberT],
+        /,
+    ) -> None:
+        club_key = club.attributes[club_spec.key_name]
+        before = self._current_members(club_key, club_spec)
+        self._delete_club_members(club_key, club_spec)
+        self._import_club(club=club, club_spec=club_spec, members=members)
+        after: dict[ItemWithAttributesKeyT, ItemWithAttributesDataT] = {}
+        for member in members:
+            after[self._member_key(member)] = member.attributes
+        for member_key in before.keys() | after.keys():
+            old, new = before.get(member_key), after.get(member_key)
+            if old is None:
+                change = ADDED
+            elif new is None:
+                change = REMOVED
+            elif old.get("access_level") != new.get("access_level"):
+                change = CHANGED
+            else:
+                continue
+            self._record_change(club_key, club_spec, member_key, change, new or old)
+
+    def _drop_club(
+        self,
+        club_key: ItemWithAttributesKeyT,
+        club_spec: TableSpecification,
+        /,
+    ) -> None:
+        for member_key, old in self._current_members(club_key, club_spec).items():
+            self._record_change(club_key, club_spec, member_key, REMOVED, old)
+        self._delete_club_members(club_key, club_spec)
+        self._delete_item_with_attributes(club_key, club_spec)
+
+    def _record_change(
+        self,
+        club_key: ItemWithAttributesKeyT,
+        club_spec: TableSpecification,
+        member_key: ItemWithAttributesKeyT,
+        change: str,
+        data: dict[str, Any],
+        /,
+    ) -> None:
+        row = {
+            club_spec.name_when_used_as_foreign_key: club_key,
+            self.member_table_spec.name_when_used_as_foreign_key: member_key,
+            "change": change,
+            "access_level": data.get("access_level"),
+            "synced_at": self.synced_at,
+        }
+        self._buffer_row(self._history_table_name(club_spec), row)
+
+    def _delete_club_members(
+        self,
+        club_key: ItemWithAttributesKeyT,
+        club_spec: TableSpecification,
+        /,
+    ) -> None:
+        table_name = self._club_member_table_name(club_spec)
+        if table_name in self.db:
+            self.db[table_name].delete(
+                **{club_spec.name_when_used_as_foreign_key: club_key}
+            )
+
+    def _property_table_names(self, spec: TableSpecification, /) -> list[str]:
+        prefix = spec.name + "__"
+        not_properties = {
+            self._club_member_table_name(spec),
+            self._history_table_name(spec),
+        }
+        return [
+            _
+            for _ in self.db.tables
+            if _.startswith(prefix) and _ not in not_properties
+        ]
+
+    def _delete_item_with_attributes(
+        self,
+        key: ItemWithAttributesKeyT,
+        spec: TableSpecification,
+        /,
+    ) -> None:
+        if spec.name in self.db:
+            self.db[spec.name].delete(**{spec.key_name: key})
+        for table_name in self._property_table_names(spec):
+            self.db[table_name].delete(**{spec.name_when_used_as_foreign_key: key})
+
+    def _import_item_with_attributes(
+        self,
+        *,
+        item: ItemWithAttributesT,
+        spec: TableSpecification,
+    ) -> PreparedItemWithAttributes:
+        key = item.attributes[spec.key_name]
+        if (spec.name, key) not in self.replaced:
+            self.replaced.add((spec.name, key))
+            self._delete_item_with_attributes(key, spec)
+        return super()._import_item_with_attributes(item=item, spec=spec)
+
+
+def sync_gitlab(
+    gl: Gitlab,
+    /,
+    db_connect_url: str = DEFAULT_SNAPSHOT_URL,
+    *,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> SnapshotHelper:
+    configure_session(gl, pool_size=max_workers)
+    db = connect(db_connect_url)
+    helper = SnapshotHelper(db=db, max_workers=max_workers)
+    helper.import_groups(gl.groups)
+    helper.import_projects(gl.projects)
+    return helper
+
+
+def report_membership_changes(db: Database, /, synced_at: str) -> None:
+    for table_name in db.tables:
+        if not table_name.endswith("__member__history"):
+            continue
+        t: Table = db[table_name]
+        rows = list(t.find(synced_at=synced_at))
+        print("==", table_name, "==", len(rows))
+        if rows:
+            w = DictWriter(stdout, t.columns)
+            w.writeheader()
+            for r in rows:
+                w.writerow(r)
+        print()
+
+
+def main(args: list[str] = argv) -> None:
+    if len(args) > 2:
+        exit(f"usage: {args[0]} [SNAPSHOT_DB_URL]")
+    db_connect_url = args[1] if len(args) > 1 else DEFAULT_SNAPSHOT_URL
+    gl = get_default_gitlab()
+    helper = sync_gitlab(gl, db_connect_url)
+    print("refreshed:", helper.refreshed)
+    report_membership_changes(helper.db, helper.synced_at)
+
+
+if __name__ == "__main__":
+    main()
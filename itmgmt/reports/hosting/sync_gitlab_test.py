@@ -0,0 +1,84 @@
+import http.server
+import tempfile
+import threading
+import unittest
+import unittest.mock
+from pathlib import Path
+
+from dataset import connect
+from gitlab import Gitlab
+
+import report_gitlab_test
+import sync_gitlab
+from report_gitlab_test import FakeGitlabHandler
+
+
+class TestSnapshotSync(unittest.TestCase):
+    def setUp(self):
+        FakeGitlabHandler.requests_seen = []
+        FakeGitlabHandler.throttle_once = set()
+        self.projects = [dict(_) for _ in report_gitlab_test.PROJECTS]
+        self.members = dict(report_gitlab_test.MEMBERS)
+        self.patches = [
+            unittest.mock.patch.object(report_gitlab_test, "PROJECTS", self.projects),
+            unittest.mock.patch.object(report_gitlab_test, "MEMBERS", self.members),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), FakeGitlabHandler
+        )
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.gl = Gitlab(f"http://127.0.0.1:{self.server.server_port}")
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{Path(self.tmpdir.name, 'gitlab.sqlite')}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for patch in self.patches:
+            patch.stop()
+        self.tmpdir.cleanup()
+
+    def member_requests(self):
+        return [_ for _ in FakeGitlabHandler.requests_seen if _.endswith("/members")]
+
+    def test_only_changed_projects_are_refetched(self):
+        first = sync_gitlab.sync_gitlab(self.gl, self.url, max_workers=2)
+        self.assertEqual({"group": 2, "project": 5}, first.refreshed)
+        FakeGitlabHandler.requests_seen = []
+        self.projects[1]["last_activity_at"] = "2025"
+        self.members["projects/11"] = [101, 102]
+        second = sync_gitlab.sync_gitlab(self.gl, self.url, max_workers=2)
+        # groups carry no activity timestamp, so they are always refreshed
+        self.assertEqual({"group": 2, "project": 1}, second.refreshed)
+        self.assertEqual(
+            ["groups/1/members", "groups/2/members", "projects/11/members"],
+            sorted(self.member_requests()),
+        )
+        db = connect(self.url)
+        self.assertEqual(6, db["project__member"].count())
+        self.assertEqual(5, db["project"].count())
+        changes = list(db["project__member__history"].find(synced_at=second.synced_at))
+        self.assertEqual(
+            [(11, 101, "added")],
+            [(_["project_id"], _["member_id"], _["change"]) for _ in changes],
+        )
+
+    def test_removed_project_is_dropped(self):
+        sync_gitlab.sync_gitlab(self.gl, self.url, max_workers=2)
+        del self.projects[0]
+        second = sync_gitlab.sync_gitlab(self.gl, self.url, max_workers=2)
+        db = connect(self.url)
+        self.assertEqual(4, db["project"].count())
+        self.assertEqual(0, db["project__member"].count(project_id=10))
+        self.assertEqual(0, db["project__topics"].count(project_id=10))
+        changes = list(db["project__member__history"].find(synced_at=second.synced_at))
+        self.assertEqual(
+            [(10, 101, "removed")],
+            [(_["project_id"], _["member_id"], _["change"]) for _ in changes],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
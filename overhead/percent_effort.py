@@ -5,28 +5,35 @@ import math
 import re
 import string
 import sys
+from bisect import insort
 from collections.abc import KeysView, Mapping, MutableMapping
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta
-from functools import total_ordering
+from functools import cache, total_ordering
 from logging import warning
+from pathlib import Path
+from types import MappingProxyType
 from typing import Optional, TextIO, Type
 from urllib.parse import urlparse
 
 from icecream import ic  # type: ignore
 from rich import inspect as rinspect
 from rich import print as rprint
+from rich.console import Console
+from rich.rule import Rule
 from rich.table import Column, Table
 
 
-def _build_abbreviations(fmt: str, incr_days: int) -> set[str]:
+@cache
+def _build_abbreviations(fmt: str, incr_days: int) -> frozenset[str]:
     abbreviations = set()
     delta = timedelta(days=incr_days)
     day = GOOD_MONDAY
     while (abbr := day.strftime(fmt).upper()) not in abbreviations:
         abbreviations.add(abbr)
         day += delta
-    return abbreviations
+    return frozenset(abbreviations)
 
 
 # The first day of 2001 was a Monday, but this is arbitrary.
@@ -53,6 +60,7 @@ class DayParser:
             self._format = __format
         else:
             self._format = f"%Y {__format}"
+        self._parsed_days: dict[str, Optional[date]] = {}
 
     @property
     def format(self):
@@ -63,10 +71,18 @@ class DayParser:
         return self._format_handles_year
 
     def parse_day(self, day: str) -> Optional[date]:
+        # The same day strings recur across lines and period files, and year
+        # guessing costs up to three strptime calls, so remember each answer.
+        try:
+            return self._parsed_days[day]
+        except KeyError:
+            pass
         if self.format_handles_year:
-            return self._parse_day(day)
+            parsed = self._parse_day(day)
         else:
-            return self._parse_day_by_guessing_year(day)
+            parsed = self._parse_day_by_guessing_year(day)
+        self._parsed_days[day] = parsed
+        return parsed
 
     def _parse_day(self, day: str) -> Optional[date]:
         try:
@@ -357,6 +373,14 @@ class DistributionConstraintsByEntryKeyDict(
 
 @dataclass
 class Book:
+    """Timesheet entries and distribution constraints
+
+    Entries are indexed by day-and-key, by key then day, and by day then key,
+    and each key's score is kept up to date as entries come and go. Use
+    add_entry() and remove_entry() rather than changing
+    entries_by_day_and_key directly, so the indexes stay in step.
+    """
+
     spreadsheet_url: Optional[str] = None
     distribution_constraints_by_entry_key: DistributionConstraintsByEntryKeyDict = (
         field(default_factory=DistributionConstraintsByEntryKeyDict)
@@ -365,6 +389,20 @@ class Book:
         default_factory=dict
     )
     summary: Summary = field(default_factory=Summary)
+    entries_by_key_and_day: dict[EntryKey, dict[date, Entry]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    entries_by_day: dict[date, dict[EntryKey, Entry]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _sorted_keys: list[EntryKey] = field(default_factory=list, init=False, repr=False)
+    _scores_by_key: Summary = field(default_factory=Summary, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        entries = self.entries_by_day_and_key
+        self.entries_by_day_and_key = {}
+        for (day, _), entry in entries.items():
+            self.add_entry(day, entry)
 
     def constrain(
         self,
@@ -403,19 +441,40 @@ class Book:
         if t in self.entries_by_day_and_key:
             raise ValueError(f"already saw day-key entry: {t}")
         self.entries_by_day_and_key[t] = entry
+        if entry.key not in self.entries_by_key_and_day:
+            self.entries_by_key_and_day[entry.key] = {}
+            insort(self._sorted_keys, entry.key)
+        self.entries_by_key_and_day[entry.key][day] = entry
+        self.entries_by_day.setdefault(day, {})[entry.key] = entry
+        self._scores_by_key[entry.key] += entry.as_score()
+
+    def remove_entry(self, day: date, key: EntryKey) -> Entry:
+        entry = self.entries_by_day_and_key.pop((day, key))
+        entries_for_key = self.entries_by_key_and_day[key]
+        del entries_for_key[day]
+        del self.entries_by_day[day][key]
+        if not self.entries_by_day[day]:
+            del self.entries_by_day[day]
+        if entries_for_key:
+            # recompute rather than subtract, to avoid drift in float sums
+            score = Score()
+            for remaining in entries_for_key.values():
+                score += remaining.as_score()
+            self._scores_by_key[key] = score
+        else:
+            del self.entries_by_key_and_day[key]
+            del self._scores_by_key[key]
+            self._sorted_keys.remove(key)
+        return entry
 
     def keys(self) -> KeysView[EntryKey]:
-        return dict.fromkeys(
-            sorted([_[1] for _ in self.entries_by_day_and_key.keys()])
-        ).keys()
+        return dict.fromkeys(self._sorted_keys).keys()
 
     def entries_for_key(self, key) -> Mapping[date, Entry]:
-        r = {
-            day_and_key[0]: entry
-            for day_and_key, entry in self.entries_by_day_and_key.items()
-            if day_and_key[1] == key
-        }
-        return r
+        return MappingProxyType(self.entries_by_key_and_day.get(key, {}))
+
+    def entries_for_day(self, day: date) -> Mapping[EntryKey, Entry]:
+        return MappingProxyType(self.entries_by_day.get(day, {}))
 
     def distribute(self) -> bool:
         # TODO while book.distribute(): print book?
@@ -432,27 +491,27 @@ class Book:
                         # TODO distribute current entry to constrained entries?
                         ...
                 for day in days_to_remove:
-                    del self.entries_by_day_and_key[(day, key)]
+                    self.remove_entry(day, key)
                 return True
         return False
 
     def summarize(self) -> Summary:
         self.summary.clear()
-        for key in self.keys():
-            for _, entry in self.entries_for_key(key).items():
-                self.summary[key] += entry.as_score()
+        for key in self._sorted_keys:
+            score = Score()
+            score += self._scores_by_key[key]
+            self.summary[key] = score
         return self.summary
 
     def auxiliary_table(self) -> Table:
-        all_dates = sorted({d for d, _ in self.entries_by_day_and_key.keys()})
-        first_date = all_dates[0]
-        last_date = all_dates[-1]
-        num_days = (last_date - first_date + timedelta(days=1)).days
-        all_dates = [first_date + timedelta(days=i) for i in range(num_days)]
-
-        all_auxillary_keys = sorted(
-            {k for (_, k), e in self.entries_by_day_and_key.items() if e.is_auxiliary()}
-        )
+        all_dates = sorted(self.entries_by_day)
+        if all_dates:
+            first_date = all_dates[0]
+            last_date = all_dates[-1]
+            num_days = (last_date - first_date + timedelta(days=1)).days
+            all_dates = [first_date + timedelta(days=i) for i in range(num_days)]
+
+        all_auxillary_keys = [k for k in self._sorted_keys if k.is_auxiliary()]
 
         stuck_columns = ["Earning Code", "Shift", "Total Hours", "Total Units"]
         headers = stuck_columns + [_.strftime(AUX_TABLE_DATE_FORMAT) for _ in all_dates]
@@ -578,9 +637,51 @@ def load(infile: TextIO, book: Book) -> None:
             warning("unrecognized line: %r", line)
 
 
-def run(stdin, /) -> None:
-    book = Book()
-    load(stdin, book)
+@dataclass
+class EffortRow:
+    reported_hours: EffortHours
+    effortable_hours: EffortHours
+    to_be_allocated_hours: EffortHours
+    adjusted_percent_effort: EffortPercent
+    percent_effort: EffortPercent
+    key: Optional[EntryKey]
+    score: Optional[Score]
+
+    def as_strs(self) -> list[str]:
+        return effort_table_row(
+            self.reported_hours,
+            self.effortable_hours,
+            self.to_be_allocated_hours,
+            self.adjusted_percent_effort,
+            self.percent_effort,
+            str(self.key) if self.key else "",
+            self.score or "",
+        )
+
+
+@dataclass
+class EffortReport:
+    rows: list[EffortRow]
+    totals: EffortRow
+
+    def table(self) -> Table:
+        efforts = Table(
+            Column("Hrs", justify="right"),
+            Column("PtHrs", justify="right"),
+            Column("TBA", justify="right"),
+            Column("Adj%", justify="right"),
+            Column("%eff", justify="right"),
+            Column("key", justify="left"),
+            Column("score", justify="left"),
+        )
+        for row in self.rows:
+            efforts.add_row(*row.as_strs())
+        efforts.add_section()
+        efforts.add_row(*self.totals.as_strs())
+        return efforts
+
+
+def effort_report(book: Book, /) -> EffortReport:
     constraints_by_key = book.distribution_constraints_by_entry_key
     book_summary = book.summarize()
     book_totals = Book.totals(book_summary)
@@ -599,6 +700,8 @@ def run(stdin, /) -> None:
         hours_per_point = 0
     elif total_points > 0:
         hours_per_point = effortable_hours / total_points
+    else:
+        hours_per_point = 0
     ic(effortable_hours)
     ic(hours_per_point)
 
@@ -606,17 +709,8 @@ def run(stdin, /) -> None:
     total_adjusted_percent_effort = 0
     total_to_be_allocated_hours = EffortHours(0)
 
-    efforts = Table(
-        Column("Hrs", justify="right"),
-        Column("PtHrs", justify="right"),
-        Column("TBA", justify="right"),
-        Column("Adj%", justify="right"),
-        Column("%eff", justify="right"),
-        Column("key", justify="left"),
-        Column("score", justify="left"),
-    )
+    rows = []
     for key, score in book_summary.items():
-        account_name = str(key).upper()
         max_hours = 0
         for constraint in constraints_by_key.get(
             key, DistributionConstraintByAccountNameDict()
@@ -641,35 +735,118 @@ def run(stdin, /) -> None:
             total_adjusted_percent_effort += adjusted_percent_effort
         else:
             adjusted_percent_effort = 0
-        efforts.add_row(
-            *effort_table_row(
+        rows.append(
+            EffortRow(
                 score.hours or score.auxiliary_hours,
                 hours_equivalent,
                 to_be_allocated_hours,
                 adjusted_percent_effort,
                 percent_effort,
-                str(key),
+                key,
                 score,
             )
         )
-    efforts.add_section()
-    efforts.add_row(
-        *effort_table_row(
-            total_hours,
-            effortable_hours,
-            total_to_be_allocated_hours,
-            total_adjusted_percent_effort,
-            total_percent_effort,
-            "",
-            "",
-        )
+    totals = EffortRow(
+        total_hours,
+        effortable_hours,
+        total_to_be_allocated_hours,
+        total_adjusted_percent_effort,
+        total_percent_effort,
+        None,
+        None,
     )
-    rprint(efforts)
+    return EffortReport(rows, totals)
+
+
+def run(stdin, /) -> None:
+    book = Book()
+    load(stdin, book)
+    rprint(effort_report(book).table())
     rprint(book.auxiliary_table())
 
 
+def load_period_file(path: Path, /) -> Book:
+    book = Book()
+    with path.open() as f:
+        load(f, book)
+    return book
+
+
+def rollup_table(reports: dict[str, EffortReport], /) -> Table:
+    """Percent effort per key across periods, with hours summed per key"""
+    period_names = list(reports)
+    percents: dict[EntryKey, dict[str, EffortPercent]] = {}
+    hours: dict[EntryKey, EffortHours] = {}
+    for period_name, report in reports.items():
+        for row in report.rows:
+            percents.setdefault(row.key, {})[period_name] = row.percent_effort
+            hours[row.key] = (
+                hours.get(row.key, 0) + row.reported_hours + row.effortable_hours
+            )
+    t = Table(
+        Column("key", justify="left"),
+        *[Column(_, justify="right") for _ in period_names],
+        Column("Hrs", justify="right"),
+    )
+    for key in sorted(percents):
+        t.add_row(
+            str(key),
+            *[
+                f"{percents[key][_]:7.1%}" if percents[key].get(_) else "---"
+                for _ in period_names
+            ],
+            f"{hours[key]:5.1f}" if hours[key] else "---",
+        )
+    return t
+
+
+def run_batch(
+    period_dir: Path,
+    out_dir: Optional[Path] = None,
+    /,
+    *,
+    pattern: str = "*.txt",
+    max_workers: Optional[int] = None,
+) -> None:
+    """Report every period file in a directory, then roll them up
+
+    Period files are parsed in parallel. With out_dir, each period's tables
+    go to <out_dir>/<period>.txt and the rollup to <out_dir>/rollup.txt;
+    otherwise everything is printed.
+    """
+    paths = sorted(period_dir.glob(pattern))
+    if out_dir:
+        out_dir.mkdir(parents=True, exist_ok=True)
+    reports: dict[str, EffortReport] = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for path, book in zip(paths, pool.map(load_period_file, paths)):
+            report = effort_report(book)
+            reports[path.stem] = report
+            renderables = [report.table(), book.auxiliary_table()]
+            if out_dir:
+                write_renderables(out_dir / f"{path.stem}.txt", renderables)
+            else:
+                rprint(Rule(path.stem))
+                for renderable in renderables:
+                    rprint(renderable)
+    rollup = rollup_table(reports)
+    if out_dir:
+        write_renderables(out_dir / "rollup.txt", [rollup])
+    rprint(rollup)
+
+
+def write_renderables(path: Path, renderables: list, /) -> None:
+    with path.open("w", encoding="utf-8") as f:
+        console = Console(file=f, width=200)
+        for renderable in renderables:
+            console.print(renderable)
+
+
 def main() -> None:
-    run(sys.stdin)
+    if sys.argv[1:]:
+        run_batch(*map(Path, sys.argv[1:3]))
+    else:
+        run(sys.stdin)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,47 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import percent_effort as pe
+
+PERIOD = """\
+Mon Apr 4 - proj-a 3 - z-holiday 8 hrs
+Tue Apr 5 - proj-b 2
+"""
+
+
+class TestRunBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.period_dir = Path(self.tmpdir.name) / "periods"
+        self.out_dir = Path(self.tmpdir.name) / "out"
+        self.period_dir.mkdir()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_empty_period_files_do_not_stop_the_batch(self):
+        (self.period_dir / "1-full.txt").write_text(PERIOD)
+        (self.period_dir / "2-empty.txt").write_text("")
+        (self.period_dir / "3-blank.txt").write_text("\n\n")
+        pe.run_batch(self.period_dir, self.out_dir, max_workers=1)
+        self.assertEqual(
+            ["1-full.txt", "2-empty.txt", "3-blank.txt", "rollup.txt"],
+            sorted(_.name for _ in self.out_dir.iterdir()),
+        )
+        self.assertIn("proj-a", (self.out_dir / "rollup.txt").read_text())
+        self.assertIn("Earning Code", (self.out_dir / "2-empty.txt").read_text())
+
+
+class TestAuxiliaryTable(unittest.TestCase):
+    def test_empty_book_has_only_the_fixed_columns(self):
+        t = pe.Book().auxiliary_table()
+        self.assertEqual(
+            ["Earning Code", "Shift", "Total Hours", "Total Units"],
+            [_.header for _ in t.columns],
+        )
+        self.assertEqual(0, t.row_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,10 @@ import ast as _ast
 import collections as _collections
 import dataclasses as _dataclasses
 import io as _io
+import keyword as _keyword
+import re as _re
 import sys as _sys
+import types as _types
 import typing as _typing
 import xml.etree.ElementTree as _ET
 
@@ -111,15 +114,132 @@ def get_xmlns_uri_from_qualified_tag(tag: str) -> str | None:
     return None
 
 
+@_dataclasses.dataclass(kw_only=True)
+class ChildStats:
+    """How often a child tag shows up in the instances of its parent tag"""
+
+    total: int = 0
+    present: int = 0
+    min_when_present: int | None = None
+    max: int = 0
+
+    def update(self, n: int) -> None:
+        self.total += n
+        self.present += 1
+        if self.min_when_present is None or n < self.min_when_present:
+            self.min_when_present = n
+        if n > self.max:
+            self.max = n
+
+
+@_dataclasses.dataclass(kw_only=True)
+class TagStats:
+    """Running totals over every instance of one tag
+
+    >>> s = TagStats()
+    >>> s.update({"x": "1"}, "  ", _collections.Counter(b=2))
+    >>> s.update({}, "t", _collections.Counter())
+    >>> s.occurrences, dict(s.attributes), s.with_text
+    (2, {'x': 1}, 1)
+    >>> s.min_occurs("b"), s.max_occurs("b")
+    (0, 2)
+    """
+
+    occurrences: int = 0
+    attributes: _collections.Counter = _dataclasses.field(
+        default_factory=_collections.Counter
+    )
+    with_text: int = 0
+    children: dict[str, ChildStats] = _dataclasses.field(default_factory=dict)
+    parents: _collections.Counter = _dataclasses.field(
+        default_factory=_collections.Counter
+    )
+
+    def update(
+        self,
+        attrib: dict[str, str],
+        text: str | None,
+        child_counts: _collections.Counter,
+    ) -> None:
+        self.occurrences += 1
+        self.attributes.update(attrib.keys())
+        if text and not text.isspace():
+            self.with_text += 1
+        for tag, n in child_counts.items():
+            child = self.children.get(tag)
+            if child is None:
+                child = self.children[tag] = ChildStats()
+            child.update(n)
+
+    def min_occurs(self, tag: str) -> int:
+        child = self.children[tag]
+        if child.present < self.occurrences:
+            return 0
+        return child.min_when_present
+
+    def max_occurs(self, tag: str) -> int:
+        return self.children[tag].max
+
+
+def python_name(name: str) -> str:
+    """
+
+    >>> python_name("foo-bar"), python_name("class"), python_name("1x")
+    ('foo_bar', 'class_', '_1x')
+    """
+    name = _re.sub(r"\W", "_", name)
+    if not name or name[0].isdigit():
+        name = "_" + name
+    if _keyword.iskeyword(name):
+        name += "_"
+    return name
+
+
+def unique_name(name: str, taken: set[str]) -> str:
+    """
+
+    >>> taken = {"a"}
+    >>> unique_name("a", taken), unique_name("a", taken), unique_name("b", taken)
+    ('a_2', 'a_3', 'b')
+    """
+    unique = name
+    n = 1
+    while unique in taken:
+        n += 1
+        unique = f"{name}_{n}"
+    taken.add(unique)
+    return unique
+
+
+@_dataclasses.dataclass(kw_only=True, frozen=True)
+class GeneratedField:
+    name: str
+    kind: str  # "attribute", "text", "child" or "children"
+    key: str | None
+    annotation: str
+    default: str
+
+
+TEXT_FIELD_NAME = "text"
+TAG_CLASSVAR_NAME = "TAG"
+# Names the generated module imports, which class bodies must not shadow,
+# and the other names it binds, which classes must not replace.
+GENERATED_IMPORTED_NAMES = frozenset({"dataclasses", "types", "typing", "ET"})
+GENERATED_GLOBAL_NAMES = GENERATED_IMPORTED_NAMES | {"NEW", "ADD", "TEXT", "load"}
+
+
 @_dataclasses.dataclass(kw_only=True, frozen=True)
 class ClassFromElement:
     """
 
     >>> _ast.unparse(ClassFromElement.from_(_mxt("<a/>").getroot()).as_ast())
-    'class a:\\n    ...'
+    "@dataclasses.dataclass(slots=True, kw_only=True)\\nclass a:\\n    TAG: typing.ClassVar[str] = 'a'"
     """
 
     tag: TagNameAndUri
+    stats: TagStats = _dataclasses.field(
+        default_factory=TagStats, compare=False, repr=False
+    )
 
     @classmethod
     def from_(cls, el: _ET.Element) -> ClassFromElement:
@@ -127,19 +247,89 @@ class ClassFromElement:
         cfe = cls(tag=tag)
         return cfe
 
-    def update(self, data):
-        ...
-
-    def as_ast(self) -> _ast.ClassDef:
-        return _ast.ClassDef(
-            name=self.tag.name,
-            bases=[],
-            keywords=[],
-            body=[
-                _ast.Expr(value=_ast.Constant(value=Ellipsis)),
-            ],
-            decorator_list=[],
-        )
+    def update(
+        self,
+        data: _ET.Element,
+        child_counts: _collections.Counter | None = None,
+        parent_tag: str | None = None,
+    ) -> None:
+        if child_counts is None:
+            child_counts = _collections.Counter(c.tag for c in data)
+        self.stats.update(data.attrib, data.text, child_counts)
+        if parent_tag is not None:
+            self.stats.parents[parent_tag] += 1
+
+    def fields(self, names: dict[str, str] | None = None) -> list[GeneratedField]:
+        """Attributes, then text, then children, in the order first seen
+
+        A child that never shows up more than once per parent is a single
+        optional value, otherwise a list.
+
+        >>> b = Builder().load(_mxf("<a x='1'><b/><b/><c>t</c></a>"))
+        >>> [(f.name, f.annotation) for f in b.classmap["a"].fields(b.names())]
+        [('x', 'str | None'), ('b', 'list[b]'), ('c', 'c | None')]
+        """
+        if names is None:
+            names = {}
+        stats = self.stats
+        taken = {TAG_CLASSVAR_NAME, TEXT_FIELD_NAME, *GENERATED_IMPORTED_NAMES}
+        fields = []
+        for key in stats.attributes:
+            name = unique_name(python_name(split_tag(key)[1]), taken)
+            fields.append(
+                GeneratedField(
+                    name=name,
+                    kind="attribute",
+                    key=key,
+                    annotation="str | None",
+                    default="None",
+                )
+            )
+        if stats.with_text:
+            fields.append(
+                GeneratedField(
+                    name=TEXT_FIELD_NAME,
+                    kind="text",
+                    key=None,
+                    annotation="str | None",
+                    default="None",
+                )
+            )
+        for tag, child in stats.children.items():
+            name = unique_name(python_name(split_tag(tag)[1]), taken)
+            class_name = names.get(tag) or python_name(split_tag(tag)[1])
+            if child.max > 1:
+                fields.append(
+                    GeneratedField(
+                        name=name,
+                        kind="children",
+                        key=tag,
+                        annotation=f"list[{class_name}]",
+                        default="dataclasses.field(default_factory=list)",
+                    )
+                )
+            else:
+                fields.append(
+                    GeneratedField(
+                        name=name,
+                        kind="child",
+                        key=tag,
+                        annotation=f"{class_name} | None",
+                        default="None",
+                    )
+                )
+        return fields
+
+    def as_ast(self, names: dict[str, str] | None = None) -> _ast.ClassDef:
+        name = (names or {}).get(self.tag.tag) or python_name(self.tag.name)
+        lines = [
+            "@dataclasses.dataclass(slots=True, kw_only=True)",
+            f"class {name}:",
+            f"    {TAG_CLASSVAR_NAME}: typing.ClassVar[str] = {self.tag.tag!r}",
+        ]
+        for f in self.fields(names):
+            lines.append(f"    {f.name}: {f.annotation} = {f.default}")
+        return _ast.parse("\n".join(lines)).body[0]
 
 
 class Builder:
@@ -149,40 +339,139 @@ class Builder:
     True
     >>> Builder().load(_mxf("<a xmlns='urn:x'/>")).build()[0].tag.uri
     'urn:x'
+    >>> b = Builder().load(_mxf("<a><b x='1'/><b/><c>t</c></a>"))
+    >>> [_.tag.name for _ in b.build()]
+    ['b', 'c', 'a']
+    >>> a = b.classmap["a"].stats
+    >>> a.min_occurs("b"), a.max_occurs("b"), dict(b.classmap["b"].stats.parents)
+    (2, 2, {'a': 2})
+    >>> dict(b.connection_counts()["c"].parents)
+    {'a': 1}
     """
 
     def __init__(self) -> None:
-        self.root: _ET.Element | None = None
+        # Tags of the elements that declared each uri and prefix.
         self.nsmap = _collections.defaultdict(lambda: _collections.defaultdict(list))
         self.classmap: dict[str, ClassFromElement] = {}
-        self.parentmap: dict[_ET.Element, _ET.Element] = {}
 
     def load(self, f: _io.TextIO) -> Builder:
+        """Accumulate statistics in one pass over f
+
+        Parents are tracked on a stack and every element is dropped once it
+        ends, so memory grows with the depth of the document and the number
+        of distinct tags, not with its size.
+        """
         ns_queue = []
-        for event, data in _ET.iterparse(
-            f, events=["start", "end", "comment", "pi", "start-ns", "end-ns"]
-        ):
+        stack: list[tuple[_ET.Element, _collections.Counter]] = []
+        for event, data in _ET.iterparse(f, events=["start", "end", "start-ns"]):
             match event:
                 case "start-ns":
                     ns_queue.append(data)
                 case "start":
-                    if self.root is None:
-                        self.root = data
                     while ns_queue:
                         prefix, uri = ns_queue.pop()
-                        self.nsmap[uri][prefix].append(data)
+                        self.nsmap[uri][prefix].append(data.tag)
+                    if stack:
+                        stack[-1][1][data.tag] += 1
+                    stack.append((data, _collections.Counter()))
                 case "end":
+                    _, child_counts = stack.pop()
+                    parent = stack[-1][0] if stack else None
                     cfe = self.classmap.get(data.tag)
                     if cfe is None:
                         cfe = ClassFromElement.from_(data)
                         self.classmap[data.tag] = cfe
-                    cfe.update(data)
-        self.parentmap.update(build_parent_map(self.root))
+                    cfe.update(
+                        data,
+                        child_counts,
+                        None if parent is None else parent.tag,
+                    )
+                    if parent is not None:
+                        # Its earlier children have all ended already.
+                        del parent[:]
+                    data.clear()
         return self
 
     def build(self) -> list[ClassFromElement]:
         return list(self.classmap.values())
 
+    def names(self) -> dict[str, str]:
+        """Class name by tag, unique even when local names repeat
+
+        >>> Builder().load(_mxf("<load><ET/></load>")).names()
+        {'ET': 'ET_2', 'load': 'load_2'}
+        """
+        taken = set(GENERATED_GLOBAL_NAMES)
+        return {
+            cfe.tag.tag: unique_name(python_name(cfe.tag.name), taken)
+            for cfe in self.build()
+        }
+
+    def as_module_ast(self) -> _ast.Module:
+        """The classes, plus a load() filling them straight from parser events
+
+        load() feeds the document to an XMLParser whose target looks up
+        what to do with each tag in tables built here: NEW for start events
+        and ADD by parent tag, then child tag. No elements are built.
+        Tags not seen here are skipped, with everything under them.
+        """
+        names = self.names()
+        body = _ast.parse(GENERATED_MODULE_HEADER).body
+        new_entries = []
+        add_entries = []
+        text_tags = []
+        for cfe in self.build():
+            tag = cfe.tag.tag
+            class_name = names[tag]
+            fields = cfe.fields(names)
+            body.append(cfe.as_ast(names))
+            kwargs = ", ".join(
+                f"{f.name}=attrib.get({f.key!r})"
+                for f in fields
+                if f.kind == "attribute"
+            )
+            body.extend(
+                _ast.parse(
+                    f"def _new_{class_name}(attrib):\n"
+                    f"    return {class_name}({kwargs})\n"
+                ).body
+            )
+            new_entries.append(f"{tag!r}: _new_{class_name}")
+            if any(f.kind == "text" for f in fields):
+                text_tags.append(repr(tag))
+            child_entries = []
+            for f in fields:
+                if f.kind == "children":
+                    statement = f"parent.{f.name}.append(child)"
+                elif f.kind == "child":
+                    statement = f"parent.{f.name} = child"
+                else:
+                    continue
+                handler = f"_add_{class_name}__{f.name}"
+                body.extend(
+                    _ast.parse(f"def {handler}(parent, child):\n    {statement}\n").body
+                )
+                child_entries.append(f"{f.key!r}: {handler}")
+            if child_entries:
+                add_entries.append(f"{tag!r}: {{" + ", ".join(child_entries) + "}")
+        body.extend(
+            _ast.parse(
+                "NEW = {" + ", ".join(new_entries) + "}\n"
+                "ADD = {" + ", ".join(add_entries) + "}\n"
+                "TEXT = frozenset({" + ", ".join(text_tags) + "})\n"
+            ).body
+        )
+        body.extend(_ast.parse(GENERATED_LOADER).body)
+        return _ast.Module(body=body, type_ignores=[])
+
+    def connection_counts(self) -> dict[str, ConnectionCounter]:
+        """Same as count_connections, from the accumulated statistics"""
+        counts = keydefaultdict(lambda k: ConnectionCounter(tag=k))
+        for tag, cfe in self.classmap.items():
+            if cfe.stats.parents:
+                counts[tag].parents.update(cfe.stats.parents)
+        return counts
+
 
 class keydefaultdict(_collections.defaultdict):
     "https://stackoverflow.com/a/2912455"
@@ -199,6 +488,66 @@ def build_parent_map(root: _ET.Element) -> dict[_ET.Element, _ET.Element]:
     return {c: p for p in root.iter() for c in p}
 
 
+GENERATED_MODULE_HEADER = """
+from __future__ import annotations
+import dataclasses
+import types
+import typing
+import xml.etree.ElementTree as ET
+"""
+
+GENERATED_LOADER = """
+def load(source, chunk_size=1 << 16):
+    if not hasattr(source, "read"):
+        with open(source, "rb") as f:
+            return load(f, chunk_size)
+    objs = []
+    adds = []
+    parts = None
+    root = None
+    new_get = NEW.get
+    add_get = ADD.get
+    no_adds = {}
+
+    def start(tag, attrib):
+        nonlocal parts
+        if parts is not None:
+            objs[-1].text = "".join(parts) or None
+            parts = None
+        new = new_get(tag)
+        obj = None if new is None else new(attrib)
+        objs.append(obj)
+        adds.append(add_get(tag, no_adds))
+        if obj is not None and tag in TEXT:
+            parts = []
+
+    def data(text):
+        if parts is not None:
+            parts.append(text)
+
+    def end(tag):
+        nonlocal parts, root
+        obj = objs.pop()
+        adds.pop()
+        if parts is not None:
+            obj.text = "".join(parts) or None
+            parts = None
+        if not objs:
+            root = obj
+        elif obj is not None:
+            add = adds[-1].get(tag)
+            if add is not None:
+                add(objs[-1], obj)
+
+    target = types.SimpleNamespace(
+        start=start, data=data, end=end, close=lambda: root
+    )
+    parser = ET.XMLParser(target=target)
+    for chunk in iter(lambda: source.read(chunk_size), source.read(0)):
+        parser.feed(chunk)
+    return parser.close()
+"""
+
 CLASS_TEMPLATE_1 = """
 @_dataclasses.dataclass(kw_only=True, frozen=True)
 class {}
@@ -206,17 +555,21 @@ class {}
 
 
 def count_connections(tree: _ET.Element) -> dict[str, ConnectionCounter]:
+    """
+
+    >>> counts = count_connections(_mxt("<a><b><c/></b><b/></a>").getroot())
+    >>> sorted((t, dict(cc.parents)) for t, cc in counts.items())
+    [('b', {'a': 2}), ('c', {'b': 1})]
+    """
     counts = keydefaultdict(lambda k: ConnectionCounter(tag=k))
-    parentmap = build_parent_map(tree)
-    for el in tree.iter():
-        match el:
+    for p in tree.iter():
+        match p:
             case _ET.Element():
-                p = parentmap.get(el)
-                if p:
+                for el in p:
                     cc: ConnectionCounter = counts[el.tag]
                     cc.parents[p.tag] += 1
             case _:
-                raise NotImplementedError("unhandled", el)
+                raise NotImplementedError("unhandled", p)
     return counts
 
 
@@ -362,18 +715,47 @@ def _mxf(x: str) -> _io.TextIO:
     return f
 
 
+def _mxm(x: str, name: str = "_xml2classes_generated") -> _types.ModuleType:
+    source = _ast.unparse(Builder().load(_mxf(x)).as_module_ast())
+    module = _types.ModuleType(name)
+    # dataclasses looks string annotations up in the module.
+    _sys.modules[name] = module
+    exec(compile(source, name, "exec"), module.__dict__)
+    return module
+
+
 def run(infile: _io.TextIO, outfile: _io.TextIO | None = None) -> None:
     """
 
-    >>> run(_mxf("<a/>"))
-    class a:
-        ...
-    >>> run(_mxf("<a xmlns='urn:x'/>"))
-    class a:
-        ...
-    >>> run(_mxf("<x:a xmlns:x='urn:x'/>"))
+    >>> run(_mxf("<x:a xmlns:x='urn:x'/>"))  # doctest: +ELLIPSIS
+    from __future__ import annotations
+    import dataclasses
+    import types
+    import typing
+    import xml.etree.ElementTree as ET
+    <BLANKLINE>
+    @dataclasses.dataclass(slots=True, kw_only=True)
     class a:
-        ...
+        TAG: typing.ClassVar[str] = '{urn:x}a'
+    <BLANKLINE>
+    def _new_a(attrib):
+        return a()
+    NEW = {'{urn:x}a': _new_a}
+    ADD = {}
+    TEXT = frozenset({})
+    ...
+    >>> m = _mxm("<a k='v'><b>1</b><b>2</b><c><b>3</b></c></a>")
+    >>> a = m.load(_mxf("<a k='w'><b>x</b><c><b>y</b></c><d/></a>"))
+    >>> a
+    a(k='w', b=[b(text='x')], c=c(b=b(text='y')))
+    >>> a.__slots__
+    ('k', 'b', 'c')
+
+    Names the generated module binds are kept from fields and classes.
+
+    >>> m = _mxm("<a dataclasses='1' typing='2'><b/><b/><ET/></a>")
+    >>> m.load(_mxf("<a dataclasses='x'><b/><ET/></a>"))
+    a(dataclasses_2='x', typing_2=None, b=[b()], ET_2=ET_2())
     """
 
     print_kwargs = dict()
@@ -381,8 +763,7 @@ def run(infile: _io.TextIO, outfile: _io.TextIO | None = None) -> None:
         print_kwargs["file"] = outfile
     bldr = Builder()
     bldr.load(infile)
-    for cfe in bldr.build():
-        print(_ast.unparse(cfe.as_ast()), **print_kwargs)
+    print(_ast.unparse(bldr.as_module_ast()), **print_kwargs)
 
 
 def main():
@@ -1,7 +1,12 @@
 from __future__ import annotations
 
+import argparse
+import collections
+import concurrent.futures
 import doctest
+import os
 import pathlib
+import sqlite3
 import sys
 import typing
 import xml.etree.ElementTree as ET
@@ -16,14 +21,49 @@ XML_CATALOG_URI_TAG = "{" + XML_CATALOG_XMLNS + "}uri"
 XML_CATALOG_NAME_ATTR = "name"
 XML_CATALOG_URI_ATTR = "uri"
 
+DEFAULT_CACHE_PATH = pathlib.Path(".scrounge_xml_catalog.sqlite")
+SNIFF_CHUNKSIZE = 64
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS target_namespaces (
+    path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, tns TEXT
+)
+"""
+
+
+class FileStat(typing.NamedTuple):
+    path: str
+    mtime_ns: int
+    size: int
+
+
+def sniff_root(source: typing.BinaryIO) -> ET.Element:
+    """The root element, with its attributes but no children
+
+    Parsing stops at the first start event, so the rest of the document is
+    neither read in full nor checked.
+
+    >>> import io
+    >>> root = sniff_root(io.BytesIO(b'<a xmlns="urn:x" b="1"><c>never closed'))
+    >>> root.tag, root.attrib
+    ('{urn:x}a', {'b': '1'})
+    >>> sniff_root(io.BytesIO(b''))
+    Traceback (most recent call last):
+    ...
+    xml.etree.ElementTree.ParseError: no element found: line 1, column 0
+    """
+    for event, elem in ET.iterparse(source, events=("start",)):
+        return elem
+    raise ET.ParseError("no element found")
+
 
 def extract_target_namespace_from_xsd_schema(
     f: pathlib.Path, ignore_errors=True
 ) -> str | None:
     f = pathlib.Path(f)
     try:
-        tree = ET.parse(f)
-        root = tree.getroot()
+        with f.open("rb") as source:
+            root = sniff_root(source)
         if root.tag == XSD_SCHEMA_TAG:
             tns = root.get(XSD_TARGET_NAMESPACE_ATTR)
             return tns
@@ -38,19 +78,70 @@ def extract_target_namespace_from_xsd_schema(
     return None
 
 
+def _sniff_target_namespace(path: str) -> tuple[str, str | None]:
+    return path, extract_target_namespace_from_xsd_schema(pathlib.Path(path))
+
+
+class TargetNamespaceCache:
+    """Target namespaces by (path, mtime, size), kept between runs
+
+    Files that are not schemas are cached too, with no namespace, so a
+    re-run only parses new or changed files.
+    """
+
+    def __init__(self, path: pathlib.Path | str = DEFAULT_CACHE_PATH):
+        self.db = sqlite3.connect(str(path))
+        with self.db:
+            self.db.execute(CACHE_SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def get(self, stat: FileStat) -> tuple[bool, str | None]:
+        """Whether stat is cached, and its namespace"""
+        row = self.db.execute(
+            "SELECT tns FROM target_namespaces"
+            " WHERE path = ? AND mtime_ns = ? AND size = ?",
+            stat,
+        ).fetchone()
+        if row is None:
+            return False, None
+        return True, row[0]
+
+    def put_many(self, rows: typing.Iterable[tuple[FileStat, str | None]]) -> None:
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO target_namespaces VALUES (?, ?, ?, ?)",
+                ((*stat, tns) for stat, tns in rows),
+            )
+
+
 def main():
-    file_to_tns: dict[pathlib.Path, str] = {}
-    for f in _files_from_path_list([pathlib.Path(a) for a in sys.argv[1:]]):
-        tns = extract_target_namespace_from_xsd_schema(f)
-        if tns is None:
-            # TODO what about DTDs?
-            pass
-        else:
-            file_to_tns[f] = tns
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", type=pathlib.Path)
+    parser.add_argument(
+        "--cache",
+        type=pathlib.Path,
+        default=DEFAULT_CACHE_PATH,
+        help="persistent (path, mtime, size) namespace cache (%(default)s)",
+    )
+    parser.add_argument("--max-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    cache = TargetNamespaceCache(args.cache)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(args.max_workers) as executor:
+            file_to_tns = scan_target_namespaces(args.paths, cache, executor)
+    finally:
+        cache.close()
+
+    for tns, files in namespace_collisions(file_to_tns).items():
+        print("!! collision", tns, file=sys.stderr)
+        for f in files:
+            print("!!   ", f, file=sys.stderr)
 
     ET.register_namespace("", XML_CATALOG_XMLNS)
     catalog = ET.Element(XML_CATALOG_CATALOG_TAG)
-    # TODO handle collisions in target namespaces?
     for f, tns in file_to_tns.items():
         entry = ET.SubElement(catalog, XML_CATALOG_URI_TAG)
         entry.set(XML_CATALOG_NAME_ATTR, tns)
@@ -61,16 +152,92 @@ def main():
     tree.write(sys.stdout, encoding="unicode", xml_declaration=True)
 
 
+def scan_target_namespaces(
+    plist: list[pathlib.Path],
+    cache: TargetNamespaceCache,
+    executor: concurrent.futures.Executor,
+) -> dict[pathlib.Path, str]:
+    """Target namespaces of the schemas under plist, in path order
+
+    Directories are listed, and uncached files parsed, by the executor.
+    """
+    stats = sorted(_files_from_path_list(plist, executor))
+    file_to_tns: dict[pathlib.Path, str | None] = {}
+    uncached: list[FileStat] = []
+    for stat in stats:
+        cached, tns = cache.get(stat)
+        if cached:
+            file_to_tns[pathlib.Path(stat.path)] = tns
+        else:
+            uncached.append(stat)
+    sniffed = dict(
+        executor.map(
+            _sniff_target_namespace,
+            [_.path for _ in uncached],
+            chunksize=SNIFF_CHUNKSIZE,
+        )
+    )
+    cache.put_many((stat, sniffed[stat.path]) for stat in uncached)
+    for stat in uncached:
+        file_to_tns[pathlib.Path(stat.path)] = sniffed[stat.path]
+    # TODO what about DTDs?
+    return {
+        f: file_to_tns[f] for f in sorted(file_to_tns) if file_to_tns[f] is not None
+    }
+
+
+def namespace_collisions(
+    file_to_tns: dict[pathlib.Path, str],
+) -> dict[str, list[pathlib.Path]]:
+    """Target namespaces declared by more than one file
+
+    >>> namespace_collisions({
+    ...     pathlib.Path("a.xsd"): "urn:a",
+    ...     pathlib.Path("b.xsd"): "urn:b",
+    ...     pathlib.Path("c/a.xsd"): "urn:a",
+    ... })
+    {'urn:a': [...Path('a.xsd'), ...Path('c/a.xsd')]}
+    """
+    tns_to_files = collections.defaultdict(list)
+    for f, tns in file_to_tns.items():
+        tns_to_files[tns].append(f)
+    return {tns: files for tns, files in tns_to_files.items() if len(files) > 1}
+
+
+def _scan_directory(path: str) -> tuple[list[FileStat], list[str]]:
+    files = []
+    subdirs = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir():
+                subdirs.append(entry.path)
+            else:
+                st = entry.stat()
+                files.append(FileStat(entry.path, st.st_mtime_ns, st.st_size))
+    return files, subdirs
+
+
 def _files_from_path_list(
     plist: list[pathlib.Path],
-) -> typing.Generator[pathlib.Path, None, None]:
+    executor: concurrent.futures.Executor,
+) -> typing.Generator[FileStat, None, None]:
+    pending = set()
     for p in plist:
         p = pathlib.Path(p)
         if p.is_dir():
-            for c in p.iterdir():
-                yield from _files_from_path_list([c])
+            pending.add(executor.submit(_scan_directory, str(p)))
         else:
-            yield p
+            st = p.stat()
+            yield FileStat(str(p), st.st_mtime_ns, st.st_size)
+    while pending:
+        done, pending = concurrent.futures.wait(
+            pending, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        for future in done:
+            files, subdirs = future.result()
+            for subdir in subdirs:
+                pending.add(executor.submit(_scan_directory, subdir))
+            yield from files
 
 
 if __name__ == "__main__":